@@ -0,0 +1,163 @@
+"""
+Benchmark of the figures of the home page.
+
+Figures are built as plain dict specs (see src/pages/figures_factory.py). For each figures factory, this script
+compares the time needed to build the spec with the time needed by the previous factory, which built the figure
+with `go.Scatter`, `go.Bar`... traces and `update_layout` (see benchmarks/baseline_figures.py), every property
+being validated by `plotly.graph_objects`.
+It also checks that the specs are valid: `go.Figure` must accept them and serialize them identically.
+
+Then it compares the JSON payloads of the figures, as serialized by Dash, with the dates of the traces sent as
+ISO strings (as before) and as epoch milliseconds: size in bytes and time to build and serialize them.
+
+The factories are called with synthetic inputs (see benchmarks/synthetic_data.py), the database is not needed.
+Usage:
+
+    pipenv run python -m benchmarks.figures_benchmark [year] [companies count]
+"""
+import os
+
+# The figures are built from synthetic data, the database is never queried
+os.environ.setdefault("DATABASE_URL", "")
+
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.io.json import to_json_plotly
+
+from benchmarks import baseline_figures
+from benchmarks.synthetic_data import get_figures_calls, get_naf_nomenclature
+from src.data import datasets
+from src.pages import figures_factory
+
+REPEAT = 5
+EPOCH = datetime(1970, 1, 1)
+
+
+def best_time(func: callable) -> float:
+    """Returns the best duration of REPEAT runs of func, in milliseconds."""
+    durations = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return min(durations) * 1000
+
+
+@contextmanager
+def epoch_dates(enabled: bool):
+    """Enables or disables the dates sent as epoch milliseconds in the figures specs."""
+    figures_factory.DATES_AS_EPOCH_MS = enabled
+    try:
+        yield
+    finally:
+        figures_factory.DATES_AS_EPOCH_MS = True
+
+
+def encode_to_json(func: callable, args: tuple, kwargs: dict, enabled: bool) -> str:
+    """Builds a figure spec, with or without epoch dates, and serializes it like Dash does."""
+    with epoch_dates(enabled):
+        return to_json_plotly(func(*args, **kwargs))
+
+
+def check_epoch_dates(iso_spec: dict, epoch_spec: dict, name: str):
+    """Checks that the epoch milliseconds of a spec are the wall times of the ISO dates of the same spec."""
+    for iso_trace, epoch_trace in zip(iso_spec["data"], epoch_spec["data"]):
+        for key in ["x", "y"]:
+            iso_dates = iso_trace.get(key)
+            if not iso_dates or not isinstance(iso_dates[0], str):
+                continue
+            expected = [
+                (datetime.fromisoformat(date[:19]) - EPOCH) // timedelta(milliseconds=1)
+                for date in iso_dates
+            ]
+            if epoch_trace[key] != expected:
+                raise ValueError(f"The {key} dates of {name} are wrong.")
+            if epoch_spec["layout"][f"{key}axis"].get("type") != "date":
+                raise ValueError(f"The {key} axis of {name} is not a date axis.")
+
+
+def main(year: int, companies_count: int):
+    # The timing records of the many figures built would hide the results
+    logging.getLogger("trackdechets.timings").setLevel(logging.WARNING)
+
+    # The treemap labels are built from the NAF nomenclature dataset
+    datasets.NAF_NOMENCLATURE_DATA = get_naf_nomenclature()
+    datasets.DATA_UPDATE_DATE = datetime.now()
+
+    print(
+        f"Figures of the home page for {year}, {companies_count} companies (best of {REPEAT} runs)"
+    )
+    print(
+        f"{'figure factory':<45}{'dict (ms)':>12}{'baseline (ms)':>15}{'speedup':>10}"
+    )
+
+    calls = get_figures_calls(year, companies_count)
+    total_dict, total_baseline = 0, 0
+    for name, args, kwargs in calls:
+        func = getattr(figures_factory, name)
+        baseline_func = getattr(baseline_figures, name)
+
+        spec = func(*args, **kwargs)
+        validated = go.Figure(spec)
+        if json.loads(pio.to_json(validated)) != json.loads(pio.to_json(spec)):
+            raise ValueError(f"The spec built by {name} is modified by go.Figure.")
+
+        dict_ms = best_time(lambda: func(*args, **kwargs))
+        baseline_ms = best_time(lambda: baseline_func(*args, **kwargs))
+        total_dict += dict_ms
+        total_baseline += baseline_ms
+        print(
+            f"{name:<45}{dict_ms:>12.2f}{baseline_ms:>15.2f}{baseline_ms / dict_ms:>9.1f}x"
+        )
+
+    print(
+        f"{'total':<45}{total_dict:>12.2f}{total_baseline:>15.2f}"
+        f"{total_baseline / total_dict:>9.1f}x"
+    )
+
+    print()
+    print(
+        "JSON payloads of the figures (spec built and serialized), dates as ISO strings / as epoch milliseconds"
+    )
+    print(
+        f"{'figure factory':<45}{'ISO (B)':>12}{'epoch (B)':>12}"
+        f"{'ISO (ms)':>12}{'epoch (ms)':>12}"
+    )
+
+    totals = [0, 0, 0, 0]
+    for name, args, kwargs in calls:
+        func = getattr(figures_factory, name)
+        iso_json = encode_to_json(func, args, kwargs, False)
+        epoch_json = encode_to_json(func, args, kwargs, True)
+        check_epoch_dates(json.loads(iso_json), json.loads(epoch_json), name)
+
+        results = [
+            len(iso_json.encode()),
+            len(epoch_json.encode()),
+            best_time(lambda: encode_to_json(func, args, kwargs, False)),
+            best_time(lambda: encode_to_json(func, args, kwargs, True)),
+        ]
+        totals = [total + result for total, result in zip(totals, results)]
+        print(
+            f"{name:<45}{results[0]:>12}{results[1]:>12}"
+            f"{results[2]:>12.2f}{results[3]:>12.2f}"
+        )
+
+    print(
+        f"{'total':<45}{totals[0]:>12}{totals[1]:>12}"
+        f"{totals[2]:>12.2f}{totals[3]:>12.2f}"
+    )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2023,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20_000,
+    )
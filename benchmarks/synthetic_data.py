@@ -0,0 +1,200 @@
+"""
+Synthetic inputs of the figures factories, to build the figures without the database.
+Used by benchmarks/figures_benchmark.py and by the tests of the figures factories.
+
+The inputs have the shape of the ones computed by the home page from the datasets (see
+`get_layout_data_for_a_year` in src/pages/home/home_layout_factory.py): weekly aggregated frames
+over a year, processing operations quantities and companies with their NAF categories.
+"""
+import random
+from datetime import datetime, timedelta
+
+import polars as pl
+
+from src.data.data_processing import NAF_CATEGORIES
+
+# Sections of the NAF nomenclature used by the synthetic companies, with a color in the treemap
+NAF_SECTIONS = {
+    "C": "Industrie manufacturière",
+    "E": "Production et distribution d'eau ; assainissement, gestion des déchets et dépollution",
+    "F": "Construction",
+    "G": "Commerce ; réparation d'automobiles et de motocycles",
+    "Q": "Santé humaine et action sociale",
+}
+PROCESSING_OPERATIONS = {
+    "Déchet valorisé": ["R1", "R2", "R3", "R4", "R5", "R12", "R13"],
+    "Déchet éliminé": ["D1", "D5", "D9", "D10", "D13", "D15"],
+}
+SCATTER_LINES_CONFIGS = [
+    {"name": "État initial", "suffix": "traçés"},
+    {"name": "Pris en charge par le transporteur", "suffix": "pris en charge"},
+    {"name": "Reçu par le destinataire", "suffix": "reçus par le destinataire"},
+    {"name": "Traité", "suffix": "marqués comme traités"},
+    {
+        "name": "Traité (traitement intermédiaire)",
+        "suffix": "en traitement intermédiaire",
+    },
+    {"name": "Traité (traitement final)", "suffix": "en traitement final"},
+]
+
+
+def get_weeks(year: int, date_column: str = "at") -> pl.Series:
+    """Returns the Mondays starting the weeks of the year, in Europe/Paris time like the weekly aggregated data."""
+    first_monday = datetime(year, 1, 1) + timedelta(
+        days=-datetime(year, 1, 1).weekday() % 7
+    )
+    return pl.date_range(
+        first_monday, datetime(year, 12, 31), "1w", name=date_column
+    ).dt.replace_time_zone("Europe/Paris")
+
+
+def get_weekly_frame(
+    rng: random.Random,
+    year: int,
+    metric: str,
+    scale: float,
+    date_column: str = "at",
+) -> pl.DataFrame:
+    """Returns a weekly aggregated frame, with the date column and the metric column."""
+    weeks = get_weeks(year, date_column)
+    values = [rng.random() * scale for _ in range(len(weeks))]
+    if metric == "count":
+        values = [int(value) for value in values]
+    return pl.DataFrame([weeks, pl.Series(metric, values)])
+
+
+def get_naf_nomenclature() -> pl.DataFrame:
+    """Returns a NAF nomenclature with two divisions by section and two 'sous-classes' by division."""
+    rows = []
+    for section_index, (section, section_label) in enumerate(NAF_SECTIONS.items()):
+        for division_index in range(2):
+            division = f"{10 * section_index + division_index + 10:02d}"
+            for sous_classe_index in range(2):
+                classe = f"{division}.{sous_classe_index + 1}{sous_classe_index}"
+                rows.append(
+                    {
+                        "code_sous_classe": f"{classe}Z",
+                        "libelle_sous_classe": f"Activité détaillée {classe}Z de la division {division}",
+                        "code_classe": classe,
+                        "libelle_classe": f"Activité {classe} de la division {division}",
+                        "code_groupe": classe[:4],
+                        "libelle_groupe": f"Groupe d'activités {classe[:4]}",
+                        "code_division": division,
+                        "libelle_division": f"Division d'activités {division}",
+                        "code_section": section,
+                        "libelle_section": section_label,
+                    }
+                )
+    return pl.DataFrame(rows)
+
+
+def get_companies_with_naf(
+    rng: random.Random, naf_nomenclature: pl.DataFrame, companies_count: int
+) -> pl.DataFrame:
+    """Returns companies with their NAF categories and a produced quantity, a tenth of them without NAF."""
+    naf_codes = naf_nomenclature["code_sous_classe"].to_list()
+    companies = pl.DataFrame(
+        {
+            "id": list(range(companies_count)),
+            "code_sous_classe": [
+                rng.choice(naf_codes) if rng.random() > 0.1 else None
+                for _ in range(companies_count)
+            ],
+            "quantity": [rng.random() * 100 for _ in range(companies_count)],
+        }
+    )
+    return companies.join(naf_nomenclature, on="code_sous_classe", how="left").select(
+        ["id", "quantity"]
+        + [
+            f"{prefix}_{cat}"
+            for cat in NAF_CATEGORIES
+            for prefix in ["code", "libelle"]
+        ]
+    )
+
+
+def get_quantity_processed_by_operation(rng: random.Random) -> pl.DataFrame:
+    """Returns the quantity processed by processing operation, as shown by the sunburst figure."""
+    rows = [
+        {
+            "type_operation": type_operation,
+            "processing_operation": code,
+            "processing_operation_description": f"Opération de traitement {code}",
+            "quantity": rng.random() * 100_000,
+        }
+        for type_operation, codes in PROCESSING_OPERATIONS.items()
+        for code in codes
+    ]
+    return pl.DataFrame(rows)
+
+
+def get_figures_calls(
+    year: int = 2023, companies_count: int = 20_000, seed: int = 0
+) -> list[tuple[str, tuple, dict]]:
+    """
+    Returns calls of every figures factory with synthetic inputs, like the ones of the home page.
+
+    Parameters
+    ----------
+    year: int
+        Year of the weekly data.
+    companies_count: int
+        Number of companies of the treemap figures.
+    seed: int
+        Seed of the random values.
+
+    Returns
+    -------
+    list of tuples
+        Name of the figures factory, positional and keyword arguments of each call.
+    """
+    rng = random.Random(seed)
+    calls = []
+
+    for bs_type, metric, scale in [
+        ("BSDD", "count", 5_000),
+        ("BSDD", "quantity", 20_000),
+    ]:
+        frames = tuple(
+            get_weekly_frame(rng, year, metric, scale) for _ in SCATTER_LINES_CONFIGS
+        )
+        calls.append(
+            (
+                "create_weekly_scatter_figure",
+                frames,
+                {"bs_type": bs_type, "lines_configs": SCATTER_LINES_CONFIGS},
+            )
+        )
+
+    calls.append(
+        (
+            "create_weekly_quantity_processed_figure",
+            tuple(
+                get_weekly_frame(rng, year, "quantity", 50_000, "processed_at")
+                for _ in range(2)
+            ),
+            {},
+        )
+    )
+    calls.append(
+        (
+            "create_quantity_processed_sunburst_figure",
+            (get_quantity_processed_by_operation(rng),),
+            {},
+        )
+    )
+    calls.append(
+        (
+            "create_weekly_created_figure",
+            (get_weekly_frame(rng, year, "count", 800),),
+            {},
+        )
+    )
+
+    companies = get_companies_with_naf(rng, get_naf_nomenclature(), companies_count)
+    calls.append(("create_treemap_companies_figure", (companies,), {}))
+    calls.append(
+        ("create_treemap_companies_figure", (companies,), {"use_quantity": True})
+    )
+
+    return calls
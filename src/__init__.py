@@ -0,0 +1,2 @@
+# Imported first, so that the imports of all the dependencies are profiled (see src/boot.py)
+from src import boot  # noqa: F401
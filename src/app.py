@@ -3,6 +3,15 @@ Dash app configuration
 """
 from dash import Dash, html, page_container
 
+from src.loading import register_health_endpoints, start_background_loading
+from src.monitoring.boot import register_boot_profile
+from src.monitoring.memory import register_memory_report
+from src.monitoring.metrics import register_metrics
+from src.monitoring.profiling import register_request_profiler
+from src.monitoring.timing import register_timings_endpoint
+from src.monitoring.tracing import register_tracing
+from src.serving import register_payload_cache
+
 external_scripts = ["https://cdn.plot.ly/plotly-locale-fr-latest.js"]
 extra_config = {"locale": "fr"}
 
@@ -24,3 +33,15 @@ app.layout = html.Div(
 )
 # Add the @lang attribute to the root <html>
 app.index_string = app.index_string.replace("<html>", '<html lang="fr">')
+
+register_request_profiler(app)
+# The metrics and tracing hooks must be registered before the payload cache ones to measure the cached responses
+register_metrics(app)
+register_tracing(app)
+register_payload_cache(app)
+register_timings_endpoint(app)
+register_memory_report(app)
+register_boot_profile(app)
+register_health_endpoints(app)
+# The app serves the requests from now on, with a loading state until the data is loaded and the pages are built
+start_background_loading()
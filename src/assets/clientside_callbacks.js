@@ -0,0 +1,117 @@
+/*
+ * Clientside callbacks, registered in python with `ClientsideFunction(namespace, function_name)`.
+ */
+
+/**
+ * Format a number to a string with thousands separated by space, rounded to the unit.
+ * Javascript counterpart of `format_number` in src/pages/utils.py (round half to even, like python).
+ */
+function formatNumber(value) {
+    let rounded = Math.round(value)
+    if (Math.abs(value % 1) === 0.5) {
+        rounded = 2 * Math.round(value / 2)
+    }
+    return rounded.toString().replace(/\B(?=(\d{3})+(?!\d))/g, " ")
+}
+
+function isTraceVisible(trace) {
+    return !("visible" in trace) || trace.visible === true
+}
+
+/**
+ * Toggles the text of the last point of each trace depending on whether it overlaps another text.
+ *
+ * @param relayoutData Relayout event with associated data. Relayout event is triggered on zoom or drag.
+ * @param restyleData Restyle event with associated data. Restyle event is triggered when a trace is toggled on/off on legend click.
+ * @param figure Figure data.
+ * @returns Updated figure data.
+ */
+function toggleLastPointTexts(relayoutData, restyleData, figure) {
+    if (!figure || !figure.data) {
+        return window.dash_clientside.no_update
+    }
+
+    let divValue = 0
+    if (relayoutData && "yaxis.range[1]" in relayoutData) {
+        divValue = relayoutData["yaxis.range[1]"] - relayoutData["yaxis.range[0]"]
+    } else {
+        for (const trace of figure.data) {
+            if (!isTraceVisible(trace)) {
+                continue
+            }
+            divValue = Math.max(divValue, ...trace.y)
+        }
+    }
+    divValue = Math.max(0.01, divValue)
+
+    const textsPositionned = []
+    const newTraces = figure.data.map(function (trace) {
+        if (!isTraceVisible(trace)) {
+            return trace
+        }
+
+        const lastValue = trace.y[trace.y.length - 1]
+        const overlaps = textsPositionned.some(
+            (e) => Math.abs(lastValue - e) / divValue < 0.04
+        )
+        let text
+        if (!overlaps || textsPositionned.length === 0) {
+            text = trace.text.slice(0, -1).concat([formatNumber(lastValue)])
+            textsPositionned.push(lastValue)
+        } else {
+            text = new Array(trace.x.length).fill("")
+        }
+        return Object.assign({}, trace, {text: text})
+    })
+
+    return Object.assign({}, figure, {data: newTraces})
+}
+
+/**
+ * Applies the data of the selected year, as sent by the `change_layout_for_year` callback, to a figure.
+ *
+ * @param yearFiguresData Content of the 'year-figures-data' Store.
+ * @param figure Figure data.
+ * @param id Id of the figure component.
+ * @returns Updated figure data.
+ */
+function applyYearFigureData(yearFiguresData, figure, id) {
+    const figureData = yearFiguresData && yearFiguresData.figures[id.index]
+    if (!figureData || !figure) {
+        return window.dash_clientside.no_update
+    }
+
+    const layout = Object.assign({}, figure.layout, figureData.layout)
+    for (const [key, value] of Object.entries(figureData.layout)) {
+        if (value === null) {
+            delete layout[key]
+        }
+    }
+
+    return Object.assign({}, figure, {data: figureData.data, layout: layout})
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    home: {
+        updateFigureForYear: function (yearFiguresData, figure, id) {
+            return applyYearFigureData(yearFiguresData, figure, id)
+        },
+        updateCountsFigure: function (relayoutData, restyleData, yearFiguresData, figure, id) {
+            const triggered = window.dash_clientside.callback_context.triggered.map(
+                (t) => t.prop_id
+            )
+            if (triggered.includes("year-figures-data.data")) {
+                return applyYearFigureData(yearFiguresData, figure, id)
+            }
+            return toggleLastPointTexts(relayoutData, restyleData, figure)
+        },
+    },
+    loading: {
+        reloadWhenReady: function (loadingStatus) {
+            if (loadingStatus && loadingStatus.ready) {
+                window.location.reload()
+            }
+            return Boolean(loadingStatus && (loadingStatus.ready || loadingStatus.failed))
+        },
+    },
+})
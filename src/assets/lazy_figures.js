@@ -0,0 +1,60 @@
+/*
+ * Lazy loading of figures.
+ * Figure placeholders (elements with the `lazy-figure` class, see `add_lazy_figure` in src/pages/utils.py)
+ * contain a hidden trigger button. It is clicked once the placeholder becomes visible, which makes Dash
+ * replace the placeholder by the figure (see `load_lazy_figure` callback).
+ * Placeholders inside a tab panel are loaded only once their tab is selected.
+ */
+document.addEventListener("DOMContentLoaded", function () {
+    const visiblePlaceholders = new Set()
+    const observedPlaceholders = new WeakSet()
+
+    function isInSelectedTab(element) {
+        const panel = element.closest(".fr-tabs__panel")
+        return panel === null || panel.classList.contains("fr-tabs__panel--selected")
+    }
+
+    function loadVisiblePlaceholders() {
+        for (const placeholder of visiblePlaceholders) {
+            if (!placeholder.isConnected) {
+                visiblePlaceholders.delete(placeholder)
+            } else if (isInSelectedTab(placeholder)) {
+                visiblePlaceholders.delete(placeholder)
+                intersectionObserver.unobserve(placeholder)
+                placeholder.querySelector(".lazy-figure-trigger").click()
+            }
+        }
+    }
+
+    const intersectionObserver = new IntersectionObserver(
+        function (entries) {
+            for (const entry of entries) {
+                if (entry.isIntersecting) {
+                    visiblePlaceholders.add(entry.target)
+                } else {
+                    visiblePlaceholders.delete(entry.target)
+                }
+            }
+            loadVisiblePlaceholders()
+        },
+        // Starts loading a bit before the figure is scrolled into view
+        {rootMargin: "200px"}
+    )
+
+    // Pages are rendered by Dash after the document is loaded, so placeholders are looked for on each DOM change
+    new MutationObserver(function () {
+        for (const placeholder of document.querySelectorAll(".lazy-figure")) {
+            if (!observedPlaceholders.has(placeholder)) {
+                observedPlaceholders.add(placeholder)
+                intersectionObserver.observe(placeholder)
+            }
+        }
+    }).observe(document.body, {childList: true, subtree: true})
+
+    // DSFR marks the panel of the clicked tab as selected
+    new MutationObserver(function (mutations) {
+        if (mutations.some((m) => m.target.classList.contains("fr-tabs__panel"))) {
+            loadVisiblePlaceholders()
+        }
+    }).observe(document.body, {attributes: true, attributeFilter: ["class"], subtree: true})
+})
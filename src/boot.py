@@ -0,0 +1,172 @@
+"""
+Profiling of the boot of the app (of each gunicorn worker, as each one loads the app).
+
+The boot time is broken down by phase: the time spent in the functions decorated with `timed` is attributed
+to the extraction, processing or layout build phase depending on their stage, the pages layouts are built
+in the layout build phase, and the rest of the time, spent importing and executing the modules, to the
+imports phase. A phase nested in another one is only counted in the nested phase.
+The time spent executing each imported module is also measured, with and without its own imports.
+
+This module only imports modules of the standard library and is imported first (see src/__init__.py),
+so that the imports of all the dependencies are measured. The app serves the requests as soon as it is created, while the data is loaded and the pages are built
+in a background thread (see src/loading.py): the boot goes on in this thread, and the profile is reported
+by src/monitoring/boot.py once the loading is complete.
+"""
+import importlib.abc
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Iterator
+
+BOOT_STARTED_AT = time.perf_counter()
+
+IMPORTS_PHASE = "imports"
+
+
+class ImportsProfiler(importlib.abc.MetaPathFinder):
+    """
+    Meta path finder measuring the execution of the modules imported by the boot thread.
+    It finds the modules with the other finders, and wraps the `exec_module` method of their loaders.
+    """
+
+    def __init__(self, thread_id: int):
+        self.thread_id = thread_id
+        self.active = True
+        # Name: (duration with the imports of the module, duration without them) in seconds
+        self.modules = {}
+        # Imports being executed by each thread, with the duration of their own imports
+        self.stacks = threading.local()
+
+    def find_spec(self, fullname, path, target=None):
+        if not self.active or threading.get_ident() != self.thread_id:
+            return None
+
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        self.wrap_loader(spec.loader)
+        return spec
+
+    def wrap_loader(self, loader):
+        # The importers of the builtin and frozen modules are classes, shared by all their modules
+        if (
+            loader is None
+            or isinstance(loader, type)
+            or not hasattr(loader, "exec_module")
+            or "exec_module" in vars(loader)
+        ):
+            return
+
+        exec_module = loader.exec_module
+
+        def profiled_exec_module(module: ModuleType):
+            if not self.active or threading.get_ident() != self.thread_id:
+                return exec_module(module)
+
+            # The boot may go on in another thread while a module is imported (see `move_to_current_thread`)
+            stack = self.stacks.__dict__.setdefault("stack", [])
+            stack.append(0.0)
+            started_at = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                duration = time.perf_counter() - started_at
+                imports_duration = stack.pop()
+                self.modules[module.__name__] = (duration, duration - imports_duration)
+                if stack:
+                    stack[-1] += duration
+
+        try:
+            loader.exec_module = profiled_exec_module
+        except AttributeError:  # Loaders with slots
+            pass
+
+    def stop(self):
+        self.active = False
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+
+class BootProfile:
+    """Durations of the boot phases of the process, and of the imports of the modules."""
+
+    def __init__(self):
+        self.thread_id = threading.get_ident()
+        self.phases = defaultdict(float)
+        self.phases_stack = []
+        self.last_switch_at = BOOT_STARTED_AT
+        self.duration = None
+        # Time after which the app could serve requests
+        self.ready_to_serve_duration = None
+        self.imports_profiler = ImportsProfiler(self.thread_id)
+        sys.meta_path.insert(0, self.imports_profiler)
+
+    @property
+    def finished(self) -> bool:
+        return self.duration is not None
+
+    def switch_phase(self):
+        """Attributes the time since the last switch to the current phase."""
+        now = time.perf_counter()
+        phase = self.phases_stack[-1] if self.phases_stack else IMPORTS_PHASE
+        self.phases[phase] += now - self.last_switch_at
+        self.last_switch_at = now
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Attributes the time spent in the block to a phase, if the app is booting."""
+        if self.finished or threading.get_ident() != self.thread_id:
+            yield
+            return
+
+        self.switch_phase()
+        self.phases_stack.append(name)
+        try:
+            yield
+        finally:
+            self.switch_phase()
+            self.phases_stack.pop()
+
+    def set_ready_to_serve(self):
+        """Records the time after which the app could serve requests."""
+        self.switch_phase()
+        self.ready_to_serve_duration = time.perf_counter() - BOOT_STARTED_AT
+
+    def move_to_current_thread(self):
+        """Goes on profiling the boot in the current thread, like the thread loading the data in the background."""
+        self.switch_phase()
+        self.thread_id = threading.get_ident()
+        self.imports_profiler.thread_id = self.thread_id
+
+    def finish(self):
+        """Ends the boot: the following phases and imports are not profiled anymore."""
+        if self.finished:
+            return
+        self.switch_phase()
+        self.duration = time.perf_counter() - BOOT_STARTED_AT
+        self.imports_profiler.stop()
+
+    def get_imports_by_package(self) -> dict[str, float]:
+        """Time spent importing each top-level package, in seconds, the slowest first."""
+        durations = defaultdict(float)
+        for name, (_, self_duration) in self.imports_profiler.modules.items():
+            durations[name.partition(".")[0]] += self_duration
+        return dict(sorted(durations.items(), key=lambda e: -e[1]))
+
+    def get_imports_by_module(self) -> dict[str, tuple[float, float]]:
+        """Durations of the imports of each module, with and without its own imports, the slowest first."""
+        return dict(
+            sorted(self.imports_profiler.modules.items(), key=lambda e: -e[1][0])
+        )
+
+
+boot_profile = BootProfile()
@@ -2,22 +2,27 @@
 Data gathering and processing
 """
 import json
-import time
+from functools import cache
 from os import environ
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import pandas as pd
 import polars as pl
-import sqlalchemy
 
-from src.data.utils import format_waste_codes
+from src.monitoring.timing import timed
+
+# pandas and SQLAlchemy are slow to import and only used by `get_waste_nomenclature_data`,
+# they are imported when it is first called
+if TYPE_CHECKING:
+    import pandas as pd
+    import sqlalchemy
 
 DATABASE_URL = environ["DATABASE_URL"]
-DB_ENGINE = sqlalchemy.create_engine(DATABASE_URL)
 SQL_PATH = Path(__file__).parent.absolute() / "sql"
 STATIC_DATA_PATH = Path(__file__).parent.absolute() / "static"
 
 
+@timed("extract", label_arg="query_filename")
 def get_bs_data(
     query_filename: str,
     include_drafts: bool = False,
@@ -42,8 +47,6 @@ def get_bs_data(
         DataFrame of BSx, with all data included in the sql query.
     """
 
-    started_time = time.time()
-
     sql_query = (SQL_PATH / query_filename).read_text()
 
     bs_data_df = pl.read_sql(sql_query, connection_uri=DATABASE_URL)
@@ -65,11 +68,10 @@ def get_bs_data(
     #     pl.col("processing_operation").str.replace(r"([RD])([0-9]{1,2})", value="$1 $2")
     # )
 
-    print(f"get_bs_data duration: {time.time()-started_time} ")
-
     return bs_data_df
 
 
+@timed("extract")
 def get_company_data() -> pl.DataFrame:
     """
     Queries the configured database for company data.
@@ -79,16 +81,13 @@ def get_company_data() -> pl.DataFrame:
     DataFrame
         DataFrame of companies for a given period of time, with their creation date
     """
-    started_time = time.time()
-
     sql_query = (SQL_PATH / "get_company_data.sql").read_text()
     company_data_df = pl.read_sql(sql_query, connection_uri=DATABASE_URL)
 
-    print(f"get_company_data duration: {time.time()-started_time} ")
-
     return company_data_df
 
 
+@timed("extract")
 def get_user_data() -> pl.DataFrame:
     """
     Queries the configured database for user data, focused on creation date.
@@ -98,16 +97,13 @@ def get_user_data() -> pl.DataFrame:
     DataFrame
         dataframe of users for a given period of time, with their creation date
     """
-    started_time = time.time()
-
     sql_query = (SQL_PATH / "get_user_data.sql").read_text()
     user_data_df = pl.read_sql(sql_query, connection_uri=DATABASE_URL)
 
-    print(f"get_user_data duration: {time.time()-started_time} ")
-
     return user_data_df
 
 
+@timed("extract")
 def get_processing_operation_codes_data() -> pl.DataFrame:
     """
     Returns description for each processing operation codes.
@@ -125,6 +121,7 @@ def get_processing_operation_codes_data() -> pl.DataFrame:
     return data
 
 
+@timed("extract")
 def get_departement_geographical_data() -> pl.DataFrame:
     """
     Returns INSEE department geographical data.
@@ -142,7 +139,16 @@ def get_departement_geographical_data() -> pl.DataFrame:
     return data
 
 
-def get_waste_nomenclature_data() -> pd.DataFrame:
+@cache
+def get_db_engine() -> "sqlalchemy.engine.Engine":
+    """Returns the SQLAlchemy engine of the configured database, created at the first call."""
+    import sqlalchemy
+
+    return sqlalchemy.create_engine(DATABASE_URL)
+
+
+@timed("extract")
+def get_waste_nomenclature_data() -> "pd.DataFrame":
     """
     Returns waste nomenclature data.
 
@@ -151,27 +157,31 @@ def get_waste_nomenclature_data() -> pd.DataFrame:
     DataFrame
         DataFrame with waste nomenclature data.
     """
+    import pandas as pd
+
     data = pd.read_sql_table(
-        table_name="code_dechets", schema="trusted_zone", con=DB_ENGINE
+        table_name="code_dechets", schema="trusted_zone", con=get_db_engine()
     )
     return data
 
 
-def get_waste_code_hierarchical_nomenclature() -> list[dict]:
+@timed("extract")
+def get_waste_code_nomenclature() -> list[dict]:
     """
-    Returns waste code nomenclature in a hierarchical way, to use with tree components.
+    Returns waste code nomenclature in a hierarchical way.
 
     Returns
     --------
     list of dicts
-        Each dict contains the data necessary for the TreeComponent along with childrens.
+        Each dict contains the code, the description and the children of a waste code.
     """
     with (STATIC_DATA_PATH / "waste_codes.json").open() as f:
         waste_code_hierarchy = json.load(f)
 
-    return format_waste_codes(waste_code_hierarchy, add_top_level=True)
+    return waste_code_hierarchy
 
 
+@timed("extract")
 def get_naf_nomenclature_data() -> pl.DataFrame:
     """
     Returns the NAF nomenclature.
@@ -7,9 +7,17 @@ from typing import Dict, List, Tuple
 
 import polars as pl
 
+from src.data.utils import (
+    get_week_index_column,
+    get_week_index_expr,
+    get_week_start_expr,
+)
+from src.monitoring.timing import timed
+
 from .data_extract import get_processing_operation_codes_data
 
 
+@timed("process")
 def get_weekly_aggregated_series(
     data: pl.DataFrame,
     date_interval: Tuple[datetime, datetime] | None = None,
@@ -88,18 +96,30 @@ def get_weekly_aggregated_series(
     else:
         raise ValueError("Choose between sum or count aggfunc")
 
+    # Week index columns are precomputed in the datasets, but not in the frames built from other data
+    week_column = get_week_index_column(aggregate_column)
+    if week_column not in data.columns:
+        data = data.with_columns(
+            get_week_index_expr(aggregate_column, data.schema[aggregate_column])
+        )
+
     df = (
-        data.with_columns(pl.col(aggregate_column).dt.truncate("1w"))
-        .sort(aggregate_column)
-        .groupby(aggregate_column, maintain_order=True)
+        data.groupby(week_column)
         .agg(agg_expression)
-        .rename({aggregate_column: "at"})
+        .sort(week_column)
+        .select(
+            [
+                get_week_start_expr(pl.col(week_column)).alias("at"),
+                pl.col(agg_config["alias"]),
+            ]
+        )
         .fill_null(0)
     )
 
     return df
 
 
+@timed("process")
 def get_weekly_preprocessed_dfs(
     bs_data: pl.DataFrame, date_interval: tuple[datetime, datetime] | None
 ) -> Dict[str, List[pl.DataFrame]]:
@@ -157,6 +177,7 @@ def get_weekly_preprocessed_dfs(
     return bs_datasets
 
 
+@timed("process")
 def get_weekly_waste_quantity_processed_by_operation_code_df(
     bs_data: pl.DataFrame, date_interval: tuple[datetime, datetime] | None = None
 ) -> pl.DataFrame:
@@ -198,17 +219,30 @@ def get_weekly_waste_quantity_processed_by_operation_code_df(
         & pl.col("status").is_in(["PROCESSED", "FOLLOWED_WITH_PNTTD"])
     )
 
+    week_column = get_week_index_column("processed_at")
+    if week_column not in df.columns:
+        df = df.with_columns(
+            get_week_index_expr("processed_at", df.schema["processed_at"])
+        )
+
     df = (
-        df.with_columns(pl.col("processed_at").dt.truncate("1w"))
-        .sort("processed_at")
-        .groupby(["processed_at", "processing_operation"], maintain_order=True)
+        df.groupby([week_column, "processing_operation"])
         .agg(pl.col("quantity").sum())
+        .sort([week_column, "processing_operation"])
+        .select(
+            [
+                get_week_start_expr(pl.col(week_column)).alias("processed_at"),
+                pl.col("processing_operation"),
+                pl.col("quantity"),
+            ]
+        )
         .fill_null(0)
     )
 
     return df
 
 
+@timed("process")
 def get_recovered_and_eliminated_quantity_processed_by_week_series(
     quantity_processed_weekly_df: pl.DataFrame,
 ) -> list[pl.Series]:
@@ -243,6 +277,7 @@ def get_recovered_and_eliminated_quantity_processed_by_week_series(
     return res
 
 
+@timed("process")
 def get_waste_quantity_processed_by_processing_code_df(
     quantity_processed_weekly_df: pl.DataFrame,
 ) -> pl.DataFrame:
@@ -280,6 +315,113 @@ def get_waste_quantity_processed_by_processing_code_df(
     return agg_data
 
 
+# Levels of the NAF nomenclature, from the finest to the coarsest
+NAF_CATEGORIES = ["sous_classe", "classe", "groupe", "division", "section"]
+
+
+@timed("process")
+def aggregate_by_naf_sous_classe(
+    data_with_naf: pl.DataFrame, value_expr: pl.Expr
+) -> pl.DataFrame:
+    """
+    Aggregates data by NAF sous-classe, the finest level of the NAF nomenclature, in a single pass over the data.
+    The result is small (one row per sous-classe) and is regrouped to get the coarser levels.
+    The codes and labels of the coarser levels are taken from the first row of each sous-classe, as they only
+    depend on the sous-classe.
+
+    Parameters
+    ----------
+    data_with_naf: DataFrame
+        DataFrame containing data, including the codes and labels of all the NAF levels.
+    value_expr: Expr
+        Aggregation to compute, must be additive (count or sum) so that coarser levels can be derived by summing it.
+
+    Returns
+    -------
+    DataFrame
+        One row by sous-classe, in order of first appearance, with a 'value' column and the codes and labels
+        of all the NAF levels.
+    """
+    return data_with_naf.groupby("code_sous_classe", maintain_order=True).agg(
+        [value_expr.alias("value"), pl.col("libelle_sous_classe").first()]
+        + [
+            pl.col(f"{prefix}_{cat}").first()
+            for cat in NAF_CATEGORIES[1:]
+            for prefix in ["code", "libelle"]
+        ]
+    )
+
+
+@timed("process")
+def get_naf_hierarchy_aggregates(
+    data_with_naf: pl.DataFrame, value_expr: pl.Expr, root_id: str
+) -> pl.DataFrame:
+    """
+    Aggregates data by every level of the NAF nomenclature, as needed by a treemap or a sunburst.
+    Data is aggregated once by sous-classe, then each coarser level is derived by regrouping this aggregate.
+    Data without NAF section is aggregated in the 'NAF inconnu' section and ignored at the finer levels.
+
+    Parameters
+    ----------
+    data_with_naf: DataFrame
+        DataFrame containing data, including the codes and labels of all the NAF levels.
+    value_expr: Expr
+        Aggregation to compute, must be additive (count or sum).
+    root_id: str
+        Id of the root of the hierarchy, prefix of all the ids.
+
+    Returns
+    -------
+    DataFrame
+        One row by category of each level, from the coarsest level (section) to the finest (sous-classe),
+        categories of a level being in order of first appearance. Columns are 'level', 'code', 'libelle',
+        'value', 'ids', 'parents' (the ids of the parent categories) and 'libelle_section'.
+    """
+    sous_classe_df = aggregate_by_naf_sous_classe(data_with_naf, value_expr)
+    sous_classe_df = sous_classe_df.with_columns(
+        [
+            pl.col("code_section").fill_null("NAF inconnu"),
+            pl.col("libelle_section").fill_null("NAF inconnu"),
+        ]
+    )
+
+    id_sep = "#"
+    dfs = []
+    for i, cat in enumerate(NAF_CATEGORIES):
+        coarser_cats = NAF_CATEGORIES[i + 1 :]
+
+        level_df = sous_classe_df.drop_nulls(f"libelle_{cat}")
+        if i > 0:
+            level_df = level_df.groupby(f"code_{cat}", maintain_order=True).agg(
+                [pl.col("value").sum()]
+                + [pl.col(f"libelle_{tmp_cat}").max() for tmp_cat in NAF_CATEGORIES[i:]]
+            )
+
+        parents_expr = pl.concat_str(
+            [pl.lit(root_id)]
+            + [pl.col(f"libelle_{tmp_cat}") for tmp_cat in reversed(coarser_cats)],
+            sep=id_sep,
+        )
+        dfs.append(
+            level_df.select(
+                [
+                    pl.lit(cat).alias("level"),
+                    pl.col(f"code_{cat}").alias("code"),
+                    pl.col(f"libelle_{cat}").alias("libelle"),
+                    pl.col("value").cast(sous_classe_df["value"].dtype),
+                    pl.concat_str(
+                        [parents_expr, pl.col(f"libelle_{cat}")], sep=id_sep
+                    ).alias("ids"),
+                    parents_expr.alias("parents"),
+                    pl.col("libelle_section"),
+                ]
+            )
+        )
+
+    return pl.concat(list(reversed(dfs)))
+
+
+@timed("process")
 def get_company_counts_by_naf_dfs(
     company_data_df: pl.DataFrame,
 ) -> Tuple[pl.DataFrame, pl.DataFrame]:
@@ -287,6 +429,7 @@ def get_company_counts_by_naf_dfs(
     Builds two DataFrames used for the Treemap showing the company counts by company activities (code NAF):
     - The first one is aggregated by "libelle_section", the outermost hierarchical level;
     - The second one is aggregated by "libelle_division", the innermost hierarchical level chosen for the visualization.
+    Both are derived from a single aggregation of the company data by sous-classe.
 
     Parameter
     ---------
@@ -298,31 +441,35 @@ def get_company_counts_by_naf_dfs(
     Tuple of two dataframes
         One aggregated by "libelle_section" and one aggregated by "libelle_division".
     """
-    company_data_df = company_data_df.with_columns(
+    sous_classe_df = aggregate_by_naf_sous_classe(
+        company_data_df, pl.col("id").count()
+    ).with_columns(
         [
             pl.col("libelle_section").fill_null("Section NAF non renseignée."),
             pl.col("libelle_division").fill_null("Division NAF non renseignée."),
             pl.col("code_section").fill_null(""),
             pl.col("code_division").fill_null(""),
+            pl.col("value").alias("num_entreprises"),
         ]
     )
 
-    agg_data_1 = company_data_df.groupby("libelle_section").agg(
-        [pl.col("code_section").max(), pl.col("id").count().alias("num_entreprises")]
+    agg_data_1 = sous_classe_df.groupby("libelle_section").agg(
+        [pl.col("code_section").max(), pl.col("num_entreprises").sum()]
     )
 
-    agg_data_2 = company_data_df.groupby("libelle_division").agg(
+    agg_data_2 = sous_classe_df.groupby("libelle_division").agg(
         [
             pl.col("code_division").max(),
             pl.col("libelle_section").max(),
             pl.col("code_section").max(),
-            pl.col("id").count().alias("num_entreprises"),
+            pl.col("num_entreprises").sum(),
         ]
     )
 
     return agg_data_1, agg_data_2
 
 
+@timed("process")
 def get_total_bs_created(
     all_bordereaux_data: pl.DataFrame,
     date_interval: Tuple[datetime, datetime] | None = None,
@@ -354,6 +501,7 @@ def get_total_bs_created(
     return bs_created_total
 
 
+@timed("process")
 def get_total_quantity_processed(
     all_bordereaux_data: pl.DataFrame,
     date_interval: Tuple[datetime, datetime] | None = None,
@@ -419,18 +567,47 @@ def get_total_quantity_processed(
     return quantity_processed_total
 
 
+@timed("process")
+def get_producers_quantities_data(all_bordereaux_data_df: pl.DataFrame) -> pl.DataFrame:
+    """Keeps the "bordereaux" of the producers of waste, i.e. whose emitter is never the destination of a
+    "bordereau", with only the columns needed to compute the quantities produced by NAF. As the emitters
+    have to be compared with all the destinations, it is meant to be computed once for all the years.
+
+    Parameters
+    ----------
+    all_bordereaux_data_df : pl.DataFrame
+        a DataFrame containing all the "bordereaux" data
+
+    Returns
+    -------
+        A DataFrame with the "sent_at", "quantity" and "code_sous_classe" (NAF of the emitter) columns.
+
+    """
+    return all_bordereaux_data_df.filter(
+        pl.col("emitter_siret").is_in(pl.col("destination_siret")).is_not()
+    ).select(
+        [
+            pl.col("sent_at"),
+            pl.col("quantity"),
+            pl.col("emitter_naf").alias("code_sous_classe"),
+        ]
+    )
+
+
+@timed("process")
 def get_quantities_by_naf(
-    all_bordereaux_data_df: pl.DataFrame,
+    producers_quantities_df: pl.DataFrame,
     naf_nomenclature_data: pl.DataFrame,
     date_interval: Tuple[datetime, datetime] | None = None,
 ) -> pl.DataFrame:
-    """Takes a DataFrame of bordereaux data, a DataFrame with NAF nomenclature data, and an optional date
-    interval, and returns a DataFrame of bordereaux data with the naf nomenclature data joined to it using emitter SIRET as join key.
+    """Takes a DataFrame of producers "bordereaux" data, a DataFrame with NAF nomenclature data, and an optional date
+    interval, and returns the quantities produced by NAF sous-classe with the naf nomenclature data joined to it.
+    The nomenclature is joined after the aggregation, to one row by sous-classe.
 
     Parameters
     ----------
-    all_bordereaux_data_df : pl.DataFrame
-        a DataFrame containing all the "bordereaux" data
+    producers_quantities_df : pl.DataFrame
+        a DataFrame containing the "bordereaux" of the producers, see `get_producers_quantities_data`
     naf_nomenclature_data : pl.DataFrame
         a DataFrame containing the NAF nomenclature
     date_interval : Tuple[datetime, datetime] | None
@@ -438,27 +615,18 @@ def get_quantities_by_naf(
 
     Returns
     -------
-        A DataFrame with "bordereaux" data joined with NAF nomenclature.
+        A DataFrame with the quantity produced by NAF sous-classe, joined with NAF nomenclature.
 
     """
-    all_bordereaux_data_df_with_naf = all_bordereaux_data_df.join(
-        naf_nomenclature_data,
-        left_on="emitter_naf",
-        right_on="code_sous_classe",
-        how="left",
-    )
-
-    all_bordereaux_data_df_with_naf = all_bordereaux_data_df_with_naf.filter(
-        pl.col("emitter_siret").is_in(pl.col("destination_siret")).is_not()
-    )
-
     if date_interval is not None:
-        all_bordereaux_data_df_with_naf = all_bordereaux_data_df_with_naf.filter(
+        producers_quantities_df = producers_quantities_df.filter(
             pl.col("sent_at").is_between(*date_interval, closed="left")
         )
 
-    all_bordereaux_data_df_with_naf = all_bordereaux_data_df_with_naf.with_columns(
-        pl.col("emitter_naf").alias("code_sous_classe")
-    )
+    quantities_by_naf = producers_quantities_df.groupby(
+        "code_sous_classe", maintain_order=True
+    ).agg(pl.col("quantity").sum())
 
-    return all_bordereaux_data_df_with_naf
+    return quantities_by_naf.join(
+        naf_nomenclature_data, on="code_sous_classe", how="left"
+    )
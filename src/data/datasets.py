@@ -1,7 +1,10 @@
 """This module contains the raw datasets. 
-The datasets are loaded in memory to be reusable by other functions.
+The datasets are loaded in memory by `load_datasets` to be reusable by other functions.
 """
+import threading
 from datetime import datetime
+from functools import wraps
+from typing import Any, Callable
 
 import polars as pl
 
@@ -11,31 +14,305 @@ from src.data.data_extract import (
     get_departement_geographical_data,
     get_naf_nomenclature_data,
     get_user_data,
+    get_waste_code_nomenclature,
 )
+from src.data.utils import add_week_index_columns
+from src.monitoring.metrics import metrics_registry
+from src.monitoring.timing import timed
+from src.monitoring.tracing import current_span
 
 
-# Load all needed data
-BSDD_DATA = get_bs_data(
-    "get_bsdd_data.sql",
-)
-BSDA_DATA = get_bs_data(
-    "get_bsda_data.sql",
-)
-BSFF_DATA = get_bs_data(
-    "get_bsff_data.sql",
-)
-BSDASRI_DATA = get_bs_data(
-    "get_bsdasri_data.sql",
-)
+# Queries of the 'bordereaux' of each type, in the order of their rows in ALL_BORDEREAUX_DATA
+BS_QUERIES_FILENAMES = {
+    "BSDD": "get_bsdd_data.sql",
+    "BSDA": "get_bsda_data.sql",
+    "BSFF": "get_bsff_data.sql",
+    "BSDASRI": "get_bsdasri_data.sql",
+}
+# Lifecycle dates of the 'bordereaux', each one has a week index column (see `get_week_index_expr`)
+BS_DATES_COLUMNS = ["created_at", "sent_at", "received_at", "processed_at"]
 
-ALL_BORDEREAUX_DATA = pl.concat(
-    [BSDD_DATA, BSDA_DATA, BSFF_DATA, BSDASRI_DATA], how="diagonal"
-)
 
-COMPANY_DATA = get_company_data()
-USER_DATA = get_user_data()
+@timed("process")
+def concat_bs_data(
+    bs_data_dfs: dict[str, pl.DataFrame]
+) -> tuple[pl.DataFrame, dict[str, tuple[int, int, list[str]]]]:
+    """
+    Concatenates the 'bordereaux' of each type in a single frame, with a categorical `bs_type` column.
+
+    Parameters
+    ----------
+    bs_data_dfs: dict
+        DataFrames of the 'bordereaux', by type.
+
+    Returns
+    -------
+    tuple
+        The concatenated DataFrame, stored in contiguous memory, and for each type the offset and length of its
+        range of rows and its columns, from which `get_bs_data_view` derives the DataFrame of the type.
+    """
+    views_specs = {}
+    offset = 0
+    # The categories of `bs_type` must be shared by all the frames to be concatenated
+    with pl.StringCache():
+        typed_dfs = []
+        for bs_type, bs_data_df in bs_data_dfs.items():
+            typed_dfs.append(
+                bs_data_df.with_columns(
+                    pl.lit(bs_type).cast(pl.Categorical).alias("bs_type")
+                )
+            )
+            views_specs[bs_type] = (offset, len(bs_data_df), typed_dfs[-1].columns)
+            offset += len(bs_data_df)
+
+    return pl.concat(typed_dfs, how="diagonal", rechunk=True), views_specs
+
+
+def get_bs_data_view(bs_type: str) -> pl.DataFrame:
+    """
+    Returns the 'bordereaux' of a type, with the columns of this type only.
+    The rows of a type being contiguous in ALL_BORDEREAUX_DATA, the returned DataFrame is a view of it:
+    no data is copied.
+    """
+    offset, length, columns = BS_DATA_VIEWS_SPECS[bs_type]
+    return ALL_BORDEREAUX_DATA.slice(offset, length).select(columns)
+
+
+# The datasets, set by `load_datasets`
+ALL_BORDEREAUX_DATA: pl.DataFrame | None = None
+BS_DATA_VIEWS_SPECS: dict[str, tuple[int, int, list[str]]] | None = None
+BSDD_DATA: pl.DataFrame | None = None
+BSDA_DATA: pl.DataFrame | None = None
+BSFF_DATA: pl.DataFrame | None = None
+BSDASRI_DATA: pl.DataFrame | None = None
+COMPANY_DATA: pl.DataFrame | None = None
+USER_DATA: pl.DataFrame | None = None
+DEPARTEMENTS_GEOGRAPHICAL_DATA: pl.DataFrame | None = None
+NAF_NOMENCLATURE_DATA: pl.DataFrame | None = None
+WASTE_CODE_NOMENCLATURE: list[dict] | None = None
+DATA_UPDATE_DATE: datetime | None = None
+
+
+def load_datasets():
+    """
+    Loads all the needed data in memory. The datasets are attributes of this module, to be used as
+    `datasets.ALL_BORDEREAUX_DATA` by the functions that need them, as they are loaded after the modules are
+    imported (in the background, see src/loading.py). DATA_UPDATE_DATE is set last, so that the data version
+    only changes once all the datasets are loaded.
+
+    The 'bordereaux' are only stored once, in ALL_BORDEREAUX_DATA, the DataFrames by type are views of it.
+    The week index columns of the dates are computed once here, for the weekly aggregations.
+    """
+    global ALL_BORDEREAUX_DATA, BS_DATA_VIEWS_SPECS
+    global BSDD_DATA, BSDA_DATA, BSFF_DATA, BSDASRI_DATA
+    global COMPANY_DATA, USER_DATA, DEPARTEMENTS_GEOGRAPHICAL_DATA
+    global NAF_NOMENCLATURE_DATA, WASTE_CODE_NOMENCLATURE, DATA_UPDATE_DATE
+
+    ALL_BORDEREAUX_DATA, BS_DATA_VIEWS_SPECS = concat_bs_data(
+        {
+            bs_type: add_week_index_columns(
+                get_bs_data(query_filename), BS_DATES_COLUMNS
+            )
+            for bs_type, query_filename in BS_QUERIES_FILENAMES.items()
+        }
+    )
+    BSDD_DATA = get_bs_data_view("BSDD")
+    BSDA_DATA = get_bs_data_view("BSDA")
+    BSFF_DATA = get_bs_data_view("BSFF")
+    BSDASRI_DATA = get_bs_data_view("BSDASRI")
+
+    COMPANY_DATA = add_week_index_columns(get_company_data(), ["created_at"])
+    USER_DATA = add_week_index_columns(get_user_data(), ["created_at"])
+
+    DEPARTEMENTS_GEOGRAPHICAL_DATA = get_departement_geographical_data()
+    NAF_NOMENCLATURE_DATA = get_naf_nomenclature_data()
+    WASTE_CODE_NOMENCLATURE = get_waste_code_nomenclature()
+
+    DATA_UPDATE_DATE = datetime.now()
+
+
+def is_data_loaded() -> bool:
+    """Checks that `load_datasets` was called."""
+    return DATA_UPDATE_DATE is not None
+
+
+def get_datasets_frames() -> dict[str, pl.DataFrame]:
+    """
+    Returns the DataFrames of the datasets, by name.
+    The DataFrames of each type of 'bordereau' are not included, being views of ALL_BORDEREAUX_DATA.
+    """
+    return {
+        "ALL_BORDEREAUX_DATA": ALL_BORDEREAUX_DATA,
+        "COMPANY_DATA": COMPANY_DATA,
+        "USER_DATA": USER_DATA,
+        "DEPARTEMENTS_GEOGRAPHICAL_DATA": DEPARTEMENTS_GEOGRAPHICAL_DATA,
+        "NAF_NOMENCLATURE_DATA": NAF_NOMENCLATURE_DATA,
+    }
+
+
+def get_data_version() -> str | None:
+    """
+    Returns an identifier of the loaded data, that changes each time the data is reloaded.
+    None if the data is not loaded yet.
+    """
+    if DATA_UPDATE_DATE is None:
+        return None
+    return DATA_UPDATE_DATE.isoformat()
+
+
+class Flight:
+    """A call in flight, whose result is shared with the identical calls made meanwhile."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # Whether the call returned a result, the waiting calls must not share the result of an aborted call
+        self.completed = False
+
+
+class SingleFlight:
+    """
+    Coalesces the identical concurrent calls: while a call is in flight for a key, the calls made with the same key
+    wait for it and get its result (or its exception) instead of computing it again.
+    """
+
+    def __init__(self):
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def do(self, key: Any, func: Callable, *args, **kwargs) -> tuple[Any, bool]:
+        """
+        Calls the function, unless an identical call is in flight.
+
+        Parameters
+        ----------
+        key: hashable
+            Key identifying the identical calls.
+        func: callable
+            Function to call, with the other arguments.
+
+        Returns
+        -------
+        tuple
+            The result of the function, and whether it was shared by an identical call in flight.
+        """
+        with self.lock:
+            flight = self.flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self.flights[key] = Flight()
+
+        if not is_leader:
+            flight.done.wait()
+            if isinstance(flight.error, Exception):
+                raise flight.error
+            # The leader was aborted (like by a worker timeout or SystemExit), there is no result to share
+            if not flight.completed:
+                raise RuntimeError(
+                    "The identical call in flight was aborted."
+                ) from flight.error
+            return flight.result, True
+
+        try:
+            flight.result = func(*args, **kwargs)
+            flight.completed = True
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+        return flight.result, False
+
+
+def single_flight(get_key: Callable) -> Callable:
+    """
+    Decorator coalescing the identical concurrent calls of a function computed from the datasets, for the expensive
+    functions whose arguments can't be cached by `cache_for_data_version`: when many users request the same
+    filters at the same time, the result is computed once and shared.
+
+    Parameters
+    ----------
+    get_key: callable
+        Called with the arguments of the function, returns the hashable key identifying the identical calls.
+        The key is completed with the data version.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        flights = SingleFlight()
+        metric_name = "trackdechets_single_flight_calls_total"
+        function_name = f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (get_data_version(), get_key(*args, **kwargs))
+            result, is_shared = flights.do(key, func, *args, **kwargs)
+
+            flight_result = "coalesced" if is_shared else "computed"
+            metrics_registry.inc(
+                metric_name, {"function": function_name, "result": flight_result}
+            )
+            span = current_span.get()
+            if span is not None:
+                span.set_attribute("single_flight", flight_result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+# Getters of the caches of the functions decorated with `cache_for_data_version`, by function name
+data_version_caches_getters = {}
+
+
+def get_data_version_caches() -> dict[str, dict]:
+    """Returns the results cached by `cache_for_data_version`, by function name and arguments."""
+    return {
+        name: get_cache() for name, get_cache in data_version_caches_getters.items()
+    }
+
+
+def cache_for_data_version(func: Callable) -> Callable:
+    """
+    Caches the results of a function computed from the datasets: the function is called once per set of arguments
+    (that must be hashable) and the results are kept until the data is reloaded.
+    The concurrent calls made before the result is cached wait for the first one (see `SingleFlight`).
+    """
+    # The data version and its cache, replaced together when the data is reloaded
+    versioned_cache = (None, {})
+    flights = SingleFlight()
+    metric_name = "trackdechets_data_cache_requests_total"
+    function_name = f"{func.__module__}.{func.__qualname__}"
+
+    @wraps(func)
+    def wrapper(*args):
+        nonlocal versioned_cache
+
+        data_version = get_data_version()
+        cache_version, cache = versioned_cache
+        if data_version != cache_version:
+            cache = {}
+            versioned_cache = (data_version, cache)
+
+        if args in cache:
+            metrics_registry.inc(
+                metric_name, {"function": function_name, "result": "hit"}
+            )
+            return cache[args]
+
+        result, is_shared = flights.do((data_version, args), func, *args)
+        metrics_registry.inc(
+            metric_name,
+            {"function": function_name, "result": "coalesced" if is_shared else "miss"},
+        )
+        # The data may have been reloaded during the call, the result of the previous data must not be cached
+        if get_data_version() == data_version:
+            cache[args] = result
+        return result
 
-DEPARTEMENTS_GEOGRAPHICAL_DATA = get_departement_geographical_data()
-NAF_NOMENCLATURE_DATA = get_naf_nomenclature_data()
+    data_version_caches_getters[function_name] = lambda: versioned_cache[1]
 
-DATA_UPDATE_DATE = datetime.now()
+    return wrapper
@@ -4,6 +4,16 @@ Utility functions used by data package.
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
+import polars as pl
+
+from src.monitoring.timing import timed
+
+# Weeks are indexed from the Monday 1969-12-29, the first Monday before the Unix epoch (a Thursday),
+# so that the indexes of all the dates of the data are positive
+WEEK_INDEX_EPOCH_OFFSET_S = 3 * 24 * 3600
+WEEK_DURATION_S = 7 * 24 * 3600
+WEEK_INDEX_TIME_ZONE = "Europe/Paris"
+
 
 def get_data_date_interval_for_year(year: int = 2022) -> tuple[datetime, datetime]:
     """It returns a tuple of two datetime objects,
@@ -35,7 +45,80 @@ def get_data_date_interval_for_year(year: int = 2022) -> tuple[datetime, datetim
     return date_start, date_end
 
 
-def format_waste_codes(waste_code_list: list[dict], add_top_level: bool = False):
+def get_week_index_column(date_column: str) -> str:
+    """Name of the week index column of a date column."""
+    return f"{date_column}_week"
+
+
+def get_week_index_expr(date_column: str, dtype: pl.DataType) -> pl.Expr:
+    """
+    Computes the index of the week of each date of a datetime column: the number of weeks
+    between the Monday 1969-12-29 and the Monday that starts the week of the date, in Europe/Paris time.
+    Grouping by this index is equivalent to grouping by `dt.truncate("1w")` of the dates in Europe/Paris time,
+    whatever the time zone of the column: weeks start on Monday at midnight in Paris, not in UTC.
+    Dates without time zone are read as UTC dates, like the timestamps of the database.
+
+    Parameters
+    ----------
+    date_column: str
+        Name of the datetime column.
+    dtype: DataType
+        Data type of the column, with its time zone.
+
+    Returns
+    -------
+    Expression of the Int32 week index, named after `get_week_index_column`.
+    """
+    if dtype != pl.Datetime:
+        raise TypeError(
+            f"Week indexes are computed on datetime columns, '{date_column}' is {dtype}."
+        )
+
+    date = pl.col(date_column)
+    if getattr(dtype, "tz", None) is None:
+        date = date.dt.replace_time_zone("UTC")
+    local_date = date.dt.convert_time_zone(WEEK_INDEX_TIME_ZONE).dt.replace_time_zone(
+        None
+    )
+    return (
+        ((local_date.dt.epoch("s") + WEEK_INDEX_EPOCH_OFFSET_S) // WEEK_DURATION_S)
+        .cast(pl.Int32)
+        .alias(get_week_index_column(date_column))
+    )
+
+
+def get_week_start_expr(week_index: pl.Expr) -> pl.Expr:
+    """
+    Maps week indexes (see `get_week_index_expr`) back to the Europe/Paris datetimes of the Mondays
+    that start the weeks, like `dt.truncate("1w")` does, to plot weekly aggregated data.
+    """
+    return (
+        pl.from_epoch(
+            week_index.cast(pl.Int64) * WEEK_DURATION_S - WEEK_INDEX_EPOCH_OFFSET_S,
+            unit="s",
+        )
+        .cast(pl.Datetime("us"))
+        .dt.replace_time_zone(WEEK_INDEX_TIME_ZONE)
+    )
+
+
+@timed("process")
+def add_week_index_columns(df: pl.DataFrame, date_columns: list[str]) -> pl.DataFrame:
+    """Adds the week index column (see `get_week_index_expr`) of each date column present in the DataFrame."""
+    return df.with_columns(
+        [
+            get_week_index_expr(column, df.schema[column])
+            for column in date_columns
+            if column in df.columns
+        ]
+    )
+
+
+def format_waste_codes(
+    waste_code_list: list[dict],
+    add_top_level: bool = False,
+    loaded_codes: set[str] | None = None,
+):
     """This function takes a list of dictionaries representing waste codes,
     and returns a list of dictionaries correctly formatted to be used in UI Tree selector.
 
@@ -46,6 +129,9 @@ def format_waste_codes(waste_code_list: list[dict], add_top_level: bool = False)
     add_top_level : bool, optional
         if True, adds a top level option with title "Tous les code déchets"
         to the list of waste codes.
+    loaded_codes : set[str], optional
+        if given, only the children of these codes are included, the other codes having children
+        are marked as not being leaves so that they can be expanded to load their children.
 
     Returns
     -------
@@ -63,7 +149,13 @@ def format_waste_codes(waste_code_list: list[dict], add_top_level: bool = False)
         )
         formatted_dict["value"] = waste_code_dict["code"]
         formatted_dict["key"] = waste_code_dict["code"]
-        formatted_dict["children"] = format_waste_codes(waste_code_dict["children"])
+        if loaded_codes is None or waste_code_dict["code"] in loaded_codes:
+            formatted_dict["children"] = format_waste_codes(
+                waste_code_dict["children"], loaded_codes=loaded_codes
+            )
+        else:
+            formatted_dict["children"] = []
+            formatted_dict["isLeaf"] = len(waste_code_dict["children"]) == 0
         new_dict_list.append(formatted_dict)
 
     if add_top_level:
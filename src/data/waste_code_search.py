@@ -0,0 +1,300 @@
+"""
+Search over the waste code nomenclature.
+The index is built once per data version from the nomenclature and kept in memory.
+"""
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from src.data import datasets
+from src.data.datasets import cache_for_data_version
+from src.data.utils import format_waste_codes
+
+# Queries made only of digits, spaces and stars are searched among the codes
+CODE_QUERY_REGEX = re.compile(r"^[\s*]*\d[\d\s*]*$")
+TOKEN_REGEX = re.compile(r"\w+")
+
+
+def fold_text(text: str) -> str:
+    """Lowercases the text and removes its accents, so that 'Déchets' and 'dechets' are equal."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalize_code(code: str) -> str:
+    """Removes the spaces and the dangerous waste star of a waste code, '16 01 04*' becomes '160104'."""
+    return re.sub(r"[\s*]", "", code)
+
+
+class WasteCodeIndex:
+    """
+    Index of the waste code nomenclature:
+    - a prefix trie over the normalized codes, to search codes as they are typed;
+    - an inverted index of the accent-folded tokens of the descriptions.
+    Each code also knows its parent, to return the path from the top of the nomenclature to each match,
+    and the leaf codes below it, to keep the codes selected in the waste codes tree over the whole nomenclature.
+    """
+
+    def __init__(self, waste_code_nomenclature: list[dict]):
+        self.descriptions = {}
+        self.parents = {}
+        self.leaves = {}
+        self.code_trie = {}
+        self.token_postings = defaultdict(set)
+
+        self.leaves["all"] = self.add_codes(waste_code_nomenclature, parent=None)
+        self.tokens = sorted(self.token_postings)
+
+    def add_codes(self, waste_codes: list[dict], parent: str | None) -> frozenset[str]:
+        """Indexes the codes and their children, returns the leaf codes below them."""
+        leaves = set()
+        for waste_code in waste_codes:
+            code = waste_code["code"]
+            self.descriptions[code] = waste_code["description"]
+            self.parents[code] = parent
+
+            node = self.code_trie
+            for char in normalize_code(code):
+                node = node.setdefault(char, {})
+            node.setdefault("", []).append(code)
+
+            for token in TOKEN_REGEX.findall(fold_text(waste_code["description"])):
+                self.token_postings[token].add(code)
+
+            code_leaves = self.add_codes(waste_code["children"], parent=code)
+            self.leaves[code] = code_leaves or frozenset([code])
+            leaves |= self.leaves[code]
+
+        return frozenset(leaves)
+
+    def search_codes(self, query: str) -> set[str]:
+        """Returns the codes starting with the query, spaces and star being ignored."""
+        node = self.code_trie
+        for char in normalize_code(query):
+            if char not in node:
+                return set()
+            node = node[char]
+
+        codes = set()
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            for key, value in node.items():
+                if key == "":
+                    codes.update(value)
+                else:
+                    nodes.append(value)
+        return codes
+
+    def search_token(self, token: str) -> set[str]:
+        """Returns the codes whose description contains a word starting with the token."""
+        codes = set()
+        i = bisect_left(self.tokens, token)
+        while i < len(self.tokens) and self.tokens[i].startswith(token):
+            codes |= self.token_postings[self.tokens[i]]
+            i += 1
+        return codes
+
+    def get_ancestors(self, code: str) -> list[str]:
+        """Returns the codes from the top of the nomenclature to the parent of the given code."""
+        ancestors = []
+        parent = self.parents[code]
+        while parent is not None:
+            ancestors.insert(0, parent)
+            parent = self.parents[parent]
+        return ancestors
+
+    def search(self, query: str) -> list[dict]:
+        """
+        Searches the waste codes matching the query: codes starting with the query if it looks like a code,
+        otherwise codes whose description contains all the words of the query (as prefixes, accents ignored).
+
+        Parameters
+        ----------
+        query: str
+            Text typed by the user.
+
+        Returns
+        -------
+        list of dicts
+            Matches sorted by code, with their code, description and ancestors codes.
+        """
+        if CODE_QUERY_REGEX.match(query):
+            codes = self.search_codes(query)
+        else:
+            tokens = TOKEN_REGEX.findall(fold_text(query))
+            if len(tokens) == 0:
+                return []
+            codes = self.search_token(tokens[0])
+            for token in tokens[1:]:
+                codes &= self.search_token(token)
+
+        return [
+            {
+                "code": code,
+                "description": self.descriptions[code],
+                "ancestors": self.get_ancestors(code),
+            }
+            for code in sorted(codes)
+        ]
+
+    def get_selected_leaves(self, waste_codes_filter: dict[str, list[str]]) -> set[str]:
+        """Returns the leaf codes selected by a waste codes filter, the ones below its checked codes."""
+        return set().union(
+            *(self.leaves.get(code, ()) for code in waste_codes_filter["checked"])
+        )
+
+    def get_waste_codes_filter(self, selected_leaves: set[str]) -> dict[str, list[str]]:
+        """
+        Builds the waste codes filter selecting the given leaf codes, as read by `format_filter`:
+        the codes whose leaves are all selected are checked (only the highest ones),
+        the codes whose leaves are partly selected are half-checked.
+
+        Parameters
+        ----------
+        selected_leaves: set of str
+            Selected leaf codes.
+
+        Returns
+        -------
+        dict
+            The filter, with its "checked" and "half_checked" codes.
+        """
+        if self.leaves["all"] <= selected_leaves:
+            return {"checked": ["all"], "half_checked": []}
+
+        checked, half_checked = [], []
+        for code, leaves in self.leaves.items():
+            if code == "all" or leaves.isdisjoint(selected_leaves):
+                continue
+            if not leaves <= selected_leaves:
+                half_checked.append(code)
+            elif not self.leaves[self.parents[code] or "all"] <= selected_leaves:
+                checked.append(code)
+        # Partly selected, whether the selected codes are whole chapters or not
+        if len(checked) + len(half_checked) > 0:
+            half_checked.append("all")
+
+        return {"checked": sorted(checked), "half_checked": sorted(half_checked)}
+
+    def update_waste_codes_filter(
+        self,
+        waste_codes_filter: dict[str, list[str]],
+        tree: list[dict],
+        checked_keys: list[str],
+    ) -> dict[str, list[str]]:
+        """
+        Applies the codes checked in the waste codes tree to a waste codes filter over the whole nomenclature.
+
+        The tree renders only a part of the nomenclature: the expanded codes, or the matches of a search.
+        Only its codes whose children are not rendered are read: checking one of them selects all the leaf codes
+        below it, unchecking it unselects them. The check state of the other rendered codes only reflects
+        their rendered children, and the codes not rendered keep their state.
+
+        Parameters
+        ----------
+        waste_codes_filter: dict
+            The current filter, with its "checked" and "half_checked" codes.
+        tree: list of dicts
+            The tree data rendered.
+        checked_keys: list of str
+            Codes checked in the tree.
+
+        Returns
+        -------
+        dict
+            The updated filter.
+        """
+        selected_leaves = self.get_selected_leaves(waste_codes_filter)
+        for code, checked in get_tree_frontier(tree, set(checked_keys or [])):
+            leaves = self.leaves.get(code, frozenset())
+            if checked:
+                selected_leaves |= leaves
+            elif leaves <= selected_leaves:
+                selected_leaves -= leaves
+
+        return self.get_waste_codes_filter(selected_leaves)
+
+    def get_checked_keys(
+        self, waste_codes_filter: dict[str, list[str]], tree: list[dict]
+    ) -> list[str]:
+        """Returns the codes of the tree data to check to render a waste codes filter, the tree checking their ancestors."""
+        selected_leaves = self.get_selected_leaves(waste_codes_filter)
+        return [
+            code
+            for code, _ in get_tree_frontier(tree, set())
+            if self.leaves.get(code, frozenset()) <= selected_leaves
+        ]
+
+
+def get_tree_frontier(
+    tree: list[dict], checked_keys: set[str], parent_checked: bool = False
+) -> list[tuple[str, bool]]:
+    """
+    Returns the codes of the tree data whose children are not rendered, the leaves and the codes not expanded yet,
+    with whether they are checked: in the tree, checking a code checks all its children.
+    """
+    frontier = []
+    for node in tree:
+        checked = parent_checked or node["key"] in checked_keys
+        if len(node["children"]) > 0:
+            frontier += get_tree_frontier(node["children"], checked_keys, checked)
+        elif node["key"] != "all":
+            frontier.append((node["key"], checked))
+    return frontier
+
+
+@cache_for_data_version
+def get_waste_code_index() -> WasteCodeIndex:
+    """Returns the index of the waste code nomenclature, built once per data version."""
+    return WasteCodeIndex(datasets.WASTE_CODE_NOMENCLATURE)
+
+
+def get_waste_code_search_tree(
+    matches: list[dict], loaded_codes: set[str] | None = None
+) -> list[dict]:
+    """
+    Returns the tree data of the waste codes tree restricted to the matches of a search and their ancestors.
+    Matched codes can be expanded as in the full tree, their children being loaded lazily.
+    The ancestors only have the children leading to the matches, so checking one of them in the tree only checks
+    these children (see `WasteCodeIndex.update_waste_codes_filter`).
+
+    Parameters
+    ----------
+    matches: list of dicts
+        Matches returned by `WasteCodeIndex.search`.
+    loaded_codes: set of str
+        Optional. Codes whose children are included in the tree.
+
+    Returns
+    -------
+    list of dicts
+        The tree data, with the 'all' node at the top.
+    """
+    matched_codes = {match["code"] for match in matches}
+    path_codes = {code for match in matches for code in match["ancestors"]}
+
+    def format_matches(waste_codes: list[dict]) -> list[dict]:
+        formatted = []
+        for waste_code in waste_codes:
+            if waste_code["code"] in matched_codes:
+                # Matches are rendered with all their children, the ones containing other matches being expanded
+                node = format_waste_codes(
+                    [waste_code],
+                    loaded_codes=(loaded_codes or set())
+                    | ({waste_code["code"]} & path_codes),
+                )[0]
+            elif waste_code["code"] in path_codes:
+                node = format_waste_codes([waste_code], loaded_codes=set())[0]
+                node["children"] = format_matches(waste_code["children"])
+                node.pop("isLeaf", None)
+            else:
+                continue
+            formatted.append(node)
+        return formatted
+
+    tree = format_waste_codes([], add_top_level=True)
+    tree[0]["children"] = format_matches(datasets.WASTE_CODE_NOMENCLATURE)
+
+    return tree
@@ -0,0 +1,190 @@
+"""
+Loading of the data and building of the pages in the background.
+
+The app serves the requests as soon as it is created: the datasets are loaded and the pages are built by
+a background thread, step by step. Until the steps a page depends on are done, the page shows
+a loading state with the progress of the steps (see src/pages/loading_page.py).
+The liveness and readiness of the worker, with the progress of each step, are served by the
+`/_health/live` and `/_health/ready` endpoints.
+"""
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Callable
+
+import flask
+from dash import Dash
+
+from src.boot import boot_profile
+from src.data import datasets
+from src.data.waste_code_search import get_waste_code_index
+from src.monitoring.boot import report_boot_profile
+from src.monitoring.memory import log_memory_report
+from src.monitoring.tracing import start_span
+from src.pages.advanced_statistics.advanced_statistics_layout_factory import (
+    create_filters_selects_elements,
+)
+from src.pages.home.home_layouts import build_layouts
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+logger = logging.getLogger("trackdechets.loading")
+logger.setLevel(logging.INFO)
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.propagate = False
+
+
+def build_advanced_statistics_elements():
+    """Builds the filters of the advanced statistics page and the waste codes search index."""
+    with boot_profile.phase("layout build"):
+        create_filters_selects_elements()
+        get_waste_code_index()
+
+
+# Name: (label shown on the loading page, function), in the order of their execution
+LOADING_STEPS = {
+    "datasets": ("Chargement des données", datasets.load_datasets),
+    "home": ("Construction de la page d'accueil", build_layouts),
+    "advanced_statistics": (
+        "Construction du mode avancé",
+        build_advanced_statistics_elements,
+    ),
+}
+
+
+class LoadingStep:
+    """Status and duration of a loading step."""
+
+    def __init__(self, name: str, label: str, func: Callable):
+        self.name = name
+        self.label = label
+        self.func = func
+        self.status = PENDING
+        self.started_at = None
+        self.duration = None
+        self.error = None
+
+    def run(self):
+        self.status = RUNNING
+        self.started_at = time.perf_counter()
+        try:
+            with start_span(f"loading.{self.name}"):
+                self.func()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.status = FAILED
+            raise
+        finally:
+            self.duration = time.perf_counter() - self.started_at
+        self.status = DONE
+
+    def to_dict(self) -> dict:
+        elapsed = self.duration
+        if self.status == RUNNING:
+            elapsed = time.perf_counter() - self.started_at
+        return {
+            "name": self.name,
+            "label": self.label,
+            "status": self.status,
+            "duration_s": elapsed,
+            "error": self.error,
+        }
+
+
+class LoadingState:
+    """Progress of the loading steps, run in order by a background thread."""
+
+    def __init__(self, steps: dict[str, tuple[str, Callable]]):
+        self.steps = {
+            name: LoadingStep(name, label, func)
+            for name, (label, func) in steps.items()
+        }
+        self.thread = None
+
+    def run(self):
+        """Runs the steps in order, stops at the first failed step."""
+        for step in self.steps.values():
+            logger.info(f"Loading step '{step.name}' started")
+            try:
+                step.run()
+            except Exception:
+                logger.error(
+                    f"Loading step '{step.name}' failed\n{traceback.format_exc()}"
+                )
+                return
+            logger.info(f"Loading step '{step.name}' done in {step.duration:.2f}s")
+
+    def is_ready(self, names: list[str] | None = None) -> bool:
+        """
+        Checks that the given steps are done.
+
+        Parameters
+        ----------
+        names: list of str
+            Optional. Names of the steps, all of them by default.
+        """
+        names = self.steps.keys() if names is None else names
+        return all(self.steps[name].status == DONE for name in names)
+
+    @property
+    def failed(self) -> bool:
+        return any(step.status == FAILED for step in self.steps.values())
+
+    def get_progress(self, names: list[str] | None = None) -> list[dict]:
+        """Status and duration of the given steps, all of them by default."""
+        names = self.steps.keys() if names is None else names
+        return [self.steps[name].to_dict() for name in names]
+
+
+loading_state = LoadingState(LOADING_STEPS)
+
+
+def run_background_loading():
+    # The boot goes on in this thread
+    boot_profile.move_to_current_thread()
+    loading_state.run()
+    report_boot_profile()
+    if loading_state.is_ready():
+        log_memory_report()
+
+
+def start_background_loading():
+    """
+    Starts the thread loading the data and building the pages.
+    Must be called once the app is created, after everything else.
+    """
+    boot_profile.set_ready_to_serve()
+    loading_state.thread = threading.Thread(
+        target=run_background_loading, name="background-loading", daemon=True
+    )
+    loading_state.thread.start()
+
+
+def register_health_endpoints(app: Dash):
+    """
+    Adds the public health endpoints of the worker, for the load balancers and the deployment checks:
+    `/_health/live` answers 200 unless the loading failed, and `/_health/ready` answers 200 once all the
+    loading steps are done, 503 before. Both send the progress of the loading steps.
+    """
+
+    def health_response(healthy: bool) -> tuple[flask.Response, int]:
+        return flask.jsonify(
+            ready=loading_state.is_ready(), steps=loading_state.get_progress()
+        ), (200 if healthy else 503)
+
+    def live():
+        return health_response(not loading_state.failed)
+
+    def ready():
+        return health_response(loading_state.is_ready())
+
+    app.server.add_url_rule("/_health/live", endpoint="health_live", view_func=live)
+    app.server.add_url_rule("/_health/ready", endpoint="health_ready", view_func=ready)
@@ -0,0 +1,69 @@
+"""
+Monitoring of the app: timings of the data extraction, processing and figures building (`timing`),
+metrics of the requests, caches and datasets in the Prometheus format (`metrics`),
+opt-in profiling of the callbacks requests (`profiling`), tracing of the requests (`tracing`),
+memory accounting of the datasets and cached layouts (`memory`), report of the boot profile (`boot`).
+
+The monitoring endpoints expose the internals of the app, they are only served to the requests authenticated
+with the secret set in the MONITORING_SECRET environment variable, sent as a bearer token
+(`Authorization: Bearer <secret>`) or as a `secret` query parameter. Without this variable, they are disabled.
+"""
+import hmac
+from os import getenv
+from typing import Callable
+
+import flask
+from dash import Dash
+
+MONITORING_SECRET = getenv("MONITORING_SECRET")
+
+
+def is_monitoring_request_authorized() -> bool:
+    """Checks that the current request is authenticated with the monitoring secret."""
+    if not MONITORING_SECRET:
+        return False
+
+    secret = flask.request.args.get("secret", "")
+    authorization = flask.request.headers.get("Authorization", "")
+    if authorization.startswith("Bearer "):
+        secret = authorization.removeprefix("Bearer ")
+
+    return hmac.compare_digest(secret.encode(), MONITORING_SECRET.encode())
+
+
+def add_monitoring_endpoint(app: Dash, path: str, view: Callable):
+    """
+    Adds a GET endpoint to the Flask server of the app, only served to authenticated requests
+    (see `is_monitoring_request_authorized`), the others get a 404 response.
+
+    Parameters
+    ----------
+    app: Dash
+        The Dash app.
+    path: str
+        Path of the endpoint, like '/_monitoring/timings'.
+    view: callable
+        Flask view function of the endpoint.
+    """
+
+    def guarded_view():
+        if not is_monitoring_request_authorized():
+            flask.abort(404)
+        return view()
+
+    app.server.add_url_rule(
+        path, endpoint=f"monitoring_{view.__name__}", view_func=guarded_view
+    )
+
+
+def get_request_label(app: Dash) -> str:
+    """Name of the callback of the current request, or its route for the other requests."""
+    path = flask.request.path.removeprefix(app.config.routes_pathname_prefix)
+    if flask.request.method == "POST" and path == "_dash-update-component":
+        body = flask.request.get_json(silent=True) or {}
+        callback = app.callback_map.get(body.get("output"), {}).get("callback")
+        return getattr(callback, "__name__", "unknown_callback")
+
+    if flask.request.url_rule is None:
+        return "not_found"
+    return flask.request.url_rule.rule
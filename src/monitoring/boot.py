@@ -0,0 +1,98 @@
+"""
+Report of the boot profile of the app (see src/boot.py).
+
+Once the data is loaded and the pages are built (see src/loading.py), the boot profile is logged as a JSON line
+by the 'trackdechets.boot' logger, with the slowest imports. It is reported by the `trackdechets_worker_boot_seconds`
+metrics and served in full by the `/_monitoring/boot` endpoint.
+"""
+import json
+import logging
+import sys
+
+import flask
+from dash import Dash
+
+from src.boot import boot_profile
+from src.monitoring import add_monitoring_endpoint
+from src.monitoring.metrics import metrics_registry
+
+# Number of packages and modules listed in the log, the slowest to import
+MAX_LOGGED_IMPORTS = 15
+
+logger = logging.getLogger("trackdechets.boot")
+logger.setLevel(logging.INFO)
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.propagate = False
+
+
+def get_boot_report(max_imports: int | None = None) -> dict:
+    """
+    Durations of the boot and of its phases, of the imports by top-level package and by module, in seconds.
+
+    Parameters
+    ----------
+    max_imports: int
+        Optional. Number of packages and modules listed, the slowest to import. All of them by default.
+    """
+    imports_by_package = boot_profile.get_imports_by_package()
+    imports_by_module = boot_profile.get_imports_by_module()
+    # Lists, to keep the slowest imports first in the JSON responses
+    return {
+        "boot_s": boot_profile.duration,
+        "ready_to_serve_s": boot_profile.ready_to_serve_duration,
+        "phases_s": dict(boot_profile.phases),
+        "imports_by_package_s": [
+            {"package": name, "self": duration}
+            for name, duration in list(imports_by_package.items())[:max_imports]
+        ],
+        "imports_by_module_s": [
+            {"module": name, "cumulative": cumulative, "self": self_duration}
+            for name, (cumulative, self_duration) in list(imports_by_module.items())[
+                :max_imports
+            ]
+        ],
+    }
+
+
+def collect_boot_gauges() -> list[tuple]:
+    """
+    Gauges of the durations of the boot of the worker and of its phases, and of the time after which
+    it could serve requests. The boot ones are only reported once the boot is over.
+    """
+    gauges = []
+    if boot_profile.ready_to_serve_duration is not None:
+        gauges.append(
+            (
+                "trackdechets_worker_ready_to_serve_seconds",
+                {},
+                boot_profile.ready_to_serve_duration,
+            )
+        )
+    if not boot_profile.finished:
+        return gauges
+
+    gauges.append(("trackdechets_worker_boot_seconds", {}, boot_profile.duration))
+    gauges.extend(
+        ("trackdechets_worker_boot_phase_seconds", {"phase": phase}, duration)
+        for phase, duration in boot_profile.phases.items()
+    )
+    return gauges
+
+
+def report_boot_profile():
+    """Ends the boot profile and logs it. Must be called once the data is loaded and the pages are built."""
+    boot_profile.finish()
+    logger.info(json.dumps(get_boot_report(MAX_LOGGED_IMPORTS)))
+
+
+def register_boot_profile(app: Dash):
+    """Adds the boot metrics and the `/_monitoring/boot` endpoint."""
+    metrics_registry.add_gauges_collector(collect_boot_gauges)
+
+    def boot():
+        return flask.jsonify(get_boot_report())
+
+    add_monitoring_endpoint(app, "/_monitoring/boot", boot)
@@ -0,0 +1,167 @@
+"""
+Memory accounting of the app: the estimated size of each dataset, the serialized size of the precomputed
+layouts and figures of the home page, of the results cached by data version (see `cache_for_data_version`)
+and of the payload cache (see src/serving.py), and the resident set size (RSS) of the process.
+
+The report is logged as a JSON line by the 'trackdechets.memory' logger at boot, once the data is loaded and
+the pages are built (see src/loading.py), and after each refresh of the data (at the first request served with a new data version).
+It is also served by the `/_monitoring/memory` endpoint.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import flask
+from dash import Dash
+
+from src.monitoring import add_monitoring_endpoint
+from src.monitoring.timing import estimate_size
+
+logger = logging.getLogger("trackdechets.memory")
+logger.setLevel(logging.INFO)
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.propagate = False
+
+
+def get_process_rss() -> int | None:
+    """Resident set size of the current process in bytes, None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def get_serialized_size(value) -> int | None:
+    """
+    Size in bytes of a value, as sent to the browser: DataFrames and Series are measured with `estimated_size`,
+    the other values (Dash components, figures, dicts...) are serialized in JSON like Dash does.
+    Returns None for the values that can't be serialized.
+    """
+    # Imported here as it imports plotly.offline, slow to import
+    from plotly.io.json import to_json_plotly
+
+    size = estimate_size(value)
+    if size is not None:
+        return size
+    try:
+        return len(to_json_plotly(value).encode())
+    except (TypeError, ValueError):
+        return None
+
+
+def get_memory_report() -> dict:
+    """Computes the memory accounting report of the current process."""
+    # Imported here as the pages modules use the monitoring ones
+    from src.data import datasets
+    from src.loading import loading_state
+    from src.pages.home import home_layouts
+    from src.serving import payload_cache
+
+    report = {
+        "generated_at": time.time(),
+        "data_version": datasets.get_data_version(),
+        "pid": os.getpid(),
+        "rss_bytes": get_process_rss(),
+    }
+
+    report["datasets"] = {}
+    if datasets.is_data_loaded():
+        report["datasets"] = {
+            name: {"rows": frame.height, "estimated_size_bytes": frame.estimated_size()}
+            for name, frame in datasets.get_datasets_frames().items()
+        }
+    report["datasets_total_bytes"] = sum(
+        e["estimated_size_bytes"] for e in report["datasets"].values()
+    )
+
+    report["layouts"] = {}
+    report["figures"] = {}
+    # The layouts are not built before the data is loaded
+    if loading_state.is_ready(["datasets", "home"]):
+        report["layouts"] = {
+            f"home_{year}": get_serialized_size(layout)
+            for year, layout in home_layouts.get_layouts().items()
+        }
+        report["layouts"]["home_year_switch_data"] = get_serialized_size(
+            home_layouts.get_years_switch_data()
+        )
+        # The figures are stored as their Plotly specs
+        report["figures"] = {
+            f"home_{year}.{name}": get_serialized_size(value)
+            for year, layout_data in home_layouts.get_layouts_data().items()
+            for name, value in layout_data.items()
+            if isinstance(value, dict)
+        }
+
+    report["data_caches"] = {}
+    for function_name, cache in datasets.get_data_version_caches().items():
+        sizes = [get_serialized_size(value) for value in cache.values()]
+        report["data_caches"][function_name] = {
+            "entries": len(sizes),
+            "serialized_size_bytes": sum(size for size in sizes if size is not None),
+        }
+
+    payloads = list(payload_cache.payloads.values())
+    report["payload_cache"] = {
+        "entries": len(payloads),
+        "size_bytes": sum(
+            len(variant)
+            for payload in payloads
+            for variant in payload.variants.values()
+        ),
+    }
+
+    return report
+
+
+# Data version of the last logged report
+reported_data_version = None
+reported_data_version_lock = threading.Lock()
+
+
+def log_memory_report() -> dict:
+    """Computes the memory accounting report and logs it."""
+    global reported_data_version
+
+    report = get_memory_report()
+    reported_data_version = report["data_version"]
+    logger.info(json.dumps(report))
+    return report
+
+
+def register_memory_report(app: Dash):
+    """
+    Registers the hook logging a new report after each refresh of the data (when a request is served
+    with a new data version) and adds the `/_monitoring/memory` endpoint.
+    The boot memory report is logged once the data is loaded and the pages are built (see src/loading.py).
+    """
+    # Imported here as the datasets use the monitoring modules
+    from src.data import datasets
+
+    @app.server.after_request
+    def report_memory_after_refresh(response: flask.Response) -> flask.Response:
+        global reported_data_version
+
+        data_version = datasets.get_data_version()
+        # The first data version is reported by the boot memory report
+        if reported_data_version is None or data_version == reported_data_version:
+            return response
+        with reported_data_version_lock:
+            if data_version != reported_data_version:
+                reported_data_version = data_version
+                # Reported in the background, not to delay the response
+                threading.Thread(target=log_memory_report, daemon=True).start()
+        return response
+
+    def memory():
+        return flask.jsonify(get_memory_report())
+
+    add_monitoring_endpoint(app, "/_monitoring/memory", memory)
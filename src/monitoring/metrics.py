@@ -0,0 +1,385 @@
+"""
+Metrics of the app in the Prometheus text format, served by the `/metrics` endpoint.
+
+Each request is counted and timed, by callback for the Dash callbacks (by route for the other requests),
+with the size of its response and whether it was served from the payload cache (see src/serving.py).
+The hits and misses of the `cache_for_data_version` caches, the calls coalesced by `single_flight`,
+the memory used by the datasets, the age of the data and the boot time of the workers are also reported.
+
+Gunicorn runs several workers, each with its own metrics. Every worker writes a snapshot of its metrics
+to a file of METRICS_DIR (a temporary directory by default), at most every FLUSH_INTERVAL_S seconds.
+The worker serving `/metrics` sums the counters and histograms of all the workers of the same
+server (the workers that stopped included, so that the counters never decrease) and reports
+the gauges of the running workers with a `worker` label.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable
+
+import flask
+from dash import Dash
+
+from src.monitoring import add_monitoring_endpoint, get_request_label
+
+METRICS_DIR = Path(
+    os.getenv("METRICS_DIR", Path(tempfile.gettempdir()) / "trackdechets-metrics")
+)
+FLUSH_INTERVAL_S = 1
+
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+BYTES_BUCKETS = [1_000, 10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000]
+
+# Name: (type, help, buckets of the histograms)
+METRICS = {
+    "trackdechets_requests_total": (
+        "counter",
+        "Number of requests, by callback and status code.",
+        None,
+    ),
+    "trackdechets_request_duration_seconds": (
+        "histogram",
+        "Duration of the requests, by callback.",
+        DURATION_BUCKETS,
+    ),
+    "trackdechets_response_size_bytes": (
+        "histogram",
+        "Size of the responses body, as sent (compressed or not), by callback.",
+        BYTES_BUCKETS,
+    ),
+    "trackdechets_payload_cache_requests_total": (
+        "counter",
+        "Number of cacheable requests served from the payload cache (hit) or computed (miss), by callback.",
+        None,
+    ),
+    "trackdechets_data_cache_requests_total": (
+        "counter",
+        "Number of calls of the functions cached by data version, served from the cache (hit), computed (miss) "
+        "or waiting for an identical call in flight (coalesced).",
+        None,
+    ),
+    "trackdechets_single_flight_calls_total": (
+        "counter",
+        "Number of calls of the single-flight functions, computed or waiting for an identical call in flight "
+        "(coalesced).",
+        None,
+    ),
+    "trackdechets_dataset_memory_bytes": (
+        "gauge",
+        "Estimated memory used by each dataset, by worker.",
+        None,
+    ),
+    "trackdechets_data_loaded_timestamp_seconds": (
+        "gauge",
+        "Unix time at which the data was loaded, by worker.",
+        None,
+    ),
+    "trackdechets_data_age_seconds": (
+        "gauge",
+        "Time since the data was loaded, by worker.",
+        None,
+    ),
+    "trackdechets_worker_boot_seconds": (
+        "gauge",
+        "Time taken by the worker to load the data and build the app, by worker.",
+        None,
+    ),
+    "trackdechets_worker_boot_phase_seconds": (
+        "gauge",
+        "Time taken by each phase of the boot of the worker (see src/boot.py), by worker.",
+        None,
+    ),
+    "trackdechets_worker_ready_to_serve_seconds": (
+        "gauge",
+        "Time after which the worker could serve requests, before the data is loaded, by worker.",
+        None,
+    ),
+}
+
+
+class MetricsRegistry:
+    """Counters and histograms of the current process, gauges being computed by collectors when needed."""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.gauges_collectors = []
+        self.lock = threading.Lock()
+        self.changed = False
+        self.flush_lock = threading.Lock()
+        self.flush_thread = None
+
+    def inc(self, name: str, labels: dict[str, str], value: float = 1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.changed = True
+
+    def observe(self, name: str, labels: dict[str, str], value: float):
+        key = (name, tuple(sorted(labels.items())))
+        buckets = METRICS[name][2]
+        with self.lock:
+            histogram = self.histograms.setdefault(
+                key, {"buckets": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0}
+            )
+            histogram["buckets"][bisect_left(buckets, value)] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+            self.changed = True
+
+    def add_gauges_collector(self, collector: Callable[[], list[tuple]]):
+        """Adds a function returning gauges values, as a list of (name, labels, value) tuples."""
+        self.gauges_collectors.append(collector)
+
+    def get_snapshot(self) -> dict:
+        with self.lock:
+            self.changed = False
+            counters = [
+                [name, dict(labels), v] for (name, labels), v in self.counters.items()
+            ]
+            histograms = [
+                [name, dict(labels), h["buckets"], h["sum"], h["count"]]
+                for (name, labels), h in self.histograms.items()
+            ]
+        gauges = [
+            [name, labels, value]
+            for collector in self.gauges_collectors
+            for name, labels, value in collector()
+        ]
+        return {
+            "pid": os.getpid(),
+            "counters": counters,
+            "histograms": histograms,
+            "gauges": gauges,
+        }
+
+    def get_snapshot_path(self) -> Path:
+        # Workers of the same server share the same parent process
+        return METRICS_DIR / f"{os.getppid()}-{os.getpid()}.json"
+
+    def flush(self):
+        """Writes the snapshot of the metrics of this process, atomically."""
+        with self.flush_lock:
+            METRICS_DIR.mkdir(parents=True, exist_ok=True)
+            path = self.get_snapshot_path()
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(self.get_snapshot()))
+            os.replace(tmp_path, path)
+
+    def start_flush_thread(self):
+        """Starts, in the current process, the thread writing the snapshots of the metrics when they change."""
+        if self.flush_thread is not None and self.flush_thread.is_alive():
+            return
+
+        def flush_periodically():
+            while True:
+                time.sleep(FLUSH_INTERVAL_S)
+                if not self.changed:
+                    continue
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+        self.flush_thread = threading.Thread(target=flush_periodically, daemon=True)
+        self.flush_thread.start()
+
+    def reset(self):
+        """Resets the metrics, in a forked process that must not report the metrics of its parent."""
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.changed = False
+        self.flush_thread = None
+
+
+metrics_registry = MetricsRegistry()
+# Gunicorn workers forked from a process that loaded the app (`--preload`) start with empty metrics
+os.register_at_fork(after_in_child=metrics_registry.reset)
+
+
+def is_process_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_workers_snapshots() -> list[tuple[dict, bool]]:
+    """
+    Reads the snapshots of the metrics of all the workers of the server, the current one being up to date.
+    The snapshots of the servers that are not running anymore are deleted.
+
+    Returns
+    -------
+    list of tuples
+        The snapshots, with whether the worker is still running.
+    """
+    metrics_registry.flush()
+
+    snapshots = []
+    for path in METRICS_DIR.glob("*.json"):
+        try:
+            ppid, pid = (int(e) for e in path.stem.split("-"))
+        except ValueError:
+            continue
+
+        if ppid != os.getppid():
+            if not is_process_running(ppid):
+                path.unlink(missing_ok=True)
+            continue
+
+        try:
+            snapshots.append((json.loads(path.read_text()), is_process_running(pid)))
+        except (OSError, ValueError):
+            continue
+
+    return snapshots
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for v in labels.values()
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels.keys(), escaped)) + "}"
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics(snapshots: list[tuple[dict, bool]]) -> str:
+    """Aggregates the snapshots of the workers and formats them in the Prometheus text format."""
+    samples = {name: {} for name in METRICS}
+
+    for snapshot, is_running in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = tuple(sorted(labels.items()))
+            samples[name][key] = samples[name].get(key, 0) + value
+        for name, labels, buckets, total, count in snapshot["histograms"]:
+            key = tuple(sorted(labels.items()))
+            histogram = samples[name].setdefault(
+                key, {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+            )
+            histogram["buckets"] = [
+                a + b for a, b in zip(histogram["buckets"], buckets)
+            ]
+            histogram["sum"] += total
+            histogram["count"] += count
+        if is_running:
+            for name, labels, value in snapshot["gauges"]:
+                labels = {**labels, "worker": str(snapshot["pid"])}
+                samples[name][tuple(sorted(labels.items()))] = value
+
+    # The age of the data is computed now, as the snapshots of idle workers may be old
+    for key, loaded_at in samples["trackdechets_data_loaded_timestamp_seconds"].items():
+        samples["trackdechets_data_age_seconds"][key] = time.time() - loaded_at
+
+    lines = []
+    for name, (metric_type, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for key, value in sorted(samples[name].items()):
+            labels = dict(key)
+            if metric_type != "histogram":
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+                continue
+
+            cumulated = 0
+            for le, bucket_count in zip(buckets + ["+Inf"], value["buckets"]):
+                cumulated += bucket_count
+                bucket_labels = format_labels({**labels, "le": str(le)})
+                lines.append(f"{name}_bucket{bucket_labels} {cumulated}")
+            lines.append(
+                f"{name}_sum{format_labels(labels)} {format_value(value['sum'])}"
+            )
+            lines.append(f"{name}_count{format_labels(labels)} {value['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def collect_data_gauges() -> list[tuple]:
+    """Gauges of the memory used by the datasets and of the time at which the data was loaded."""
+    # Imported here as the datasets use the metrics registry
+    from src.data import datasets
+
+    if not datasets.is_data_loaded():
+        return []
+
+    gauges = [
+        ("trackdechets_dataset_memory_bytes", {"dataset": name}, frame.estimated_size())
+        for name, frame in datasets.get_datasets_frames().items()
+    ]
+    gauges.append(
+        (
+            "trackdechets_data_loaded_timestamp_seconds",
+            {},
+            datasets.DATA_UPDATE_DATE.timestamp(),
+        )
+    )
+    return gauges
+
+
+def register_metrics(app: Dash):
+    """
+    Registers the hooks measuring the requests on the Flask server of the app, and the `/metrics` endpoint.
+    Must be called before `register_payload_cache`, so that the responses served from the payload cache are measured.
+    """
+    metrics_registry.add_gauges_collector(collect_data_gauges)
+
+    @app.server.before_request
+    def start_request_timer():
+        flask.g.request_started_at = time.perf_counter()
+
+    @app.server.after_request
+    def measure_request(response: flask.Response) -> flask.Response:
+        started_at = flask.g.get("request_started_at")
+        if started_at is None:
+            return response
+
+        label = get_request_label(app)
+        metrics_registry.inc(
+            "trackdechets_requests_total",
+            {"callback": label, "status": str(response.status_code)},
+        )
+        metrics_registry.observe(
+            "trackdechets_request_duration_seconds",
+            {"callback": label},
+            time.perf_counter() - started_at,
+        )
+        if response.content_length is not None:
+            metrics_registry.observe(
+                "trackdechets_response_size_bytes",
+                {"callback": label},
+                response.content_length,
+            )
+        payload_cache_result = flask.g.get("payload_cache_result")
+        if payload_cache_result is not None:
+            metrics_registry.inc(
+                "trackdechets_payload_cache_requests_total",
+                {"callback": label, "result": payload_cache_result},
+            )
+
+        # The thread is started lazily, in each gunicorn worker
+        metrics_registry.start_flush_thread()
+
+        return response
+
+    def metrics():
+        return flask.Response(
+            render_metrics(read_workers_snapshots()),
+            mimetype="text/plain; version=0.0.4",
+        )
+
+    add_monitoring_endpoint(app, "/metrics", metrics)
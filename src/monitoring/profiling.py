@@ -0,0 +1,200 @@
+"""
+Opt-in profiling of the Dash callbacks requests.
+
+The profiler is enabled by setting the PROFILES_DIR environment variable, the directory where the profiles
+are written. Without it, no hook is registered and the requests are not slowed down at all. Then, a callback
+request is profiled:
+- if PROFILE_ALL_CALLBACKS is set to 'true', for all the callbacks requests;
+- if the request has a `X-Profile-Request` header containing the monitoring secret (see src/monitoring/__init__.py).
+
+The profiler samples the stack of the thread handling the request every SAMPLING_INTERVAL_S seconds,
+from another thread, and writes the samples in the speedscope format (https://www.speedscope.app), which shows
+them as a flamegraph. Time spent in polars is attributed to the python function that called it.
+The name of the file contains the time of the request, the name of the callback and its inputs values.
+"""
+import hashlib
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from types import FrameType
+
+import flask
+from dash import Dash
+
+from src.monitoring import MONITORING_SECRET, get_request_label
+
+PROFILES_DIR = os.getenv("PROFILES_DIR")
+PROFILE_ALL_CALLBACKS = os.getenv("PROFILE_ALL_CALLBACKS", "").lower() == "true"
+PROFILE_HEADER = "X-Profile-Request"
+
+SAMPLING_INTERVAL_S = 0.001
+# Inputs values are truncated in the profiles filenames
+MAX_INPUTS_LENGTH = 80
+
+
+class SwitchIntervalGuard:
+    """
+    Lowers the switch interval of the process while requests are profiled, so that the samplers threads get the GIL.
+    The switch interval is global to the process: it is lowered by the first of the overlapping profiled requests
+    and restored by the last one.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active_samplers = 0
+        self.switch_interval = None
+
+    def acquire(self):
+        with self.lock:
+            if self.active_samplers == 0:
+                self.switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(SAMPLING_INTERVAL_S / 2)
+            self.active_samplers += 1
+
+    def release(self):
+        with self.lock:
+            self.active_samplers -= 1
+            if self.active_samplers == 0:
+                sys.setswitchinterval(self.switch_interval)
+
+
+switch_interval_guard = SwitchIntervalGuard()
+
+
+class StackSampler:
+    """Samples, from a background thread, the stack of a thread until it is stopped."""
+
+    def __init__(self, thread_id: int):
+        self.thread_id = thread_id
+        self.frames = []
+        self.frames_indices = {}
+        self.samples = []
+        self.weights = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def get_frame_index(self, frame: FrameType) -> int:
+        code = frame.f_code
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        if key not in self.frames_indices:
+            self.frames_indices[key] = len(self.frames)
+            self.frames.append({"name": code.co_name, "file": key[1], "line": key[2]})
+        return self.frames_indices[key]
+
+    def run(self):
+        last_sample_at = time.perf_counter()
+        while not self.stopped.wait(SAMPLING_INTERVAL_S):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(self.get_frame_index(frame))
+                frame = frame.f_back
+            # Speedscope stacks go from the root to the leaf
+            self.samples.append(stack[::-1])
+            self.weights.append(now - last_sample_at)
+            last_sample_at = now
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        # The sampler thread needs the GIL to take its samples
+        switch_interval_guard.acquire()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        switch_interval_guard.release()
+        self.duration = time.perf_counter() - self.started_at
+
+    def to_speedscope(self, name: str) -> dict:
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "trackdechets-public-stats",
+            "shared": {"frames": self.frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": self.duration,
+                    "samples": self.samples,
+                    "weights": self.weights,
+                }
+            ],
+        }
+
+
+def is_profiling_requested(app: Dash) -> bool:
+    """Checks that the current request is a callback request to profile."""
+    path = flask.request.path.removeprefix(app.config.routes_pathname_prefix)
+    if flask.request.method != "POST" or path != "_dash-update-component":
+        return False
+
+    if PROFILE_ALL_CALLBACKS:
+        return True
+
+    header = flask.request.headers.get(PROFILE_HEADER)
+    return (
+        header is not None
+        and bool(MONITORING_SECRET)
+        and hmac.compare_digest(header.encode(), MONITORING_SECRET.encode())
+    )
+
+
+def get_profile_filename(callback_name: str, inputs: list) -> str:
+    """Name of the profile of a callback request, from the name of the callback and its inputs values."""
+    inputs_text = "_".join(
+        f"{e.get('id')}.{e.get('property')}={json.dumps(e.get('value'))}"
+        for e in inputs
+        if isinstance(e, dict)
+    )
+    inputs_hash = hashlib.sha256(inputs_text.encode()).hexdigest()[:8]
+    inputs_text = re.sub(r"[^\w.=-]+", "_", inputs_text)[:MAX_INPUTS_LENGTH]
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+    return f"{timestamp}-{callback_name}-{inputs_text}-{inputs_hash}.speedscope.json"
+
+
+def register_request_profiler(app: Dash):
+    """Registers the hooks profiling the callbacks requests on the Flask server of the app, if PROFILES_DIR is set."""
+    if not PROFILES_DIR:
+        return
+
+    profiles_dir = Path(PROFILES_DIR)
+    profiles_dir.mkdir(parents=True, exist_ok=True)
+
+    @app.server.before_request
+    def start_profiler():
+        if not is_profiling_requested(app):
+            return
+        sampler = StackSampler(threading.get_ident())
+        flask.g.profiler = sampler
+        sampler.start()
+
+    @app.server.teardown_request
+    def write_profile(exception: BaseException | None):
+        sampler = flask.g.pop("profiler", None)
+        if sampler is None:
+            return
+        sampler.stop()
+
+        callback_name = get_request_label(app)
+        body = flask.request.get_json(silent=True) or {}
+        inputs = body.get("inputs", [])
+        # Pattern-matching inputs are lists of inputs
+        inputs = [e for i in inputs for e in (i if isinstance(i, list) else [i])]
+
+        path = profiles_dir / get_profile_filename(callback_name, inputs)
+        path.write_text(json.dumps(sampler.to_speedscope(callback_name)))
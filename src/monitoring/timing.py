@@ -0,0 +1,185 @@
+"""
+Timing of the data extraction, processing and figures building.
+
+Each call of a function decorated with `timed` is recorded with its duration, the number of rows of its
+DataFrame inputs and output, the estimated size of its output and its error if it failed. The records are kept
+in memory by `timings_registry` and served, with a summary by function, by the `/_monitoring/timings` endpoint.
+The calls made while booting or loading the data are also logged as JSON lines by the 'trackdechets.timings'
+logger, the calls made while serving a request are only logged at the DEBUG level.
+Each call also opens a tracing span (see src/monitoring/tracing.py), with the same attributes, and is attributed
+to the boot phase of its stage while the app is booting (see src/boot.py).
+"""
+import inspect
+import json
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from functools import wraps
+from typing import Any, Callable
+
+import flask
+import polars as pl
+from dash import Dash
+
+from src.boot import boot_profile
+from src.monitoring import add_monitoring_endpoint
+from src.monitoring.tracing import start_span
+
+# Number of records kept in memory, the oldest ones are dropped
+MAX_RECORDS = 2000
+
+# Boot phase of the functions of each stage (see src/boot.py)
+STAGES_BOOT_PHASES = {
+    "extract": "extraction",
+    "process": "processing",
+    "figure": "layout build",
+}
+
+logger = logging.getLogger("trackdechets.timings")
+logger.setLevel(logging.INFO)
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.propagate = False
+
+
+class TimingsRegistry:
+    """Latest timing records, and aggregated durations by function since the start of the process."""
+
+    def __init__(self, max_records: int = MAX_RECORDS):
+        self.records = deque(maxlen=max_records)
+        self.summary = {}
+        self.lock = threading.Lock()
+
+    def add(self, record: dict):
+        with self.lock:
+            self.records.append(record)
+            summary = self.summary.setdefault(
+                record["name"],
+                {
+                    "stage": record["stage"],
+                    "calls": 0,
+                    "errors": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                },
+            )
+            summary["calls"] += 1
+            summary["errors"] += record["error"] is not None
+            summary["total_ms"] += record["duration_ms"]
+            summary["max_ms"] = max(summary["max_ms"], record["duration_ms"])
+
+    def get_records(self) -> list[dict]:
+        with self.lock:
+            return list(self.records)
+
+    def get_summary(self) -> dict[str, dict]:
+        with self.lock:
+            return {
+                name: {**summary, "mean_ms": summary["total_ms"] / summary["calls"]}
+                for name, summary in self.summary.items()
+            }
+
+
+timings_registry = TimingsRegistry()
+
+
+def count_rows(value: Any) -> int | None:
+    """Number of rows of a DataFrame or a Series, or of all the frames of a tuple or a list."""
+    if isinstance(value, (pl.DataFrame, pl.Series)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        counts = [count_rows(e) for e in value]
+        if any(count is not None for count in counts):
+            return sum(count for count in counts if count is not None)
+    return None
+
+
+def estimate_size(value: Any) -> int | None:
+    """Estimated size in bytes of a DataFrame or a Series, or of all the frames of a tuple or a list."""
+    if isinstance(value, (pl.DataFrame, pl.Series)):
+        return value.estimated_size()
+    if isinstance(value, (tuple, list)):
+        sizes = [estimate_size(e) for e in value]
+        if any(size is not None for size in sizes):
+            return sum(size for size in sizes if size is not None)
+    return None
+
+
+def log_record(record: dict):
+    """Logs a timing record, at the DEBUG level for the calls made while serving a request."""
+    level = logging.DEBUG if flask.has_request_context() else logging.INFO
+    if logger.isEnabledFor(level):
+        logger.log(level, json.dumps(record))
+
+
+def timed(stage: str, label_arg: str | None = None) -> Callable:
+    """
+    Decorator recording the timing of each call of a function in `timings_registry`.
+
+    Parameters
+    ----------
+    stage: str
+        Stage of the function: 'extract', 'process' or 'figure'.
+    label_arg: str
+        Optional. Name of an argument of the function whose value is added to the records,
+        to tell apart the calls of a function used for several datasets.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        name = f"{func.__module__}.{func.__qualname__}"
+        signature = inspect.signature(func) if label_arg is not None else None
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            record = {"name": name, "stage": stage, "started_at": time.time()}
+            if signature is not None:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                record["label"] = str(bound.arguments.get(label_arg))
+
+            start = time.perf_counter()
+            result, error = None, None
+            with boot_profile.phase(STAGES_BOOT_PHASES[stage]), start_span(
+                name, {"stage": stage}
+            ) as span:
+                try:
+                    result = func(*args, **kwargs)
+                except BaseException as e:
+                    error = f"{type(e).__name__}: {e}"
+                    raise
+                finally:
+                    # The failed calls are recorded too
+                    record.update(
+                        duration_ms=(time.perf_counter() - start) * 1000,
+                        input_rows=count_rows(list(args) + list(kwargs.values())),
+                        output_rows=count_rows(result),
+                        output_size=estimate_size(result),
+                        error=error,
+                    )
+                    for key in ["input_rows", "output_rows", "output_size", "label"]:
+                        span.set_attribute(key, record.get(key))
+
+                    timings_registry.add(record)
+                    log_record(record)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def register_timings_endpoint(app: Dash):
+    """Adds the `/_monitoring/timings` endpoint, serving the latest timing records and the summary by function."""
+
+    def timings():
+        return flask.jsonify(
+            records=timings_registry.get_records(),
+            summary=timings_registry.get_summary(),
+        )
+
+    add_monitoring_endpoint(app, "/_monitoring/timings", timings)
@@ -0,0 +1,357 @@
+"""
+Tracing of the requests, with spans following the OpenTelemetry data model.
+
+Each request (except the static files ones) opens a root span, continuing the trace of the `traceparent` header
+if there is one (W3C Trace Context). The spans opened while handling the request with `start_span` or `traced`,
+like the ones of the functions decorated with `timed` (see src/monitoring/timing.py), are nested in it.
+The JSON serialization of the callbacks responses by Dash has its own span.
+
+The finished spans are kept in an in-memory ring buffer, shown by the `/_monitoring/traces` page,
+and, if TRACES_FILE is set, appended to this file as OTLP JSON lines (the format of the OpenTelemetry
+collector `otlpjsonfile` receiver).
+"""
+import html
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Iterator
+
+import flask
+from dash import Dash
+
+from src.monitoring import add_monitoring_endpoint, get_request_label
+
+TRACES_FILE = os.getenv("TRACES_FILE")
+# Number of finished spans kept in memory, the oldest ones are dropped
+MAX_SPANS = 5000
+# Number of traces shown by the traces page
+MAX_TRACES_SHOWN = 30
+
+SERVICE_NAME = "trackdechets-public-stats"
+STATIC_PATHS_PREFIXES = ["assets/", "_dash-component-suites/", "_favicon.ico"]
+
+# Span kinds and status codes of the OpenTelemetry protocol
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_CODE_UNSET = 0
+STATUS_CODE_ERROR = 2
+
+
+class Span:
+    """A timed operation, part of a trace, possibly nested in a parent span."""
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_span_id: str | None = None,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: dict[str, Any] | None = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.status_code = STATUS_CODE_UNSET
+        self.status_message = ""
+        self.start_time_unix_nano = time.time_ns()
+        self.end_time_unix_nano = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_error(self, exception: BaseException):
+        self.status_code = STATUS_CODE_ERROR
+        self.status_message = f"{type(exception).__name__}: {exception}"
+
+    def end(self):
+        self.end_time_unix_nano = time.time_ns()
+        spans_exporter.export(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_time_unix_nano - self.start_time_unix_nano) / 1e6
+
+    def to_otlp(self) -> dict:
+        """The span in the OTLP JSON encoding."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_time_unix_nano),
+            "endTimeUnixNano": str(self.end_time_unix_nano),
+            "attributes": [
+                {"key": key, "value": encode_attribute_value(value)}
+                for key, value in self.attributes.items()
+                if value is not None
+            ],
+            "status": {"code": self.status_code, "message": self.status_message},
+        }
+        if self.parent_span_id is not None:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+def encode_attribute_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class SpansExporter:
+    """Keeps the finished spans in a ring buffer and appends them to TRACES_FILE, if it is set."""
+
+    def __init__(self, max_spans: int = MAX_SPANS, traces_file: str | None = None):
+        self.spans = deque(maxlen=max_spans)
+        self.traces_file = traces_file
+        self.lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+            if self.traces_file:
+                line = {
+                    "resourceSpans": [
+                        {
+                            "resource": {
+                                "attributes": [
+                                    {
+                                        "key": "service.name",
+                                        "value": {"stringValue": SERVICE_NAME},
+                                    }
+                                ]
+                            },
+                            "scopeSpans": [
+                                {"scope": {"name": __name__}, "spans": [span.to_otlp()]}
+                            ],
+                        }
+                    ]
+                }
+                with open(self.traces_file, "a") as f:
+                    f.write(json.dumps(line) + "\n")
+
+    def get_traces(self) -> dict[str, list[Span]]:
+        """Finished spans by trace id, the latest traces first."""
+        with self.lock:
+            spans = list(self.spans)
+        traces = {}
+        for span in reversed(spans):
+            traces.setdefault(span.trace_id, []).append(span)
+        return traces
+
+
+spans_exporter = SpansExporter(traces_file=TRACES_FILE)
+current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+@contextmanager
+def start_span(
+    name: str,
+    attributes: dict[str, Any] | None = None,
+    kind: int = SPAN_KIND_INTERNAL,
+    trace_id: str | None = None,
+    parent_span_id: str | None = None,
+) -> Iterator[Span]:
+    """
+    Opens a span, nested in the current span if there is one, that becomes the current span until it ends.
+
+    Parameters
+    ----------
+    name: str
+        Name of the span.
+    attributes: dict
+        Optional. Attributes of the span, more can be set with `Span.set_attribute`.
+    kind: int
+        Kind of the span, SPAN_KIND_INTERNAL by default.
+    trace_id, parent_span_id: str
+        Optional. Ids of the trace and of the parent span, when the parent span is not the current one
+        (like a span of another service).
+    """
+    parent = current_span.get()
+    if trace_id is None:
+        trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        parent_span_id = parent.span_id if parent is not None else None
+
+    span = Span(name, trace_id, parent_span_id, kind, attributes)
+    token = current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.set_error(e)
+        raise
+    finally:
+        current_span.reset(token)
+        span.end()
+
+
+def traced(name: str | None = None) -> Callable:
+    """Decorator opening a span for each call of a function, named after the function by default."""
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def parse_traceparent(header: str | None) -> tuple[str, str] | tuple[None, None]:
+    """Parses a W3C `traceparent` header, like '00-<trace id>-<parent span id>-01'."""
+    parts = (header or "").strip().split("-")
+    if (
+        len(parts) == 4
+        and len(parts[1]) == 32
+        and len(parts[2]) == 16
+        and all(c in "0123456789abcdef" for c in parts[1] + parts[2])
+        and parts[1] != "0" * 32
+    ):
+        return parts[1], parts[2]
+    return None, None
+
+
+def render_traces_page(traces: dict[str, list[Span]]) -> str:
+    """HTML page showing the latest traces, as trees of spans with their durations."""
+    rows = []
+    for trace_id, spans in list(traces.items())[:MAX_TRACES_SHOWN]:
+        spans_ids = {span.span_id for span in spans}
+        children = {}
+        for span in sorted(spans, key=lambda s: s.start_time_unix_nano):
+            parent_id = (
+                span.parent_span_id if span.parent_span_id in spans_ids else None
+            )
+            children.setdefault(parent_id, []).append(span)
+
+        trace_start = min(span.start_time_unix_nano for span in spans)
+        trace_end = max(span.end_time_unix_nano for span in spans)
+        trace_duration = max(trace_end - trace_start, 1)
+
+        rows.append(
+            f"<tr><th colspan='3'>Trace {trace_id} - "
+            f"{(trace_end - trace_start) / 1e6:.1f} ms</th></tr>"
+        )
+
+        def add_rows(parent_id: str | None, depth: int):
+            for span in children.get(parent_id, []):
+                left = 100 * (span.start_time_unix_nano - trace_start) / trace_duration
+                width = max(
+                    100
+                    * (span.end_time_unix_nano - span.start_time_unix_nano)
+                    / trace_duration,
+                    0.2,
+                )
+                attributes = ", ".join(
+                    f"{k}={v}" for k, v in span.attributes.items() if v is not None
+                )
+                error = " error" if span.status_code == STATUS_CODE_ERROR else ""
+                rows.append(
+                    f"<tr class='span{error}'>"
+                    f"<td style='padding-left: {depth * 1.5}em' title='{html.escape(attributes)}'>"
+                    f"{html.escape(span.name)}</td>"
+                    f"<td class='duration'>{span.duration_ms:.2f} ms</td>"
+                    f"<td class='timeline'><div style='margin-left: {left:.2f}%; width: {width:.2f}%'></div></td>"
+                    "</tr>"
+                )
+                add_rows(span.span_id, depth + 1)
+
+        add_rows(None, 0)
+
+    return f"""<!DOCTYPE html>
+<html lang="fr">
+<head>
+<meta charset="utf-8">
+<title>Traces</title>
+<style>
+body {{ font-family: sans-serif; font-size: 13px; }}
+table {{ border-collapse: collapse; width: 100%; }}
+th {{ text-align: left; padding-top: 1.5em; }}
+td {{ padding: 2px 4px; white-space: nowrap; }}
+td.duration {{ text-align: right; width: 6em; }}
+td.timeline {{ width: 40%; }}
+td.timeline div {{ height: 10px; background: #000091; }}
+tr.error td {{ color: #ce0500; }}
+</style>
+</head>
+<body>
+<h1>{len(traces)} traces, les plus récentes en premier</h1>
+<table>{"".join(rows)}</table>
+</body>
+</html>"""
+
+
+def register_tracing(app: Dash):
+    """
+    Registers the hooks opening a span for each request on the Flask server of the app, the span of the
+    serialization of the callbacks responses and the `/_monitoring/traces` page.
+    """
+    # Dash serializes the responses of the callbacks with `to_json` (dash 2.8)
+    import dash._callback
+
+    dash._callback.to_json = traced("dash.to_json")(dash._callback.to_json)
+
+    @app.server.before_request
+    def start_request_span():
+        path = flask.request.path.removeprefix(app.config.routes_pathname_prefix)
+        if any(path.startswith(prefix) for prefix in STATIC_PATHS_PREFIXES):
+            return
+
+        trace_id, parent_span_id = parse_traceparent(
+            flask.request.headers.get("traceparent")
+        )
+        span = Span(
+            f"{flask.request.method} {get_request_label(app)}",
+            trace_id or secrets.token_hex(16),
+            parent_span_id,
+            SPAN_KIND_SERVER,
+            {"http.method": flask.request.method, "http.target": flask.request.path},
+        )
+        flask.g.request_span = span
+        flask.g.request_span_token = current_span.set(span)
+
+    @app.server.after_request
+    def set_response_attributes(response: flask.Response) -> flask.Response:
+        span = flask.g.get("request_span")
+        if span is not None:
+            span.set_attribute("http.status_code", response.status_code)
+            span.set_attribute("http.response_content_length", response.content_length)
+            response.headers["traceparent"] = f"00-{span.trace_id}-{span.span_id}-01"
+        return response
+
+    @app.server.teardown_request
+    def end_request_span(exception: BaseException | None):
+        span = flask.g.pop("request_span", None)
+        if span is None:
+            return
+        current_span.reset(flask.g.pop("request_span_token"))
+        if exception is not None:
+            span.set_error(exception)
+        span.end()
+
+    def traces():
+        if flask.request.args.get("format") == "json":
+            return flask.jsonify(
+                [
+                    {"traceId": trace_id, "spans": [span.to_otlp() for span in spans]}
+                    for trace_id, spans in spans_exporter.get_traces().items()
+                ]
+            )
+        return render_traces_page(spans_exporter.get_traces())
+
+    add_monitoring_endpoint(app, "/_monitoring/traces", traces)
@@ -3,8 +3,10 @@
 
 from dash import dcc, html, register_page
 
+from src.loading import loading_state
 from src.pages.advanced_statistics.advanced_statistics_layout_factory import \
     create_filters_selects_elements
+from src.pages.loading_page import get_loading_layout
 
 register_page(
     __name__,
@@ -13,15 +15,20 @@ register_page(
     name="Mode avancé - Statistiques Publiques de Trackdéchets",
 )
 
+# Loading steps the page needs (see src/loading.py)
+REQUIRED_LOADING_STEPS = ["datasets", "advanced_statistics"]
+
 
 def layout() -> html.Div:
     """
-    Creates initial layout.
+    Creates initial layout, or the loading state until the filters are built.
 
     Returns
     -------
     A Dash Div with the id 'main-container'.
     """
+    if not loading_state.is_ready(REQUIRED_LOADING_STEPS):
+        return get_loading_layout(REQUIRED_LOADING_STEPS)
 
     elements = [
         create_filters_selects_elements(),
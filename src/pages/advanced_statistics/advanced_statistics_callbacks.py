@@ -1,95 +1,196 @@
 """
 This module contains all callbacks for "Advanced Statistics" page.
 """
-from dash import Input, Output, State, callback
+from dash import Input, Output, State, callback, ctx, no_update
+from dash._callback import NoUpdate
 from dash.development.base_component import Component
 
+from src.data.waste_code_search import get_waste_code_index
 from src.pages.advanced_statistics.advanced_statistics_layout_factory import (
     create_filtered_waste_processed_figure,
     create_input_output_elements,
+    get_filtered_bs_data,
+    get_waste_code_search_message,
+    get_waste_code_tree_for_search,
 )
 
 
 @callback(
     inputs=[
         Input("departement-select", "value"),
-        Input("waste-select", "checkedKeys"),
-        State("waste-select", "halfCheckedKeys"),
+        Input("waste-select-filter", "data"),
+    ],
+    output=[
+        Output("waste-processed-fig", "children"),
+        Output("total-processed-figures-container", "children"),
     ],
-    output=Output("waste-processed-fig", "children"),
 )
-def create_waste_processed_figure(
+def create_waste_processed_elements(
     departement_filter: str,
-    waste_codes_filters_checked: list[str],
-    waste_codes_filters_half_checked: list[str],
-) -> list[Component]:
+    waste_codes_filters: dict[str, list[str]],
+) -> tuple[list[Component], list[Component]]:
     """
-    Creates a filtered figure for waste processed by merging checked and half-checked waste codes.
+    Creates the filtered figure for waste processed and the dash elements containing the three figures
+    computed after data is filtered by given filter values:
+    - Total number of processed waste incoming
+    - Total number of waste outgoing
+    - Total number of waste created and processed inside the departement.
+
+    Data is filtered only once and shared between both outputs.
+    If no department value is selected,
+    figures are not computed and instead an informational message is returned.
 
-    Parameters:
+    Parameters
     ----------
-    departement_filter : str
+    departement_filter: str
         The selected departement code (INSEE code) for the filter.
-    waste_codes_filters_checked : list
-        List of waste codes checked by the user.
-    waste_codes_filters_half_checked : list
-        List of waste codes that are half-checked by the user.
+    waste_codes_filters: dict
+        Waste codes checked and half-checked by the user, over the whole nomenclature.
 
-    Returns:
+    Returns
     -------
-    list
-        A list containing the filtered waste processed figure.
+    tuple
+        The first element is a list containing the filtered waste processed figure.
+        The second element is the list of elements to display the total number of processed waste.
 
     """
-    waste_codes_filters = {
-        "checked": waste_codes_filters_checked,
-        "half_checked": waste_codes_filters_half_checked,
-    }
-    return create_filtered_waste_processed_figure(
-        departement_filter, waste_codes_filters
+    bs_data_filtered = get_filtered_bs_data(departement_filter, waste_codes_filters)
+
+    return (
+        create_filtered_waste_processed_figure(
+            departement_filter, waste_codes_filters, bs_data_filtered
+        ),
+        create_input_output_elements(
+            departement_filter, waste_codes_filters, bs_data_filtered
+        ),
     )
 
 
 @callback(
+    output=[
+        Output("waste-select", "treeData"),
+        Output("waste-select", "expandedKeys"),
+        Output("waste-select", "checkedKeys"),
+        Output("waste-select-loaded-codes", "data"),
+        Output("waste-select-search-message", "children"),
+    ],
     inputs=[
-        Input("departement-select", "value"),
-        Input("waste-select", "checkedKeys"),
-        State("waste-select", "halfCheckedKeys"),
+        Input("waste-select", "expandedKeys"),
+        Input("waste-select-search", "value"),
+    ],
+    state=[
+        State("waste-select-loaded-codes", "data"),
+        State("waste-select-filter", "data"),
     ],
-    output=Output("total-processed-figures-container", "children"),
+    prevent_initial_call=True,
 )
-def create_waste_processed_numbers(
-    departement_filter: str,
-    waste_codes_filters_checked: list[str],
-    waste_codes_filters_half_checked: list[str],
-) -> list[Component]:
+def update_waste_codes_tree(
+    expanded_keys: list[str],
+    search_value: str | None,
+    loaded_codes: list[str],
+    waste_codes_filter: dict[str, list[str]],
+) -> tuple[list[dict], list[str], list[str], list[str], Component | None] | NoUpdate:
     """
-    Creates dash elements containing the three figures
-    computed after data is filtered by given filter values:
-    - Total number of processed waste incoming
-    - Total number of waste outgoing
-    - Total number of waste created and processed inside the departement.
+    Updates the waste codes tree when a waste code is expanded or when the user searches the nomenclature.
 
-    If no department value is selected,
-    figures are not computed and instead an informational message is returned.
+    The tree is first rendered with the chapters only, so that the whole nomenclature
+    is not sent to the browser: the children of a waste code are added when it is expanded.
+    When the user searches a code or a description, only the first matches and their ancestors are rendered,
+    the ancestors being expanded, and the user is told when some matches are not rendered.
+    The codes checked in the tree are rendered from the codes selected over the whole nomenclature.
 
     Parameters
     ----------
-    departement_filter: str
-        Filter based on departement.
-    waste_codes_filters_checked: list[str]
-        Filter based on checked waste codes.
-    waste_codes_filters_half_checked: list[str]
-        Filter based on half-checked waste codes.
+    expanded_keys: list[str]
+        Waste codes expanded by the user.
+    search_value: str
+        Text searched by the user.
+    loaded_codes: list[str]
+        Waste codes whose children are already in the tree.
+    waste_codes_filter: dict
+        Waste codes checked and half-checked by the user, over the whole nomenclature.
 
     Returns
     -------
-    list
-        List of elements to display the total number of processed waste.
+    tuple
+        The first element is the updated tree data.
+        The second element is the list of expanded waste codes.
+        The third element is the list of checked waste codes.
+        The fourth element is the updated list of waste codes whose children are in the tree.
+        The fifth element is the message about the matches of the search.
 
     """
-    waste_codes_filters = {
-        "checked": waste_codes_filters_checked,
-        "half_checked": waste_codes_filters_half_checked,
-    }
-    return create_input_output_elements(departement_filter, waste_codes_filters)
+    new_codes = set(expanded_keys or []) - set(loaded_codes) - {"all"}
+    search_triggered = ctx.triggered_id == "waste-select-search"
+    if not search_triggered and len(new_codes) == 0:
+        return no_update
+
+    loaded_codes = set(loaded_codes) | new_codes
+    tree, matches, matches_count = get_waste_code_tree_for_search(
+        search_value, loaded_codes
+    )
+
+    expanded_keys = no_update
+    if search_triggered:
+        expanded_keys = ["all"] + sorted(
+            {code for match in matches for code in match["ancestors"]}
+        )
+
+    return (
+        tree,
+        expanded_keys,
+        get_waste_code_index().get_checked_keys(waste_codes_filter, tree),
+        sorted(loaded_codes),
+        get_waste_code_search_message(matches_count),
+    )
+
+
+@callback(
+    output=Output("waste-select-filter", "data"),
+    inputs=[Input("waste-select", "checkedKeys")],
+    state=[
+        State("waste-select-filter", "data"),
+        State("waste-select-search", "value"),
+        State("waste-select-loaded-codes", "data"),
+    ],
+    prevent_initial_call=True,
+)
+def update_waste_codes_filter(
+    checked_keys: list[str],
+    waste_codes_filter: dict[str, list[str]],
+    search_value: str | None,
+    loaded_codes: list[str],
+) -> dict[str, list[str]] | NoUpdate:
+    """
+    Updates the waste codes selected by the user when codes are checked in the waste codes tree.
+
+    The tree renders only a part of the nomenclature, so its checked codes can't be used as the filter:
+    a code checked in the results of a search means only its rendered children,
+    and the codes not rendered are not in the checked codes. They are applied instead to the codes selected
+    over the whole nomenclature (see `WasteCodeIndex.update_waste_codes_filter`).
+
+    Parameters
+    ----------
+    checked_keys: list[str]
+        Waste codes checked in the tree.
+    waste_codes_filter: dict
+        Waste codes checked and half-checked by the user, over the whole nomenclature.
+    search_value: str
+        Text searched by the user.
+    loaded_codes: list[str]
+        Waste codes whose children are in the tree.
+
+    Returns
+    -------
+    dict
+        The updated waste codes checked and half-checked, over the whole nomenclature.
+
+    """
+    tree, _, _ = get_waste_code_tree_for_search(search_value, set(loaded_codes))
+    new_waste_codes_filter = get_waste_code_index().update_waste_codes_filter(
+        waste_codes_filter, tree, checked_keys
+    )
+    if new_waste_codes_filter == waste_codes_filter:
+        return no_update
+
+    return new_waste_codes_filter
@@ -9,35 +9,116 @@ from dash import dcc, html
 from dash.development.base_component import Component
 from feffery_antd_components.AntdTree import AntdTree
 
-from src.data.data_extract import (
-    get_departement_geographical_data,
-    get_waste_code_hierarchical_nomenclature,
-)
 from src.data.data_processing import (
     get_recovered_and_eliminated_quantity_processed_by_week_series,
     get_weekly_waste_quantity_processed_by_operation_code_df,
 )
-from src.data.datasets import ALL_BORDEREAUX_DATA, DEPARTEMENTS_GEOGRAPHICAL_DATA
+from src.data import datasets
+from src.data.datasets import cache_for_data_version, single_flight
+from src.data.utils import format_waste_codes
+from src.data.waste_code_search import (
+    get_waste_code_index,
+    get_waste_code_search_tree,
+)
+from src.monitoring.tracing import start_span, traced
 from src.pages.advanced_statistics.utils import format_filter
 from src.pages.figures_factory import create_weekly_quantity_processed_figure
 from src.pages.utils import add_callout
 
+# Maximum number of matches of a waste codes search rendered in the tree
+MAX_WASTE_CODE_SEARCH_MATCHES = 100
 
-def create_filters_selects_elements() -> html.Div:
+
+def get_waste_code_tree(loaded_codes: set[str] | None = None) -> list[dict]:
     """
-    Returns a `html.Div` object containing the filters for selecting departments and waste codes.
+    Returns the waste code nomenclature formatted for the waste codes tree.
+    The tree is loaded lazily: only the chapters and the children of the codes expanded by the user are included.
+
+    Parameters
+    ----------
+    loaded_codes: set of str
+        Optional. Codes whose children are included in the tree.
 
     Returns
     -------
-    html.Div
-        A `html.Div` object containing the filters.
+    list of dicts
+        The tree data, with the 'all' node at the top.
 
     """
 
-    geographical_data = DEPARTEMENTS_GEOGRAPHICAL_DATA
-    waste_nomenclature = get_waste_code_hierarchical_nomenclature()
+    return format_waste_codes(
+        datasets.WASTE_CODE_NOMENCLATURE,
+        add_top_level=True,
+        loaded_codes=loaded_codes or set(),
+    )
+
+
+def get_waste_code_tree_for_search(
+    search_value: str | None, loaded_codes: set[str]
+) -> tuple[list[dict], list[dict], int]:
+    """
+    Returns the waste codes tree rendered for the search of the user: the lazily loaded tree if there is no search,
+    otherwise the first matches of the search and their ancestors (see `get_waste_code_search_tree`).
+
+    Parameters
+    ----------
+    search_value: str
+        Text searched by the user.
+    loaded_codes: set of str
+        Codes whose children are included in the tree.
+
+    Returns
+    -------
+    tuple
+        The first element is the tree data.
+        The second element is the list of the matches rendered, at most `MAX_WASTE_CODE_SEARCH_MATCHES`.
+        The third element is the total number of matches, None if there is no search.
+
+    """
+
+    search_value = (search_value or "").strip()
+    if not search_value:
+        return get_waste_code_tree(loaded_codes), [], None
+
+    matches = get_waste_code_index().search(search_value)
+    rendered_matches = matches[:MAX_WASTE_CODE_SEARCH_MATCHES]
+    return (
+        get_waste_code_search_tree(rendered_matches, loaded_codes),
+        rendered_matches,
+        len(matches),
+    )
+
+
+def get_waste_code_search_message(matches_count: int | None) -> html.P | None:
+    """Returns the message telling the user how many codes match the search, if the search is truncated or empty."""
+
+    message = None
+    if matches_count == 0:
+        message = "Aucun code déchet ne correspond à la recherche."
+    elif matches_count is not None and matches_count > MAX_WASTE_CODE_SEARCH_MATCHES:
+        message = (
+            f"Seuls les {MAX_WASTE_CODE_SEARCH_MATCHES} premiers des {matches_count} codes déchets "
+            "correspondant à la recherche sont affichés, précisez la recherche pour voir les autres."
+        )
+
+    if message is None:
+        return None
+    return html.P(message, className="fr-info-text")
+
+
+@cache_for_data_version
+def get_departement_options() -> list[dict]:
+    """
+    Returns the options of the departement dropdown, built once per data version.
+
+    Returns
+    -------
+    list of dicts
+        One option by departement, plus the 'France entière' option.
+
+    """
 
-    geographical_data = geographical_data.to_dict(as_series=False)
+    geographical_data = datasets.DEPARTEMENTS_GEOGRAPHICAL_DATA.to_dict(as_series=False)
     options = [
         {"value": a, "label": b}
         for a, b in zip(
@@ -47,6 +128,24 @@ def create_filters_selects_elements() -> html.Div:
 
     options.insert(0, {"value": "all", "label": "France entière"})
 
+    return options
+
+
+@cache_for_data_version
+def create_filters_selects_elements() -> html.Div:
+    """
+    Returns a `html.Div` object containing the filters for selecting departments and waste codes.
+    The filters are created once per data version.
+
+    Returns
+    -------
+    html.Div
+        A `html.Div` object containing the filters.
+
+    """
+
+    options = get_departement_options()
+
     departements_dropdown = html.Div(
         [
             html.Label(
@@ -103,16 +202,51 @@ def create_filters_selects_elements() -> html.Div:
                                                 id="fr-modal-title-modal-1",
                                                 className="fr-modal__title",
                                             ),
+                                            html.Div(
+                                                [
+                                                    html.Label(
+                                                        [
+                                                            "Rechercher un code ou un libellé :"
+                                                        ],
+                                                        className="fr-label",
+                                                        htmlFor="waste-select-search",
+                                                    ),
+                                                    dcc.Input(
+                                                        id="waste-select-search",
+                                                        type="search",
+                                                        className="fr-input",
+                                                        placeholder="Exemple : 16 01 04 ou amiante",
+                                                        debounce=True,
+                                                    ),
+                                                    html.Div(
+                                                        id="waste-select-search-message"
+                                                    ),
+                                                ],
+                                                className="fr-input-group",
+                                            ),
                                             AntdTree(
                                                 id="waste-select",
                                                 className="waste-select",
-                                                treeData=waste_nomenclature,
+                                                treeData=get_waste_code_tree(),
                                                 # multiple=True,
                                                 checkable=True,
                                                 selectable=False,
                                                 defaultCheckedKeys=["all"],
                                                 defaultExpandedKeys=["all"],
                                             ),
+                                            dcc.Store(
+                                                id="waste-select-loaded-codes",
+                                                data=[],
+                                            ),
+                                            # Codes selected over the whole nomenclature, the tree rendering
+                                            # only a part of it (see `WasteCodeIndex.update_waste_codes_filter`)
+                                            dcc.Store(
+                                                id="waste-select-filter",
+                                                data={
+                                                    "checked": ["all"],
+                                                    "half_checked": [],
+                                                },
+                                            ),
                                         ],
                                         className="fr-modal__content",
                                     ),
@@ -141,8 +275,89 @@ def create_filters_selects_elements() -> html.Div:
     return selects_div
 
 
-def create_filtered_waste_processed_figure(
+def get_filters_key(
+    departement_filter: str | None,
+    waste_codes_filter: dict[str, list[str]],
+    *args,
+) -> tuple:
+    """
+    Normalizes the filters of the advanced statistics page, to coalesce the concurrent computations of the same
+    filters (see `single_flight`). The order of the waste codes doesn't change the filtered data.
+    The other arguments, like the data already filtered with these filters, are ignored.
+    """
+    return (
+        departement_filter or "all",
+        tuple(sorted(waste_codes_filter.get("checked") or [])),
+        tuple(sorted(waste_codes_filter.get("half_checked") or [])),
+    )
+
+
+@traced()
+@single_flight(get_filters_key)
+def get_filtered_bs_data(
     departement_filter: str, waste_codes_filter: dict[str, list[str]]
+) -> pl.DataFrame:
+    """
+    Applies the filters shared by all the elements of the advanced statistics page to the 'bordereaux' data.
+    Only 'bordereaux' processed with a final processing operation since the beginning of 2022 are kept,
+    then data is filtered by waste codes and, if needed, restricted to the flows that involve the departement.
+
+    Parameters
+    ----------
+    departement_filter : str
+        The code of the departement to filter the data by. If "all" or None is passed, no departement filter is applied.
+    waste_codes_filter : dict with "checked" and "half checked" keys
+        The dictionary that contains the waste codes checked or half-checked on UI that will be used for filtering.
+
+    Returns
+    -------
+    DataFrame
+        Filtered 'bordereaux' data, ready to be passed to `create_filtered_waste_processed_figure`
+        and `create_input_output_elements`.
+    """
+    date_interval = (
+        datetime(2022, 1, 3, tzinfo=ZoneInfo("Europe/Paris")),
+        datetime.now(tz=ZoneInfo("Europe/Paris")),
+    )
+    bs_data_filter = (
+        pl.col("processed_at").is_between(*date_interval, closed="left")
+        & pl.col("processing_operation")
+        .is_in(
+            [
+                "D9",
+                "D13",
+                "D14",
+                "D15",
+                "R12",
+                "R13",
+            ]
+        )
+        .is_not()
+        & pl.col("status").is_in(["PROCESSED", "FOLLOWED_WITH_PNTTD"])
+    )
+
+    if (departement_filter is not None) and (departement_filter != "all"):
+        bs_data_filter = bs_data_filter & (
+            (pl.col("destination_departement") == departement_filter)
+            | (pl.col("emitter_departement") == departement_filter)
+        )
+
+    waste_filter_formatted = format_filter(pl.col("waste_code"), waste_codes_filter)
+    if waste_filter_formatted is not None:
+        bs_data_filter = bs_data_filter & waste_filter_formatted
+
+    with start_span("filter_bordereaux_data") as span:
+        bs_data_filtered = datasets.ALL_BORDEREAUX_DATA.filter(bs_data_filter)
+        span.set_attribute("output_rows", len(bs_data_filtered))
+    return bs_data_filtered
+
+
+@traced()
+@single_flight(get_filters_key)
+def create_filtered_waste_processed_figure(
+    departement_filter: str,
+    waste_codes_filter: dict[str, list[str]],
+    bs_data_filtered: pl.DataFrame | None = None,
 ) -> list[Component]:
     """
     Create a plot of the quantity of hazardous waste processed and tracked by week. The data is, if needed, filtered by departement
@@ -155,6 +370,9 @@ def create_filtered_waste_processed_figure(
         plot.
     waste_codes_filter : dict with "checked" and "half checked" keys
         The dictionary that contains the waste codes checked or half-checked on UI that will be used for filtering.
+    bs_data_filtered : DataFrame
+        Optional. Data already filtered by `get_filtered_bs_data` with the same filters.
+        If None, the filters are applied here.
 
     Returns:
     --------
@@ -168,12 +386,13 @@ def create_filtered_waste_processed_figure(
      dcc.Graph(figure=...)]
 
     """
-    geographical_data = DEPARTEMENTS_GEOGRAPHICAL_DATA
-    bs_data = ALL_BORDEREAUX_DATA
+    geographical_data = datasets.DEPARTEMENTS_GEOGRAPHICAL_DATA
+
+    if bs_data_filtered is None:
+        bs_data_filtered = get_filtered_bs_data(departement_filter, waste_codes_filter)
 
     departement_filter_str = ""
 
-    bs_data_filtered = bs_data
     if (departement_filter is not None) and (departement_filter != "all"):
         departement_filter_str = (
             "- "
@@ -185,10 +404,6 @@ def create_filtered_waste_processed_figure(
             pl.col("destination_departement") == departement_filter
         )
 
-    waste_filter_formatted = format_filter(pl.col("waste_code"), waste_codes_filter)
-    if waste_filter_formatted is not None:
-        bs_data_filtered = bs_data_filtered.filter(waste_filter_formatted)
-
     date_interval = (
         datetime(2022, 1, 3, tzinfo=ZoneInfo("Europe/Paris")),
         datetime.now(tz=ZoneInfo("Europe/Paris")),
@@ -197,7 +412,6 @@ def create_filtered_waste_processed_figure(
         bs_data_filtered,
         date_interval,
     )
-
     (
         df_recovered,
         df_eliminated,
@@ -218,8 +432,12 @@ def create_filtered_waste_processed_figure(
     return elements
 
 
+@traced()
+@single_flight(get_filters_key)
 def create_input_output_elements(
-    departement_filter: str, waste_codes_filter: dict[str, list[str]]
+    departement_filter: str,
+    waste_codes_filter: dict[str, list[str]],
+    bs_data_filtered: pl.DataFrame | None = None,
 ) -> list[Component]:
     """
     Create input/output elements for a Dash application.
@@ -230,6 +448,9 @@ def create_input_output_elements(
         The filter to apply on the departement data. If set to 'all', no filter is applied.
     waste_codes_filter : list[str]
         The list of waste codes to filter the bordereaux data by.
+    bs_data_filtered : DataFrame
+        Optional. Data already filtered by `get_filtered_bs_data` with the same filters.
+        If None, the filters are applied here.
 
     Returns
     -------
@@ -239,45 +460,29 @@ def create_input_output_elements(
         If no departemenent filter is provided (departement_filter is None or "all"), then nothing is returned.
 
     """
-    geographical_data = get_departement_geographical_data()
-    bs_data = ALL_BORDEREAUX_DATA
+    geographical_data = datasets.DEPARTEMENTS_GEOGRAPHICAL_DATA
 
     departement_filter_str = ""
 
-    date_interval = (
-        datetime(2022, 1, 3, tzinfo=ZoneInfo("Europe/Paris")),
-        datetime.now(tz=ZoneInfo("Europe/Paris")),
-    )
-    bs_data = bs_data.filter(
-        pl.col("processed_at").is_between(*date_interval, closed="left")
-        & pl.col("processing_operation")
-        .is_in(
-            [
-                "D9",
-                "D13",
-                "D14",
-                "D15",
-                "R12",
-                "R13",
-            ]
-        )
-        .is_not()
-        & pl.col("status").is_in(["PROCESSED", "FOLLOWED_WITH_PNTTD"])
-    )
     if (departement_filter is not None) and (departement_filter != "all"):
+        if bs_data_filtered is None:
+            bs_data_filtered = get_filtered_bs_data(
+                departement_filter, waste_codes_filter
+            )
+
         departement_filter_str = geographical_data.filter(
             pl.col("code_departement") == departement_filter
         )["libelle"].item()
 
-        bs_data_processed_incoming_filtered = bs_data.filter(
+        bs_data_processed_incoming_filtered = bs_data_filtered.filter(
             (pl.col("destination_departement") == departement_filter)
             & (pl.col("emitter_departement") != departement_filter)
         )
-        bs_data_processed_outgoing_filtered = bs_data.filter(
+        bs_data_processed_outgoing_filtered = bs_data_filtered.filter(
             (pl.col("emitter_departement") == departement_filter)
             & (pl.col("destination_departement") != departement_filter)
         )
-        bs_data_processed_locally_filtered = bs_data.filter(
+        bs_data_processed_locally_filtered = bs_data_filtered.filter(
             (pl.col("destination_departement") == departement_filter)
             & (pl.col("emitter_departement") == departement_filter)
         )
@@ -293,18 +498,6 @@ def create_input_output_elements(
             ),
         ]
 
-    waste_filter_formatted = format_filter(pl.col("waste_code"), waste_codes_filter)
-    if waste_filter_formatted is not None:
-        bs_data_processed_incoming_filtered = (
-            bs_data_processed_incoming_filtered.filter(waste_filter_formatted)
-        )
-        bs_data_processed_outgoing_filtered = (
-            bs_data_processed_outgoing_filtered.filter(waste_filter_formatted)
-        )
-        bs_data_processed_locally_filtered = bs_data_processed_locally_filtered.filter(
-            waste_filter_formatted
-        )
-
     bs_data_processed_incoming_quantity = (
         bs_data_processed_incoming_filtered.select("quantity").sum().item()
     )
@@ -2,7 +2,10 @@
 """
 import polars as pl
 
+from src.monitoring.tracing import traced
 
+
+@traced()
 def format_filter(
     column_to_filter: pl.Expr, waste_codes_filter: dict[str, list[str]]
 ) -> pl.Expr | None:
@@ -1,18 +1,147 @@
 """This modules contains all the functions to create the Plotly figure needed or the App.
+
+Figures are built as plain dicts following the Plotly figure schema, rather than with `plotly.graph_objects`
+whose validation of every property is slow. The specs are the ones that `go.Figure` would produce
+(see benchmarks/figures_benchmark.py, which also checks that `go.Figure` accepts them unchanged).
+
+The dates of the traces are sent as numbers of milliseconds since epoch rather than as ISO strings, which are
+longer and slower to serialize (see `get_trace_array`).
 """
 from datetime import datetime, timedelta
 from typing import Dict, List
 
-import plotly.graph_objects as go
 import plotly.io as pio
 import polars as pl
 
-from src.pages.utils import break_long_line, format_number
+from src.data.data_processing import NAF_CATEGORIES, get_naf_hierarchy_aggregates
+from src.data import datasets
+from src.data.datasets import cache_for_data_version
+from src.monitoring.timing import timed
+from src.pages.utils import (
+    break_long_line,
+    format_number,
+    format_numbers,
+    round_half_even_expr,
+)
+
+# Template applied by `go.Figure` to the figures, see src/pages/__init__.py
+DEFAULT_TEMPLATE = pio.templates[pio.templates.default].to_plotly_json()
+
+# Whether the dates of the traces are sent as epoch milliseconds, disabled by the benchmark to compare
+DATES_AS_EPOCH_MS = True
+
 
+def get_trace_array(values: pl.Series) -> list:
+    """Converts a Series to the array of a trace.
+    Dates are converted to the number of milliseconds since epoch of their wall time, as Plotly.js ignores the
+    time zones of dates: the figure must then have a 'date' axis.
 
+    Parameters
+    ----------
+    values: Series
+        Values of a trace array.
+
+    Returns
+    -------
+    list
+        Values of the array, ready to be serialized.
+    """
+
+    if DATES_AS_EPOCH_MS and values.dtype == pl.Datetime:
+        values = values.dt.replace_time_zone(None).dt.timestamp("ms")
+    return values.to_list()
+
+
+def build_figure(traces: list[dict], layout: dict) -> dict:
+    """Assembles a figure spec, as a plain dict, from its traces and its layout, applying the default template.
+    Arrays of the traces can be given as Series, they are converted to lists by `get_trace_array`. The axes of the
+    dates Series get the 'date' type.
+
+    Parameters
+    ----------
+    traces: list of dicts
+        Traces of the figure, each with its 'type'.
+    layout: dict
+        Layout of the figure.
+
+    Returns
+    -------
+    dict
+        Figure spec ready to be plotted.
+    """
+
+    layout = {**layout, "template": DEFAULT_TEMPLATE}
+    traces = [dict(trace) for trace in traces]
+    for trace in traces:
+        for key, values in trace.items():
+            if not isinstance(values, pl.Series):
+                continue
+
+            trace[key] = get_trace_array(values)
+            # Dates sent as numbers are only read as dates on a date axis
+            if DATES_AS_EPOCH_MS and values.dtype == pl.Datetime:
+                axis = f"{key}axis"
+                layout[axis] = {**layout.get(axis, {}), "type": "date"}
+
+    return {"data": traces, "layout": layout}
+
+
+# Hover of the weekly figures: points are at the start of the week, the day and the month of the end
+# of the week and the value formatted by `format_number` are in `customdata`, the name of the period
+# ("Semaine" or "Période") in `hovertext`. The values are not formatted by Plotly, whose French locale
+# uses a comma as decimal separator, unlike the rest of the app.
+WEEK_HOVERTEMPLATE = (
+    "%{hovertext} du %{x|%d/%m} au %{customdata[0]:02d}/%{customdata[1]:02d}<br>"
+    "<b>%{customdata[2]}</b> "
+)
+
+
+def get_week_hover_data(
+    dates: pl.Series, values: pl.Series, current_year: int, precision: int = 0
+) -> tuple[list[list[int | str]], list[str]]:
+    """Computes the `customdata` and the `hovertext` used by `WEEK_HOVERTEMPLATE` for weekly points.
+    When the last point is the last week of the year, its period is cut on December 31st.
+
+    Parameters
+    ----------
+    dates: Series
+        Start dates of the weeks.
+    values: Series
+        Values of the weeks.
+    current_year: int
+        Year of the plotted data.
+    precision: int
+        Number of decimals of the values shown.
+
+    Returns
+    -------
+    tuple of lists
+        Day and month of the end of each week with the formatted value, and the name of each period.
+    """
+
+    weeks_end = dates.dt.offset_by("6d")
+    customdata = [
+        [day, month, value]
+        for day, month, value in zip(
+            weeks_end.dt.day().to_list(),
+            weeks_end.dt.month().to_list(),
+            format_numbers(values, precision).to_list(),
+        )
+    ]
+    periods = ["Semaine"] * len(dates)
+
+    # Handle case when last data point is last week of the year
+    if len(dates) > 0 and weeks_end[-1].year != current_year:
+        customdata[-1][:2] = [31, 12]
+        periods[-1] = "Période"
+
+    return customdata, periods
+
+
+@timed("figure")
 def create_weekly_created_figure(
     data: pl.DataFrame,
-) -> go.Figure:
+) -> dict:
     """Creates the figure showing number of weekly created companies, users...
 
     Parameters
@@ -22,82 +151,61 @@ def create_weekly_created_figure(
 
     Returns
     -------
-    Plotly Figure Object
-        Figure object ready to be plotted.
+    dict
+        Figure spec ready to be plotted.
     """
     # Filter out data from previous year:
     current_year = data["at"].max().year
     data = data.filter(pl.col("at").dt.year() == current_year)
 
-    data = data.to_dict(as_series=False)
+    customdata, periods = get_week_hover_data(data["at"], data["count"], current_year)
 
     texts = []
     texts += [""] * (len(data["count"]) - 1) + [format_number(data["count"][-1])]
 
-    hovertexts = [
-        f"Semaine du {at:%d/%m} au {at+timedelta(days=6):%d/%m}<br><b>{format_number(count)}</b> créations"
-        for at, count in zip(data["at"][:-1], data["count"][:-1])
-    ]
-
-    current_year = max(data["at"]).year
-
-    # Handle case when last data point is last week of the year
-    last_point_date = data["at"][-1]
-    last_point_value = data["count"][-1]
-    if (last_point_date + timedelta(days=6)).year != current_year:
-        last_point = datetime(current_year, 12, 31)
-        hovertexts.append(
-            f"Période du {last_point_date:%d/%m} au {last_point:%d/%m}<br><b>{format_number(last_point_value)}</b> créations"
-        )
-    else:
-        hovertexts.append(
-            f"Semaine du {last_point_date:%d/%m} au {last_point_date+timedelta(days=6):%d/%m}<br><b>{format_number(last_point_value)}</b> créations"
-        )
-
-    fig = go.Figure(
-        [
-            go.Scatter(
-                x=data["at"],
-                y=data["count"],
-                text=texts,
-                mode="lines+markers+text",
-                hovertext=hovertexts,
-                hoverinfo="text",
-                textposition="middle right",
-                textfont_size=15,
-                line_shape="spline",
-                line_smoothing=0.3,
-                line_width=3,
-            )
-        ]
-    )
+    trace = {
+        "type": "scatter",
+        "x": data["at"],
+        "y": data["count"],
+        "text": texts,
+        "mode": "lines+markers+text",
+        "customdata": customdata,
+        "hovertext": periods,
+        "hovertemplate": WEEK_HOVERTEMPLATE + "créations<extra></extra>",
+        "textposition": "middle right",
+        "textfont": {"size": 15},
+        "line": {"shape": "spline", "smoothing": 0.3, "width": 3},
+    }
 
     # handle ticks to start at first day of the first complete week of the year
-    min_x = min(data["at"])
-    max_x = max(data["at"])
+    min_x = data["at"].min()
+    max_x = data["at"].max()
 
     breaks = []
     for i in range(1, min_x.day):
         breaks.append(datetime(current_year, 1, i))
 
-    fig.update_layout(
-        xaxis_title="Semaine de création",
-        showlegend=False,
-        paper_bgcolor="#fff",
-        margin=dict(t=20, r=50, l=25),
-    )
-    fig.update_yaxes(side="right")
-
     delta = max_x - min_x
 
-    fig.update_xaxes(
-        range=[min_x - max(delta * 0.05, timedelta(days=2)), max_x + delta * 0.1],
-        rangebreaks=[dict(values=breaks)],
-    )
+    layout = {
+        "xaxis": {
+            "title": {"text": "Semaine de création"},
+            "range": [
+                min_x - max(delta * 0.05, timedelta(days=2)),
+                max_x + delta * 0.1,
+            ],
+            "rangebreaks": [{"values": breaks}],
+        },
+        "yaxis": {"side": "right"},
+        "showlegend": False,
+        "paper_bgcolor": "#fff",
+        "margin": {"t": 20, "r": 50, "l": 25},
+    }
 
-    return fig
+    return build_figure([trace], layout)
 
 
+@timed("figure")
 def create_weekly_scatter_figure(
     bs_created_data: pl.DataFrame,
     bs_sent_data: pl.DataFrame,
@@ -107,7 +215,7 @@ def create_weekly_scatter_figure(
     bs_processed_final_data: pl.DataFrame,
     bs_type: str,
     lines_configs: List[Dict[str, str]],
-) -> go.Figure:
+) -> dict:
     """Creates a scatter figure showing the weekly number of 'bordereaux' by status (created, sent..)
 
     Parameters
@@ -134,8 +242,8 @@ def create_weekly_scatter_figure(
 
     Returns
     -------
-    Plotly Figure Object
-        Figure object ready to be plotted.
+    dict
+        Figure spec ready to be plotted.
     """
     colors = list(pio.templates["gouv"]["layout"]["colorway"])  # type: ignore
     colors.append("#009099")
@@ -204,60 +312,28 @@ def create_weekly_scatter_figure(
         if metric_name == "count":
             suffix = f"{bs_type} {suffix}"
 
-        hover_texts = [
-            f"Semaine du {e[0]:%d/%m} au {e[0]+timedelta(days=6):%d/%m}<br><b>{format_number(e[1], 2)}</b> {suffix}"
-            for e in data[:-1].iter_rows()
-        ]
-
-        # Handle case when last data point is last week of the year
-        last_point_date = data[-1]["at"].item()
-        last_point_value = data[-1][metric_name].item()
-        if (last_point_date + timedelta(days=6)).year != current_year:
-            last_point = datetime(current_year, 12, 31)
-            hover_texts.append(
-                f"Période du {last_point_date:%d/%m} au {last_point:%d/%m}<br><b>{format_number(last_point_value, 2)}</b> {suffix}"
-            )
-        else:
-            hover_texts.append(
-                f"Semaine du {last_point_date:%d/%m} au {last_point_date+timedelta(days=6):%d/%m}<br><b>{format_number(last_point_value, 2)}</b> {suffix}"
-            )
+        customdata, periods = get_week_hover_data(
+            data["at"], data[metric_name], current_year, 2
+        )
 
         scatter_list.append(
-            go.Scatter(
-                x=data["at"],
-                y=data[metric_name],
-                mode="lines+text",
-                name=name,
-                text=texts,
-                textfont_size=15,
-                textfont_color=config["color"],
-                textposition="middle right",
-                hovertext=hover_texts,
-                hoverinfo="text",
-                line_shape="spline",
-                line_smoothing=0.3,
-                line_width=3,
-                visible=config.get("visible", True),
-            )
+            {
+                "type": "scatter",
+                "x": data["at"],
+                "y": data[metric_name],
+                "mode": "lines+text",
+                "name": name,
+                "text": texts,
+                "textfont": {"size": 15, "color": config["color"]},
+                "textposition": "middle right",
+                "customdata": customdata,
+                "hovertext": periods,
+                "hovertemplate": WEEK_HOVERTEMPLATE + f"{suffix}<extra></extra>",
+                "line": {"shape": "spline", "smoothing": 0.3, "width": 3},
+                "visible": config.get("visible", True),
+            }
         )
 
-    fig = go.Figure(scatter_list)
-
-    fig.update_layout(
-        paper_bgcolor="#fff",
-        margin=dict(t=45, r=90, l=5),
-        legend=dict(
-            orientation="h",
-            y=1.15,
-            x=-0.06,
-            font_size=13,
-            itemwidth=40,
-            bgcolor="rgba(0,0,0,0)",
-            title=legend_title,
-        ),
-        uirevision=True,
-    )
-
     delta = max_x - min_x
 
     # handle ticks to start at first day of the first complete week of the year
@@ -265,20 +341,39 @@ def create_weekly_scatter_figure(
     for i in range(1, min_x.day):
         breaks.append(datetime(current_year, 1, i))
 
-    fig.update_xaxes(
-        range=[min_x - delta * 0.05, max_x + delta * 0.1],
-        rangebreaks=[dict(values=breaks)],
-    )
-    fig.update_yaxes(side="right", title=y_title)
+    yaxis = {"side": "right"}
+    if y_title is not None:
+        yaxis["title"] = {"text": y_title}
+
+    layout = {
+        "paper_bgcolor": "#fff",
+        "margin": {"t": 45, "r": 90, "l": 5},
+        "legend": {
+            "orientation": "h",
+            "y": 1.15,
+            "x": -0.06,
+            "font": {"size": 13},
+            "itemwidth": 40,
+            "bgcolor": "rgba(0,0,0,0)",
+            "title": {"text": legend_title},
+        },
+        "uirevision": True,
+        "xaxis": {
+            "range": [min_x - delta * 0.05, max_x + delta * 0.1],
+            "rangebreaks": [{"values": breaks}],
+        },
+        "yaxis": yaxis,
+    }
 
-    return fig
+    return build_figure(scatter_list, layout)
 
 
+@timed("figure")
 def create_weekly_quantity_processed_figure(
     quantity_recovered: pl.Series,
     quantity_destroyed: pl.Series,
     date_interval: tuple[datetime, datetime] | None = None,
-) -> go.Figure:
+) -> dict:
     """Creates the figure showing the weekly waste quantity processed by type of process (destroyed or recovered).
 
     Parameters
@@ -290,21 +385,21 @@ def create_weekly_quantity_processed_figure(
 
     Returns
     -------
-    Plotly Figure Object
-        Figure object ready to be plotted.
+    dict
+        Figure spec ready to be plotted.
     """
 
     data_conf = [
         {
             "data": quantity_recovered,
             "name": "Déchets valorisés",
-            "text": "Semaine du {0:%d/%m} au {1:%d/%m}<br><b>{2}</b> tonnes de déchets valorisées",
+            "hovertemplate": "tonnes de déchets valorisés<extra></extra>",
             "color": "#66673D",
         },
         {
             "data": quantity_destroyed,
             "name": "Déchets éliminés",
-            "text": "Semaine du {0:%d/%m} au {1:%d/%m}<br><b>{2}</b> tonnes de déchets éliminées",
+            "hovertemplate": "tonnes de déchets éliminés<extra></extra>",
             "color": "#5E2A2B",
         },
     ]
@@ -324,7 +419,9 @@ def create_weekly_quantity_processed_figure(
             )
         data = data.filter(date_filter)
 
-        data = data.to_dict(as_series=False)
+        customdata, periods = get_week_hover_data(
+            data["processed_at"], data["quantity"], current_year
+        )
 
         min_at = data["processed_at"][0]
         if min_x is None or min_at < min_x:
@@ -334,83 +431,59 @@ def create_weekly_quantity_processed_figure(
         if max_x is None or max_at > max_x:
             max_x = max_at
 
-        hover_texts = [
-            conf["text"].format(
-                processed_at,
-                processed_at + timedelta(days=6),
-                format_number(quantity),
-            )
-            for processed_at, quantity in zip(
-                data["processed_at"][:-1], data["quantity"][:-1]
-            )
-        ]
-
-        # Handle case when last data point is last week of the year
-        last_point_date = data["processed_at"][-1]
-        last_point_value = data["quantity"][-1]
-        if (last_point_date + timedelta(days=6)).year != current_year:
-            last_point = datetime(current_year, 12, 31)
-            hover_texts.append(
-                f"Période du {last_point_date:%d/%m} au {last_point:%d/%m}<br><b>{format_number(last_point_value)}</b> tonnes de {conf['name'].lower()}."
-            )
-        else:
-            hover_texts.append(
-                f"Semaine du {last_point_date:%d/%m} au {last_point_date+timedelta(days=6):%d/%m}<br><b>{format_number(last_point_value)}</b> {conf['name'].lower()}"
-            )
-
         traces.append(
-            go.Bar(
-                x=data["processed_at"],
-                y=data["quantity"],
-                name=conf["name"],
-                hovertext=hover_texts,
-                hoverinfo="text",
-                texttemplate="%{y:.2s} tonnes",
-                marker_color=conf["color"],
-                width=1000 * 3600 * 24 * 6,
-            )
+            {
+                "type": "bar",
+                "x": data["processed_at"],
+                "y": data["quantity"],
+                "name": conf["name"],
+                "customdata": customdata,
+                "hovertext": periods,
+                "hovertemplate": WEEK_HOVERTEMPLATE + conf["hovertemplate"],
+                "texttemplate": "%{y:.2s} tonnes",
+                "marker": {"color": conf["color"]},
+                "width": 1000 * 3600 * 24 * 6,
+            }
         )
 
-    fig = go.Figure(data=traces)
-
     max_value = sum([conf["data"]["quantity"].max() or 0 for conf in data_conf])
 
-    fig.update_layout(
-        xaxis_title="Semaine de traitement",
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1,
-            xanchor="left",
-            x=0,
-            title="Type de traitement :",
-            bgcolor="rgba(0,0,0,0)",
-        ),
-        margin=dict(t=30, r=70, l=0),
-        barmode="stack",
-        yaxis_title="Quantité (en tonnes)",
-        yaxis_range=[0, max_value * 1.1],
-    )
-    fig.update_yaxes(side="right")
-
-    delta = max_x - min_x
-
     # handle ticks to start at first day of the first complete week of the year
     breaks = []
     for i in range(1, min_x.day):
         breaks.append(datetime(current_year, 1, i))
 
-    fig.update_xaxes(
-        range=[min_x - timedelta(days=7), max_x + timedelta(days=7)],
-        rangebreaks=[dict(values=breaks)],
-    )
+    layout = {
+        "legend": {
+            "orientation": "h",
+            "yanchor": "bottom",
+            "y": 1,
+            "xanchor": "left",
+            "x": 0,
+            "title": {"text": "Type de traitement :"},
+            "bgcolor": "rgba(0,0,0,0)",
+        },
+        "margin": {"t": 30, "r": 70, "l": 0},
+        "barmode": "stack",
+        "xaxis": {
+            "title": {"text": "Semaine de traitement"},
+            "range": [min_x - timedelta(days=7), max_x + timedelta(days=7)],
+            "rangebreaks": [{"values": breaks}],
+        },
+        "yaxis": {
+            "title": {"text": "Quantité (en tonnes)"},
+            "range": [0, max_value * 1.1],
+            "side": "right",
+        },
+    }
 
-    return fig
+    return build_figure(traces, layout)
 
 
+@timed("figure")
 def create_quantity_processed_sunburst_figure(
     waste_quantity_processed_by_processing_code_df: pl.DataFrame,
-) -> go.Figure:
+) -> dict:
     """Creates the figure showing the weekly waste quantity processed by type of processing operation (destroyed or recovered).
 
     Parameters
@@ -420,8 +493,8 @@ def create_quantity_processed_sunburst_figure(
 
     Returns
     -------
-    Plotly Figure Object
-        Sunburst Figure object ready to be plotted.
+    dict
+        Sunburst figure spec ready to be plotted.
     """
 
     agg_data = waste_quantity_processed_by_processing_code_df
@@ -472,8 +545,16 @@ def create_quantity_processed_sunburst_figure(
         .alias("colors")
     )
 
-    total_data = total_data.to_dict(as_series=False)
-    agg_data_without_other = agg_data_without_other.to_dict(as_series=False)
+    total_data = total_data.with_columns(
+        format_numbers(total_data["quantity"]).alias("quantity_text")
+    ).to_dict(as_series=False)
+    agg_data_without_other = agg_data_without_other.with_columns(
+        format_numbers(agg_data_without_other["quantity"]).alias("quantity_text")
+    ).to_dict(as_series=False)
+    other_quantities_texts = format_numbers(
+        [agg_data_recycled_other_quantity, agg_data_eliminated_other_quantity]
+    ).to_list()
+
     ids = (
         total_data["type_operation"]
         + agg_data_without_other["processing_operation"]
@@ -504,56 +585,71 @@ def create_quantity_processed_sunburst_figure(
     hover_text_template = "{code} : {description}<br><b>{quantity}t</b> traitées"
     hover_texts = (
         [
-            f"<b>{format_number(e)}t</b> {index.split(' ')[1]}es"
-            for index, e in zip(total_data["type_operation"], total_data["quantity"])
+            f"<b>{e}t</b> {index.split(' ')[1]}es"
+            for index, e in zip(
+                total_data["type_operation"], total_data["quantity_text"]
+            )
         ]
         + [
             hover_text_template.format(
                 code=processing_operation,
                 description=processing_operation_description,
-                quantity=format_number(quantity),
+                quantity=quantity_text,
             )
-            for processing_operation, processing_operation_description, quantity in zip(
+            for processing_operation, processing_operation_description, quantity_text in zip(
                 agg_data_without_other["processing_operation"],
                 agg_data_without_other["processing_operation_description"],
-                agg_data_without_other["quantity"],
+                agg_data_without_other["quantity_text"],
             )
         ]
         + [
-            f"Autres opérations de traitement<br><b>{format_number(e)}t</b> traitées"
-            for e in [
-                agg_data_recycled_other_quantity,
-                agg_data_eliminated_other_quantity,
-            ]
+            f"Autres opérations de traitement<br><b>{e}t</b> traitées"
+            for e in other_quantities_texts
         ]
     )
 
-    fig = go.Figure(
-        go.Sunburst(
-            ids=ids,
-            labels=labels,
-            parents=parents,
-            values=values,
-            marker_colors=colors,
-            branchvalues="total",
-            texttemplate="%{label} - <b>%{percentRoot}</b>",
-            hovertext=hover_texts,
-            hoverinfo="text",
-            sort=False,
-            insidetextorientation="horizontal",
-            insidetextfont_size=15,
-        )
-    )
-    fig.update_layout(
-        margin=dict(t=0, l=0, r=0, b=0),
-    )
+    trace = {
+        "type": "sunburst",
+        "ids": ids,
+        "labels": labels,
+        "parents": parents,
+        "values": values,
+        "marker": {"colors": colors},
+        "branchvalues": "total",
+        "texttemplate": "%{label} - <b>%{percentRoot}</b>",
+        "hovertext": hover_texts,
+        "hoverinfo": "text",
+        "sort": False,
+        "insidetextorientation": "horizontal",
+        "insidetextfont": {"size": 15},
+    }
+
+    return build_figure([trace], {"margin": {"t": 0, "l": 0, "r": 0, "b": 0}})
+
+
+@cache_for_data_version
+def get_naf_labels_with_line_breaks() -> dict[str, str]:
+    """Returns the labels of the NAF nomenclature with the line breaks of the treemap tiles,
+    computed once per data version so that the treemap labels are built without python calls.
+    Labels missing from the nomenclature are shown without line breaks.
+    """
+    labels = pl.concat(
+        [
+            datasets.NAF_NOMENCLATURE_DATA.select(
+                pl.col(f"libelle_{cat}").alias("libelle")
+            )
+            for cat in NAF_CATEGORIES
+        ]
+    )["libelle"]
+    labels = labels.drop_nulls().unique().to_list() + ["NAF inconnu"]
 
-    return fig
+    return {label: break_long_line(label, 14) for label in labels}
 
 
+@timed("figure")
 def create_treemap_companies_figure(
     data_with_naf: pl.DataFrame, use_quantity: bool = False
-) -> go.Figure:
+) -> dict:
     """Creates the figure showing the number of companies by NAF category.
 
     Parameters
@@ -565,8 +661,8 @@ def create_treemap_companies_figure(
 
     Returns
     -------
-    Plotly Figure Object
-        Figure object ready to be plotted.
+    dict
+        Figure spec ready to be plotted.
     """
 
     colors = pl.DataFrame(
@@ -665,16 +761,9 @@ def create_treemap_companies_figure(
 
     df = data_with_naf
 
-    df = df.with_columns(
-        [
-            pl.col("code_section").fill_null("NAF inconnu"),
-            pl.col("libelle_section").fill_null("NAF inconnu"),
-        ]
-    )
-
     # Init values
     total = df.height
-    value_expr = pl.col("id").count().alias("value")
+    value_expr = pl.col("id").count()
     value_suffix = pl.lit("</b>")
     hover_expr_str = "</b> établissements inscrits dans la {label} NAF "
     hover_expr_lit_nulls = pl.lit(
@@ -687,7 +776,7 @@ def create_treemap_companies_figure(
     hover_texts = [f"Tous les établissements - <b>{total/1000:.2f}k</b><extra></extra>"]
     if use_quantity:
         total = df.select(pl.col("quantity").sum()).item()
-        value_expr = pl.col("quantity").sum().alias("value")
+        value_expr = pl.col("quantity").sum()
         value_suffix = pl.lit("t</b>")
         hover_expr_str = (
             " tonnes</b> produites par des établissements inscrits dans la {label} NAF "
@@ -703,122 +792,120 @@ def create_treemap_companies_figure(
             f"Tous les établissements - <b>{total/1000:.2f}kt</b><extra></extra>"
         ]
 
-    categories = ["sous_classe", "classe", "groupe", "division", "section"]
+    naf_labels = get_naf_labels_with_line_breaks()
 
-    # build dfs at each granularity
-    dfs = []
-    for i, cat in enumerate(categories):
-        temp_df = df.drop_nulls(f"libelle_{cat}")
+    # All the levels, from the coarsest to the finest, are aggregated with a single pass over the data
+    df = get_naf_hierarchy_aggregates(df, value_expr, "Tous les établissements")
+    df = df.join(colors, on="libelle_section", how="left")
 
-        agg_exprs = [
-            value_expr,
-            pl.col(f"libelle_{cat}").max(),
+    hover_prefix_start, hover_prefix_end = hover_expr_str.split("{label}")
+    unknown_naf = (pl.col("level") == "section") & (pl.col("code") == "NAF inconnu")
+    df = df.with_columns(
+        [
+            pl.when(unknown_naf)
+            .then(hover_expr_lit_nulls)
+            .otherwise(
+                pl.concat_str(
+                    [
+                        pl.lit(hover_prefix_start),
+                        pl.col("level").str.replace_all("_", " "),
+                        pl.lit(hover_prefix_end),
+                    ]
+                )
+            )
+            .alias("hover_prefix"),
+            pl.when(unknown_naf)
+            .then(pl.lit(""))
+            .otherwise(
+                pl.concat_str(
+                    [pl.col("code"), pl.format(" - <i>{}</i>", pl.col("libelle"))]
+                )
+            )
+            .alias("hover_naf"),
         ]
+    )
 
-        id_sep = "#"
-
-        id_exprs = [pl.lit("Tous les établissements")]
-        if i < (len(categories) - 1):
-            for tmp_cat in reversed(categories[i + 1 :]):
-                id_exprs.append(pl.col(f"libelle_{tmp_cat}").max())
-        id_exprs.append(pl.col(f"libelle_{cat}").max())
-        agg_exprs.append(pl.concat_str(id_exprs, sep=id_sep).alias("ids"))
-
-        temp_colors = colors
-        if cat != "section":
-            agg_exprs.append(pl.col("libelle_section").max())
-
-        temp_df = temp_df.groupby(f"code_{cat}", maintain_order=True).agg(agg_exprs)
-        temp_df = temp_df.join(temp_colors, on="libelle_section", how="left")
-
-        parent_exp = (
-            pl.col("ids")
-            .str.split(id_sep)
-            .arr.reverse()
-            .arr.slice(1)
-            .arr.reverse()
-            .arr.join(id_sep)
-            .alias("parents")
-        )
+    # Labels and hover texts of all the levels are built at once
+    df = df.with_columns(
+        [
+            format_numbers(df["value"]).alias("value_text"),
+            format_numbers(df["value"], 1).alias("short_value_text"),
+        ]
+    )
 
-        labels_expr = pl.concat_str(
-            [
-                pl.col(f"libelle_{cat}").apply(lambda x: break_long_line(x, 14)),
-                pl.lit(" - <b>"),
-                pl.col("value").apply(
-                    lambda x: f"{x/1000:.0f}k" if x > 1000 else format_number(x, 1)
-                ),
-                value_suffix,
-            ]
-        ).alias("labels")
-
-        hover_expr_prefix = pl.lit(hover_expr_str.format(label=cat.replace("_", " ")))
-        hover_expr_code = pl.col(f"code_{cat}")
-        hover_expr_label = pl.format(" - <i>{}</i>", pl.col(f"libelle_{cat}"))
-        if cat == "section":
-            when_expr = pl.when(pl.col("code_section") == "NAF inconnu")
-            hover_expr_prefix = when_expr.then(hover_expr_lit_nulls).otherwise(
-                hover_expr_prefix
+    labels_expr = pl.concat_str(
+        [
+            pl.col("libelle").map_dict(naf_labels).fill_null(pl.col("libelle")),
+            pl.lit(" - <b>"),
+            pl.when(pl.col("value") > 1000)
+            .then(
+                pl.concat_str(
+                    [
+                        round_half_even_expr(pl.col("value") / 1000)
+                        .cast(pl.Int64)
+                        .cast(pl.Utf8),
+                        pl.lit("k"),
+                    ]
+                )
             )
-            hover_expr_code = when_expr.then(pl.lit("")).otherwise(hover_expr_code)
-            hover_expr_label = when_expr.then(pl.lit("")).otherwise(hover_expr_label)
+            .otherwise(pl.col("short_value_text")),
+            value_suffix,
+        ]
+    ).alias("labels")
 
-        hover_expr = pl.concat_str(
-            [
-                pl.lit("<b>"),
-                pl.col("value").apply(format_number),
-                hover_expr_prefix,
-                hover_expr_code,
-                hover_expr_label,
-                pl.lit("<br>soit <b>"),
-                (100 * pl.col("value") / total).round(2).cast(pl.Utf8),
-                hover_expr_lit_end,
-            ]
-        ).alias("hover_texts")
+    hover_expr = pl.concat_str(
+        [
+            pl.lit("<b>"),
+            pl.col("value_text"),
+            pl.col("hover_prefix"),
+            pl.col("hover_naf"),
+            pl.lit("<br>soit <b>"),
+            (100 * pl.col("value") / total).round(2).cast(pl.Utf8),
+            hover_expr_lit_end,
+        ]
+    ).alias("hover_texts")
 
-        dfs.append(temp_df.with_columns([labels_expr, hover_expr, parent_exp]))
+    json = df.select(
+        [pl.col(["ids", "parents", "value", "color"]), labels_expr, hover_expr]
+    ).to_dict(as_series=False)
 
     # Build plotly necessaries lists
-    ids = ["Tous les établissements"]
-    parents = [""]
-    values = [total]
-    colors = ["rgba(238, 238, 238, 0)"]
-    for df in reversed(dfs):
-        json = df.to_dict(as_series=False)
-        ids.extend(json["ids"])
-        labels.extend(json["labels"])
-        parents.extend(json["parents"])
-        values.extend(json["value"])
-        hover_texts.extend(json["hover_texts"])
-        colors.extend(json["color"])
-
-    fig = go.Figure(
-        go.Treemap(
-            ids=ids,
-            labels=labels,
-            values=values,
-            parents=parents,
-            hovertemplate=hover_texts,
-            marker_colors=colors,
-            branchvalues="total",
-            pathbar_thickness=35,
-            textposition="middle center",
-            tiling_packing="squarify",
-            insidetextfont_size=300,
-            pathbar_textfont_size=50,
-            tiling_pad=7,
-            maxdepth=2,
-            marker_line_width=0,
-            marker_depthfade="reversed",
-            marker_pad={"t": 80, "r": 20, "b": 20, "l": 20},
-        )
-    )
-    fig.update_layout(
-        margin={"l": 15, "r": 15, "t": 35, "b": 25},
-        height=800,
-        paper_bgcolor="rgba(0,0,0,0)",
-        modebar_bgcolor="rgba(0,0,0,0)",
-        modebar_color="rgba(146, 146, 146, 0.7)",
-        modebar_activecolor="rgba(146, 146, 146, 0.7)",
-    )
-    return fig
+    ids = ["Tous les établissements"] + json["ids"]
+    labels += json["labels"]
+    parents = [""] + json["parents"]
+    values = [total] + json["value"]
+    hover_texts += json["hover_texts"]
+    colors = ["rgba(238, 238, 238, 0)"] + json["color"]
+
+    trace = {
+        "type": "treemap",
+        "ids": ids,
+        "labels": labels,
+        "values": values,
+        "parents": parents,
+        "hovertemplate": hover_texts,
+        "marker": {
+            "colors": colors,
+            "line": {"width": 0},
+            "depthfade": "reversed",
+            "pad": {"t": 80, "r": 20, "b": 20, "l": 20},
+        },
+        "branchvalues": "total",
+        "pathbar": {"thickness": 35, "textfont": {"size": 50}},
+        "textposition": "middle center",
+        "tiling": {"packing": "squarify", "pad": 7},
+        "insidetextfont": {"size": 300},
+        "maxdepth": 2,
+    }
+    layout = {
+        "margin": {"l": 15, "r": 15, "t": 35, "b": 25},
+        "height": 800,
+        "paper_bgcolor": "rgba(0,0,0,0)",
+        "modebar": {
+            "bgcolor": "rgba(0,0,0,0)",
+            "color": "rgba(146, 146, 146, 0.7)",
+            "activecolor": "rgba(146, 146, 146, 0.7)",
+        },
+    }
+
+    return build_figure([trace], layout)
@@ -2,8 +2,10 @@
 """
 from dash import dcc, html, register_page
 
+from src.loading import loading_state
 from src.pages.home.home_layout_factory import get_header_elements
-from src.pages.home.home_layouts import layout_2023
+from src.pages.home.home_layouts import get_layouts
+from src.pages.loading_page import get_loading_layout
 
 register_page(
     __name__,
@@ -12,27 +14,35 @@ register_page(
     name="Accueil - Statistiques Publiques de Trackdéchets",
 )
 
+# Loading steps the page needs (see src/loading.py)
+REQUIRED_LOADING_STEPS = ["datasets", "home"]
+
 
 def layout() -> html.Div:
     """
     Creates initial layout for the home page. Currently the initial layout displays 2023 data.
+    Shows the loading state until the layouts are built.
 
     Returns
     -------
     A Dash Div with the id 'main-container'.
     """
+    if not loading_state.is_ready(REQUIRED_LOADING_STEPS):
+        return get_loading_layout(REQUIRED_LOADING_STEPS)
 
     elements = [
         get_header_elements(),
         dcc.Loading(
             html.Div(
-                layout_2023,
+                get_layouts()[2023],
                 id="graph-container",
             ),
             style={"position": "absolute", "top": "25px"},
             color="rgb(0, 0, 145)",
             type="circle",
         ),
+        dcc.Store(id="year-figures-data"),
+        dcc.Store(id="selected-year", data=2023),
     ]
 
     return html.Div(elements, id="main-container")
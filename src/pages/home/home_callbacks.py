@@ -1,113 +1,147 @@
 """This module contains the callbacks for the home page.
 """
 
-from dash import ALL, MATCH, Input, Output, State, callback, ctx, html, no_update
+from dash import (
+    ALL,
+    MATCH,
+    ClientsideFunction,
+    Input,
+    Output,
+    State,
+    callback,
+    clientside_callback,
+    ctx,
+    dcc,
+    html,
+    no_update,
+)
 from dash._callback import NoUpdate
 
-from src.pages.home.home_layout_factory import get_navbar_elements
-from src.pages.home.home_layouts import layouts
-from src.pages.utils import format_number
+from src.pages.home.home_layout_factory import get_graph_element, get_navbar_elements
+from src.pages.home.home_layouts import get_layouts_data, get_years_switch_data
+from src.serving import cache_response
 
 
 @callback(
     output=[
-        Output("graph-container", "children"),
+        Output("year-figures-data", "data"),
+        Output("selected-year", "data"),
+        Output({"type": "year-callout", "index": ALL}, "children"),
+        Output("stats-year-title", "children"),
         Output("header-navigation", "children"),
     ],
     inputs=[Input({"type": "year-selector", "index": ALL}, "n_clicks")],
+    state=[
+        State({"type": "figure", "index": ALL}, "id"),
+        State({"type": "counts-figure", "index": ALL}, "id"),
+    ],
 )
-def change_layout_for_year(n_clicks) -> tuple[list, html.Ul] | NoUpdate:
+@cache_response
+def change_layout_for_year(
+    n_clicks, figure_ids, counts_figure_ids
+) -> tuple[dict, int, list, str, html.Ul] | NoUpdate:
     """This callback is triggered when the user clicks on the year selection menu.
-    It updates the part of the layout containing all the graphs to display the data
-    of the selected year.
+    It sends the data of the selected year to the browser, where the figures are updated
+    (see `updateFigureForYear` in assets/clientside_callbacks.js). Only the figures traces,
+    the layout properties that vary between years and the year callouts are sent, the rest
+    of the layout is left untouched.
     Also updates the year selection menu to change to 'selected' state the clicked button.
 
     Parameters
     ----------
     n_clicks: int
         The number of clicks on the menu links.
+    figure_ids: list of dicts
+        Ids of the figures present in the layout. Figures that are not loaded yet are not present.
+    counts_figure_ids: list of dicts
+        Ids of the counts figures present in the layout.
 
     Returns
     -------
     tuple
-        The first elements is the layout as a list of dash elements
-        ready to be inserted in the Div with id 'graph-container'.
-        The second element is the updated navbar elements.
+        The first element is the figures data of the selected year, to be stored in the 'year-figures-data' Store.
+        The second element is the selected year.
+        The third element is the children of the year callouts.
+        The fourth element is the title of the year section.
+        The fifth element is the updated navbar elements.
     """
 
-    if n_clicks is None or n_clicks == 0:
+    if n_clicks is None or all(e is None for e in n_clicks):
         return no_update
 
-    if all(e is None for e in n_clicks):
-        year = 2023
-    else:
-        button_clicked = ctx.triggered_id
-        year = button_clicked["index"]
+    button_clicked = ctx.triggered_id
+    year = button_clicked["index"]
 
-    print(f"getting data for year {year}")
+    year_data = get_years_switch_data()[year]
+    figures_data = {
+        figure_id["index"]: year_data["figures"][figure_id["index"]]
+        for figure_id in figure_ids + counts_figure_ids
+    }
+    callouts = [
+        year_data["callouts"][output["id"]["index"]] for output in ctx.outputs_list[2]
+    ]
 
-    return layouts[year], get_navbar_elements([2022, 2023], year)
+    return (
+        {"year": year, "figures": figures_data},
+        year,
+        callouts,
+        f"Statistiques pour l'année {year}",
+        get_navbar_elements((2022, 2023), year),
+    )
 
 
 @callback(
-    output=Output({"type": "counts-figure", "index": MATCH, "year": MATCH}, "figure"),
-    inputs=[
-        Input({"type": "counts-figure", "index": MATCH, "year": MATCH}, "relayoutData"),
-        Input({"type": "counts-figure", "index": MATCH, "year": MATCH}, "restyleData"),
-    ],
-    state=[
-        State({"type": "counts-figure", "index": MATCH, "year": MATCH}, "figure"),
-    ],
+    output=Output({"type": "lazy-figure-container", "index": MATCH}, "children"),
+    inputs=[Input({"type": "lazy-figure-trigger", "index": MATCH}, "n_clicks")],
+    state=[State("selected-year", "data")],
     prevent_initial_call=True,
 )
-def relayout_figures_to_toggle_texts(relayout_data, restyle_data, figure):
-    """This callback is triggered when the user zoom on a figure or disable a trace visibility.
-    It updates the traces to toggle the text visibility depending of if it overlaps when another text.
+@cache_response
+def load_lazy_figure(n_clicks: int, year: int) -> dcc.Graph:
+    """This callback is triggered by the browser when a figure placeholder becomes visible
+    or when the tab containing it is selected (see assets/lazy_figures.js).
+    It replaces the placeholder by the figure of the selected year, taken from the precomputed layouts data.
 
     Parameters
     ----------
-    relayout_data: dict
-        Relayout event with associated data. Relayout event is triggered on zoom or drag.
-    restyle_data: dict
-        Restyle event with associated data. Restyle event is triggered when a trace is toggled on/off on legend click.
-    figure :dict
-        Figure data.
+    n_clicks: int
+        Number of clicks on the hidden trigger button of the placeholder.
+    year: int
+        The year selected by the user.
+
     Returns
     -------
-    dict
-        Updated figure data.
+    dcc.Graph
+        The graph element of the figure.
     """
 
-    traces = figure["data"]
-
-    if "yaxis.range[1]" not in relayout_data.keys():
-        div_value = 0
-        for trace in traces:
-            if ("visible" in trace.keys()) and (trace["visible"] is not True):
-                continue
-            max_ = max(trace["y"])
-            if max_ > div_value:
-                div_value = max_
-    else:
-        div_value = relayout_data["yaxis.range[1]"] - relayout_data["yaxis.range[0]"]
-
-    div_value = max(0.01, div_value)
-
-    texts_positionned = []
-    new_traces = []
-    for trace in traces:
-        if not ("visible" in trace.keys()) or (trace["visible"] is True):
-
-            last_value = trace["y"][-1]
-            overlaps = any(
-                abs(last_value - e) / div_value < 0.04 for e in texts_positionned
-            )
-            if not overlaps or len(texts_positionned) == 0:
-                trace["text"] = trace["text"][:-1] + [format_number(last_value)]
-                texts_positionned.append(last_value)
-            else:
-                trace["text"] = [""] * len(trace["x"])
-        new_traces.append(trace)
-
-    figure["data"] = new_traces
-    return figure
+    figure_key = ctx.triggered_id["index"]
+
+    return get_graph_element(figure_key, get_layouts_data()[year][figure_key])
+
+
+clientside_callback(
+    ClientsideFunction(namespace="home", function_name="updateFigureForYear"),
+    Output({"type": "figure", "index": MATCH}, "figure"),
+    Input("year-figures-data", "data"),
+    State({"type": "figure", "index": MATCH}, "figure"),
+    State({"type": "figure", "index": MATCH}, "id"),
+    prevent_initial_call=True,
+)
+
+
+# This callback is triggered when the user zoom on a figure or disable a trace visibility.
+# It updates the traces to toggle the text visibility depending of if it overlaps when another text.
+# It is also triggered when the user switches year, to update the figure with the new year data.
+# It runs in the browser (see `updateCountsFigure` in assets/clientside_callbacks.js)
+# so that the figure data does not have to be sent to the server and back on each chart interaction.
+clientside_callback(
+    ClientsideFunction(namespace="home", function_name="updateCountsFigure"),
+    Output({"type": "counts-figure", "index": MATCH}, "figure"),
+    Input({"type": "counts-figure", "index": MATCH}, "relayoutData"),
+    Input({"type": "counts-figure", "index": MATCH}, "restyleData"),
+    Input("year-figures-data", "data"),
+    State({"type": "counts-figure", "index": MATCH}, "figure"),
+    State({"type": "counts-figure", "index": MATCH}, "id"),
+    prevent_initial_call=True,
+)
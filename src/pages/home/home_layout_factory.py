@@ -3,11 +3,11 @@
 
 from datetime import datetime
 
-import plotly.graph_objects as go
 import polars as pl
 from dash import dcc, html
 
 from src.data.data_processing import (
+    get_producers_quantities_data,
     get_quantities_by_naf,
     get_recovered_and_eliminated_quantity_processed_by_week_series,
     get_total_bs_created,
@@ -17,17 +17,8 @@ from src.data.data_processing import (
     get_weekly_preprocessed_dfs,
     get_weekly_waste_quantity_processed_by_operation_code_df,
 )
-from src.data.datasets import (
-    ALL_BORDEREAUX_DATA,
-    BSDA_DATA,
-    BSDASRI_DATA,
-    BSDD_DATA,
-    BSFF_DATA,
-    COMPANY_DATA,
-    DATA_UPDATE_DATE,
-    NAF_NOMENCLATURE_DATA,
-    USER_DATA,
-)
+from src.data import datasets
+from src.data.datasets import cache_for_data_version
 from src.data.utils import get_data_date_interval_for_year
 from src.pages.figures_factory import (
     create_quantity_processed_sunburst_figure,
@@ -36,7 +27,7 @@ from src.pages.figures_factory import (
     create_weekly_quantity_processed_figure,
     create_weekly_scatter_figure,
 )
-from src.pages.utils import add_callout, add_figure
+from src.pages.utils import add_callout, add_figure, add_lazy_figure
 
 PLOTLY_PLOT_CONFIGS = {
     "toImageButtonOptions": {
@@ -50,26 +41,62 @@ PLOTLY_PLOT_CONFIGS = {
     "locale": "fr",
 }
 
+# Figures whose last-point texts are toggled on zoom, see `updateCountsFigure` clientside callback
+COUNTS_FIGURES_KEYS = [
+    "bsdd_counts_weekly",
+    "bsda_counts_weekly",
+    "bsff_counts_weekly",
+    "bsdasri_counts_weekly",
+    "bsdd_quantities_weekly",
+    "bsda_quantities_weekly",
+    "bsdasri_quantities_weekly",
+]
+
+
+@cache_for_data_version
+def get_header_metrics() -> dict[str, int | float]:
+    """Computes the totals displayed in the header of the page. They are computed once per data version.
+
+    Returns
+    -------
+    dict
+        The total number of bordereaux created, the total quantity of waste processed
+        and the total number of companies created.
+
+    """
+
+    return {
+        "total_bs_created": get_total_bs_created(datasets.ALL_BORDEREAUX_DATA),
+        "total_quantity_processed": get_total_quantity_processed(
+            datasets.ALL_BORDEREAUX_DATA
+        ),
+        "total_companies_created": datasets.COMPANY_DATA.height,
+    }
+
+
+@cache_for_data_version
+def get_producers_quantities() -> pl.DataFrame:
+    """Returns the "bordereaux" of the producers of waste, used by the produced quantity by NAF figure of every year.
+    They are computed once per data version.
+    """
+
+    return get_producers_quantities_data(datasets.ALL_BORDEREAUX_DATA)
+
 
+@cache_for_data_version
 def get_header_elements() -> html.Div:
     """It creates the header of the page, which contains the title, the last update date, a short
     description of Trackdéchets, three callout elements with the total number of bordereaux created, the total
     quantity of waste processed and the total number of companies created, and a navigation bar to
     select the year of the data to display.
+    The header is created once per data version.
 
     Returns
     -------
         A Div element containing the header of the page.
 
     """
-    # Load all needed data
-    company_data_df = COMPANY_DATA
-
-    total_bs_created = get_total_bs_created(ALL_BORDEREAUX_DATA)
-
-    total_quantity_processed = get_total_quantity_processed(ALL_BORDEREAUX_DATA)
-
-    total_companies_created = company_data_df.height
+    header_metrics = get_header_metrics()
 
     elements = [
         html.Div(
@@ -77,7 +104,7 @@ def get_header_elements() -> html.Div:
                 html.H1("Statistiques de Trackdéchets"),
                 html.P(
                     [
-                        f"Dernière mise à jour des données le {DATA_UPDATE_DATE.strftime('%d/%m/%Y')}"
+                        f"Dernière mise à jour des données le {datasets.DATA_UPDATE_DATE.strftime('%d/%m/%Y')}"
                     ],
                     className="fr-badge fr-badge--info",
                     id="update-date",
@@ -139,22 +166,22 @@ Un bordereau de suivi de déchet (BSD) est créé pour chaque déchet et chaque
         html.Div(
             [
                 add_callout(
-                    number=total_quantity_processed,
+                    number=header_metrics["total_quantity_processed"],
                     text="tonnes de déchets dangereux* tracés et traités au total",
                 ),
                 add_callout(
-                    number=total_bs_created,
+                    number=header_metrics["total_bs_created"],
                     text="bordereaux créés au total",
                 ),
                 add_callout(
-                    number=total_companies_created,
+                    number=header_metrics["total_companies_created"],
                     text="établissements inscrits au total",
                 ),
             ],
             className="row",
         ),
         html.Nav(
-            get_navbar_elements([2022, 2023], 2022),
+            get_navbar_elements((2022, 2023), 2023),
             className="fr-nav",
             id="header-navigation",
             role="navigation",
@@ -168,25 +195,25 @@ Un bordereau de suivi de déchet (BSD) est créé pour chaque déchet et chaque
 def get_graph_elements_for_a_year(
     quantity_processed_total: int,
     bs_created_total: int,
-    quantity_processed_weekly: go.Figure,
-    quantity_processed_sunburst_figure: go.Figure,
-    bsdd_counts_weekly: go.Figure,
-    bsda_counts_weekly: go.Figure,
-    bsff_counts_weekly: go.Figure,
-    bsdasri_counts_weekly: go.Figure,
-    bsdd_quantities_weekly: go.Figure,
-    bsda_quantities_weekly: go.Figure,
-    bsdasri_quantities_weekly: go.Figure,
-    produced_quantity_by_category: go.Figure,
+    quantity_processed_weekly: dict,
+    quantity_processed_sunburst_figure: dict,
+    bsdd_counts_weekly: dict,
+    bsda_counts_weekly: dict,
+    bsff_counts_weekly: dict,
+    bsdasri_counts_weekly: dict,
+    bsdd_quantities_weekly: dict,
+    bsda_quantities_weekly: dict,
+    bsdasri_quantities_weekly: dict,
+    produced_quantity_by_category: dict,
     company_created_total_life: int,
     user_created_total_life: int,
-    company_created_weekly: go.Figure,
-    user_created_weekly: go.Figure,
-    company_counts_by_category: go.Figure,
+    company_created_weekly: dict,
+    user_created_weekly: dict,
+    company_counts_by_category: dict,
     year: int,
 ) -> list:
     """
-    Creates the div container that contains all the graphes and that will be displayed using all the precomputed metrics and Plotly Figures objects.
+    Creates the div container that contains all the graphes and that will be displayed using all the precomputed metrics and Plotly figures specs.
 
     Parameters
     ----------
@@ -194,33 +221,33 @@ def get_graph_elements_for_a_year(
         Number of tons of waste processed.
     bsdd_created_total: int
         Total number of bordereaux created (BSDD, BSDA, BSFF and BSDASRI).
-    quantity_processed_weekly: Plotly Figure object
+    quantity_processed_weekly: dict (Plotly figure spec)
         Bar plot showing the quantity of waste processed by week and by process type.
-    quantity_processed_sunburst_figure: Plotly Figure object
+    quantity_processed_sunburst_figure: dict (Plotly figure spec)
         Sunburst plot showing the waste quantity by processing code.
-    bsdd_counts_weekly: Plotly Figure object
+    bsdd_counts_weekly: dict (Plotly figure spec)
         Scatter plot showing the number of BSDD weekly created, sent, received and processed.
-    bsda_counts_weekly: Plotly Figure object
+    bsda_counts_weekly: dict (Plotly figure spec)
         Scatter plot showing the number of BSDA weekly created, sent, received and processed.
-    bsff_counts_weekly: Plotly Figure object
+    bsff_counts_weekly: dict (Plotly figure spec)
         Scatter plot showing the number of BSFF weekly created, sent, received and processed.
-    bsdasri_counts_weekly: Plotly Figure object
+    bsdasri_counts_weekly: dict (Plotly figure spec)
         Scatter plot showing the number of BSDASRI weekly created, sent, received and processed.
-    bsdd_quantities_weekly: Plotly Figure object
+    bsdd_quantities_weekly: dict (Plotly figure spec)
         Scatter plot showing the waste weekly quantities created, sent, received and processed.
-    bsda_quantities_weekly: Plotly Figure object
+    bsda_quantities_weekly: dict (Plotly figure spec)
         Scatter plot showing the waste weekly quantities created, sent, received and processed.
-    bsff_quantities_weekly: Plotly Figure object
+    bsff_quantities_weekly: dict (Plotly figure spec)
         Scatter plot showing the waste weekly quantities created, sent, received and processed.
-    bsdasri_quantities_weekly: Plotly Figure object
+    bsdasri_quantities_weekly: dict (Plotly figure spec)
         Scatter plot showing the waste weekly quantities created, sent, received and processed.
     company_created_total_life: int
         Number of companies with an account on the Trackdéchets platform (all time).
     user_created_total_life: int
         Number of users with an account on the Trackdéchets platform (all time).
-    company_created_weekly: Plotly Figure object
+    company_created_weekly: dict (Plotly figure spec)
         Scatter plot showing the number of company accounts created weekly.
-    user_created_weekly: Plotly Figure object
+    user_created_weekly: dict (Plotly figure spec)
         Scatter plot showing the number of user accounts created weekly.
     year: int
         The year for which the data is displayed.
@@ -231,18 +258,20 @@ def get_graph_elements_for_a_year(
         Layout as a list of Dash components, ready to be rendered.
     """
 
+    year_callouts = get_year_callout_elements(
+        quantity_processed_total=quantity_processed_total,
+        bs_created_total=bs_created_total,
+        company_created_total_life=company_created_total_life,
+        user_created_total_life=user_created_total_life,
+        year=year,
+    )
+
     elements = [
         html.H3(f"Statistiques pour l'année {year}", id="stats-year-title"),
         html.Div(
             [
-                add_callout(
-                    number=quantity_processed_total,
-                    text=f"tonnes de déchets dangereux* tracés et traités sur l'année {year}",
-                ),
-                add_callout(
-                    number=bs_created_total,
-                    text=f"bordereaux créés sur l'année {year}",
-                ),
+                year_callouts["quantity_processed_total"],
+                year_callouts["bs_created_total"],
                 dcc.Markdown(
                     """Les modes de traitement des déchets dangereux s'inscrivent dans la [hiérarchie des traitements de déchets](https://www.ecologie.gouv.fr/gestion-des-dechets-principes-generaux#scroll-nav__4).
 Ainsi la réutilisation, le recyclage ou la valorisation sont considérés comme "valorisés" dans Trackdéchets, et sont comparés à l'élimination (pas de réutilisation, recyclage ou valorisation possible dans les conditions techniques et économiques du moment).""",
@@ -256,7 +285,7 @@ Ainsi la réutilisation, le recyclage ou la valorisation sont considérés comme
             [
                 add_figure(
                     quantity_processed_weekly,
-                    "bsdd_processed_weekly",
+                    {"type": "figure", "index": "quantity_processed_weekly"},
                     "Quantité de déchets dangereux* tracés et traités par semaine",
                 )
             ]
@@ -265,12 +294,13 @@ Ainsi la réutilisation, le recyclage ou la valorisation sont considérés comme
             [
                 add_figure(
                     quantity_processed_sunburst_figure,
-                    "bsdd_processed_by_operation",
+                    {"type": "figure", "index": "quantity_processed_sunburst_figure"},
                     "Quantité de déchets dangereux* tracés et traités par opération de traitement",
                     (
                         "Le cœur du graphique représente la part de déchets valorisés et éliminés, "
                         "les sections autour permettent d'avoir une idée de la part de déchets par type d'opération de traitement."
                     ),
+                    lazy=True,
                 ),
                 add_callout(
                     text="""Les codes R (recovery, valorisation) et D (disposal, élimination) définis par la convention de Bâle, et repris aux annexes I et II de la directive cadre déchets n° 2008/98/CE, sont régulièrement exploités dans le contexte de la traçabilité des déchets et de la déclaration annuelle des émissions et des transferts de polluants et des déchets (déclaration GEREP). Ces codes permettent de discerner les différentes opérations de valorisation et d’élimination des déchets. La liste des codes déchets peut être retrouvées en annexe de la [notice BSDD](https://faq.trackdechets.fr/dechets-dangereux-classiques/telecharger-la-notice-et-le-recepisse-du-bsdd).""",
@@ -283,7 +313,7 @@ Ainsi la réutilisation, le recyclage ou la valorisation sont considérés comme
             [
                 add_figure(
                     produced_quantity_by_category,
-                    "produced_quantity_by_category",
+                    {"type": "figure", "index": "produced_quantity_by_category"},
                     "Quels sont les catégories d'entreprises qui produisent le plus de déchets dangereux* ?",
                     (
                         "La Nomenclature des Activités Françaises permet de catégoriser "
@@ -294,6 +324,7 @@ Ainsi la réutilisation, le recyclage ou la valorisation sont considérés comme
                         "de l'exploitation des établissements exutoires ou faisant du Tri, Transit, Regroupement.  "
                         "Un clic sur une des catégories permet de visualiser la hiérarchie suivante."
                     ),
+                    lazy=True,
                 )
             ]
         ),
@@ -394,26 +425,16 @@ Ainsi la réutilisation, le recyclage ou la valorisation sont considérés comme
                                     "Nombre de Bordereaux de Suivi de Déchets Dangereux par semaine"
                                 ]
                             ),
-                            dcc.Graph(
-                                figure=bsdd_counts_weekly,
-                                config=PLOTLY_PLOT_CONFIGS,
-                                id={
-                                    "type": "counts-figure",
-                                    "index": "bsdd",
-                                    "year": year,
-                                },
+                            add_lazy_figure(
+                                "bsdd_counts_weekly",
+                                bsdd_counts_weekly["layout"].get("height"),
                             ),
                             html.H4(
                                 ["Quantités de Déchets Dangereux tracés par semaine"]
                             ),
-                            dcc.Graph(
-                                figure=bsdd_quantities_weekly,
-                                config=PLOTLY_PLOT_CONFIGS,
-                                id={
-                                    "type": "counts-figure",
-                                    "index": "bsdd-quantities",
-                                    "year": year,
-                                },
+                            add_lazy_figure(
+                                "bsdd_quantities_weekly",
+                                bsdd_quantities_weekly["layout"].get("height"),
                             ),
                         ],
                         id="tabpanel-404-panel",
@@ -429,26 +450,16 @@ Ainsi la réutilisation, le recyclage ou la valorisation sont considérés comme
                                     "Nombre de Bordereaux de Suivi de Déchets d'Amiante par semaine"
                                 ]
                             ),
-                            dcc.Graph(
-                                figure=bsda_counts_weekly,
-                                config=PLOTLY_PLOT_CONFIGS,
-                                id={
-                                    "type": "counts-figure",
-                                    "index": "bsda",
-                                    "year": year,
-                                },
+                            add_lazy_figure(
+                                "bsda_counts_weekly",
+                                bsda_counts_weekly["layout"].get("height"),
                             ),
                             html.H4(
                                 ["Quantités de Déchets D'amiante tracés par semaine"]
                             ),
-                            dcc.Graph(
-                                figure=bsda_quantities_weekly,
-                                config=PLOTLY_PLOT_CONFIGS,
-                                id={
-                                    "type": "counts-figure",
-                                    "index": "bsda-quantities",
-                                    "year": year,
-                                },
+                            add_lazy_figure(
+                                "bsda_quantities_weekly",
+                                bsda_quantities_weekly["layout"].get("height"),
                             ),
                         ],
                         id="tabpanel-405-panel",
@@ -468,14 +479,9 @@ Ainsi la réutilisation, le recyclage ou la valorisation sont considérés comme
                                     "Nombre de Bordereaux de Suivi de Fluides Frigorigènes par semaine"
                                 ]
                             ),
-                            dcc.Graph(
-                                figure=bsff_counts_weekly,
-                                config=PLOTLY_PLOT_CONFIGS,
-                                id={
-                                    "type": "counts-figure",
-                                    "index": "bsff",
-                                    "year": year,
-                                },
+                            add_lazy_figure(
+                                "bsff_counts_weekly",
+                                bsff_counts_weekly["layout"].get("height"),
                             ),
                         ],
                         id="tabpanel-406-panel",
@@ -495,28 +501,18 @@ Ainsi la réutilisation, le recyclage ou la valorisation sont considérés comme
                                     "Nombre de Bordereaux de Suivi de Déchets d'Activités de Soins à Risques Infectieux par semaine"
                                 ]
                             ),
-                            dcc.Graph(
-                                figure=bsdasri_counts_weekly,
-                                config=PLOTLY_PLOT_CONFIGS,
-                                id={
-                                    "type": "counts-figure",
-                                    "index": "bsdasri",
-                                    "year": year,
-                                },
+                            add_lazy_figure(
+                                "bsdasri_counts_weekly",
+                                bsdasri_counts_weekly["layout"].get("height"),
                             ),
                             html.H4(
                                 [
                                     "Quantités de Déchets d'Activités de Soins à Risques Infectieux tracés par semaine"
                                 ]
                             ),
-                            dcc.Graph(
-                                figure=bsdasri_quantities_weekly,
-                                config=PLOTLY_PLOT_CONFIGS,
-                                id={
-                                    "type": "counts-figure",
-                                    "index": "bsdasri-quantities",
-                                    "year": year,
-                                },
+                            add_lazy_figure(
+                                "bsdasri_quantities_weekly",
+                                bsdasri_quantities_weekly["layout"].get("height"),
                             ),
                         ],
                         id="tabpanel-407-panel",
@@ -532,18 +528,8 @@ Ainsi la réutilisation, le recyclage ou la valorisation sont considérés comme
         html.H4("Établissements et utilisateurs"),
         html.Div(
             [
-                add_callout(
-                    number=company_created_total_life,
-                    text=f"établissements inscrits sur l'année {year}"
-                    if year == 2022
-                    else f"nouveaux établissements inscrits sur l'année {year}",
-                ),
-                add_callout(
-                    number=user_created_total_life,
-                    text=f"utilisateurs inscrits sur l'année {year}"
-                    if year == 2022
-                    else f"nouveaux utilisateurs inscrits sur l'année {year}",
-                ),
+                year_callouts["company_created_total_life"],
+                year_callouts["user_created_total_life"],
             ],
             className="row",
             id="companies-users-total-section",
@@ -602,9 +588,9 @@ Ainsi la réutilisation, le recyclage ou la valorisation sont considérés comme
                                         "Nombre de compte d'établissements créés par semaine"
                                     ]
                                 ),
-                                dcc.Graph(
-                                    figure=company_created_weekly,
-                                    config=PLOTLY_PLOT_CONFIGS,
+                                add_lazy_figure(
+                                    "company_created_weekly",
+                                    company_created_weekly["layout"].get("height"),
                                 ),
                             ],
                             id="tabpanel-201-panel",
@@ -618,9 +604,9 @@ Ainsi la réutilisation, le recyclage ou la valorisation sont considérés comme
                                 html.H4(
                                     ["Nombre de comptes utilisateurs créés par semaine"]
                                 ),
-                                dcc.Graph(
-                                    figure=user_created_weekly,
-                                    config=PLOTLY_PLOT_CONFIGS,
+                                add_lazy_figure(
+                                    "user_created_weekly",
+                                    user_created_weekly["layout"].get("height"),
                                 ),
                             ],
                             id="tabpanel-202-panel",
@@ -639,13 +625,14 @@ Ainsi la réutilisation, le recyclage ou la valorisation sont considérés comme
             [
                 add_figure(
                     company_counts_by_category,
-                    "company_counts_by_category",
+                    {"type": "figure", "index": "company_counts_by_category"},
                     "Nombre d'entreprises inscrites pour chaque catégorie de code NAF",
                     (
                         "La Nomenclature des Activités Françaises permet de catégoriser "
                         "les différents établissements qui s'inscrivent sur Trackdéchets.  \r"
                         "Un clic sur une des catégories permet de visualiser la hiérarchie suivante."
                     ),
+                    lazy=True,
                 )
             ]
         ),
@@ -660,14 +647,106 @@ Ainsi la réutilisation, le recyclage ou la valorisation sont considérés comme
     return elements
 
 
-def get_navbar_elements(years: list[int], year_selected: int) -> html.Ul:
+def get_graph_element(figure_key: str, figure: dict) -> dcc.Graph:
+    """
+    Creates the graph element of a figure of the home page, used to replace the figure placeholders
+    once they are loaded.
+
+    Parameters
+    ----------
+    figure_key: str
+        Name of the figure, as in the keyword arguments of `get_graph_elements_for_a_year`.
+    figure: dict (Plotly figure spec)
+        The figure to display.
+
+    Returns
+    -------
+    dcc.Graph
+        Graph with a pattern-matching id of type 'counts-figure' or 'figure' and the figure key as index.
+    """
+
+    figure_type = "counts-figure" if figure_key in COUNTS_FIGURES_KEYS else "figure"
+
+    return dcc.Graph(
+        figure=figure,
+        config=PLOTLY_PLOT_CONFIGS,
+        id={"type": figure_type, "index": figure_key},
+    )
+
+
+def get_year_callout_elements(
+    quantity_processed_total: int,
+    bs_created_total: int,
+    company_created_total_life: int,
+    user_created_total_life: int,
+    year: int,
+) -> dict[str, html.Div]:
+    """
+    Creates the callout elements whose content depends on the year of data displayed.
+
+    Parameters
+    ----------
+    quantity_processed_total: int
+        Number of tons of waste processed.
+    bs_created_total: int
+        Total number of bordereaux created (BSDD, BSDA, BSFF and BSDASRI).
+    company_created_total_life: int
+        Number of companies with an account on the Trackdéchets platform.
+    user_created_total_life: int
+        Number of users with an account on the Trackdéchets platform.
+    year: int
+        The year for which the data is displayed.
+
+    Returns
+    -------
+    dict
+        Callout elements, keyed by the name of the metric they display.
+        Each callout has a pattern-matching id of type 'year-callout' with the metric name as index.
+    """
+
+    callouts_configs = {
+        "quantity_processed_total": (
+            quantity_processed_total,
+            f"tonnes de déchets dangereux* tracés et traités sur l'année {year}",
+        ),
+        "bs_created_total": (
+            bs_created_total,
+            f"bordereaux créés sur l'année {year}",
+        ),
+        "company_created_total_life": (
+            company_created_total_life,
+            f"établissements inscrits sur l'année {year}"
+            if year == 2022
+            else f"nouveaux établissements inscrits sur l'année {year}",
+        ),
+        "user_created_total_life": (
+            user_created_total_life,
+            f"utilisateurs inscrits sur l'année {year}"
+            if year == 2022
+            else f"nouveaux utilisateurs inscrits sur l'année {year}",
+        ),
+    }
+
+    return {
+        key: add_callout(
+            number=number,
+            text=text,
+            callout_id={"type": "year-callout", "index": key},
+        )
+        for key, (number, text) in callouts_configs.items()
+    }
+
+
+@cache_for_data_version
+def get_navbar_elements(years: tuple[int, ...], year_selected: int) -> html.Ul:
     """
     Creates the navbar elements needed for the home page menu that allows
     to select the year for which the data is displayed.
+    The elements are created once per data version and selected year.
 
     Parameters
     ----------
-    years: List of ints
+    years: tuple of ints
         The list of years to add as button in the navbar menu.
     year_selected: int
         The year that is in the 'selected' state.
@@ -706,23 +785,23 @@ def get_navbar_elements(years: list[int], year_selected: int) -> html.Ul:
     )
 
 
-def get_layout_for_a_year(year: int = 2022) -> list:
+def get_layout_data_for_a_year(year: int = 2022) -> dict:
     """
-    Creates the layout that contains all the graph elements for a particular year of data.
+    Computes all the metrics and Plotly figures specs displayed for a particular year of data.
 
     Returns
     -------
-    list
-        A list of dash elements to be inserted in the Div with id 'graph-container'.
+    dict
+        Keyword arguments of `get_graph_elements_for_a_year`.
     """
 
     date_interval = get_data_date_interval_for_year(year)
 
     # Load all needed data
-    bsdd_data_df = BSDD_DATA
-    bsda_data_df = BSDA_DATA
-    bsff_data_df = BSFF_DATA
-    bsdasri_data_df = BSDASRI_DATA
+    bsdd_data_df = datasets.BSDD_DATA
+    bsda_data_df = datasets.BSDA_DATA
+    bsff_data_df = datasets.BSFF_DATA
+    bsdasri_data_df = datasets.BSDASRI_DATA
 
     # BSx weekly figures
     bsdd_weekly_processed_dfs = get_weekly_preprocessed_dfs(bsdd_data_df, date_interval)
@@ -836,12 +915,12 @@ def get_layout_for_a_year(year: int = 2022) -> list:
     # Waste weight processed weekly
     quantity_processed_weekly_df = (
         get_weekly_waste_quantity_processed_by_operation_code_df(
-            ALL_BORDEREAUX_DATA, date_interval
+            datasets.ALL_BORDEREAUX_DATA, date_interval
         )
     )
 
     # Total bordereaux created
-    bs_created_total = get_total_bs_created(ALL_BORDEREAUX_DATA, date_interval)
+    bs_created_total = get_total_bs_created(datasets.ALL_BORDEREAUX_DATA, date_interval)
 
     # Waste weight processed weekly
     (
@@ -863,14 +942,14 @@ def get_layout_for_a_year(year: int = 2022) -> list:
     )
 
     quantity_processed_total = get_total_quantity_processed(
-        ALL_BORDEREAUX_DATA, date_interval
+        datasets.ALL_BORDEREAUX_DATA, date_interval
     )
 
     # Company and user section
-    company_data_df = COMPANY_DATA.filter(
+    company_data_df = datasets.COMPANY_DATA.filter(
         pl.col("created_at").is_between(*date_interval, closed="left")
     )
-    user_data_df = USER_DATA.filter(
+    user_data_df = datasets.USER_DATA.filter(
         pl.col("created_at").is_between(*date_interval, closed="left")
     )
 
@@ -885,16 +964,15 @@ def get_layout_for_a_year(year: int = 2022) -> list:
 
     treemap_companies_figure = create_treemap_companies_figure(company_data_df)
 
-    all_bordereaux_with_naf = get_quantities_by_naf(
-        ALL_BORDEREAUX_DATA, NAF_NOMENCLATURE_DATA, date_interval
+    quantities_by_naf = get_quantities_by_naf(
+        get_producers_quantities(), datasets.NAF_NOMENCLATURE_DATA, date_interval
     )
 
     produced_quantity_by_category = create_treemap_companies_figure(
-        all_bordereaux_with_naf, use_quantity=True
+        quantities_by_naf, use_quantity=True
     )
 
-    # generate
-    elements = get_graph_elements_for_a_year(
+    return dict(
         quantity_processed_total=quantity_processed_total,
         bs_created_total=bs_created_total,
         quantity_processed_weekly=quantity_processed_weekly_fig,
@@ -915,4 +993,69 @@ def get_layout_for_a_year(year: int = 2022) -> list:
         year=year,
     )
 
-    return elements
+
+def get_year_switch_data(layouts_data: dict[int, dict]) -> dict[int, dict]:
+    """
+    Precomputes, for each year, the data sent to the browser when the user switches year.
+    Only what changes from one year to another is kept: the traces of each figure,
+    the layout properties of each figure that differ between years and the content of the year callouts.
+    The static markup of the page is never resent.
+
+    Parameters
+    ----------
+    layouts_data: dict
+        Data computed by `get_layout_data_for_a_year`, keyed by year.
+
+    Returns
+    -------
+    dict
+        Keyed by year, dicts with two keys:
+        - "figures": for each figure id index, a dict with "data" (list of traces) and "layout"
+        (layout properties to update, a None value meaning that the property must be removed);
+        - "callouts": for each year callout id index, the children of the callout.
+    """
+
+    figures_by_year = {
+        year: {
+            key: value
+            for key, value in layout_data.items()
+            if isinstance(value, dict) and "data" in value
+        }
+        for year, layout_data in layouts_data.items()
+    }
+
+    year_switch_data = {}
+    for year, figures in figures_by_year.items():
+        figures_data = {}
+        for key, figure in figures.items():
+            layout = figure["layout"]
+            varying_layout_keys = set()
+            for other_figures in figures_by_year.values():
+                other_layout = other_figures[key]["layout"]
+                varying_layout_keys.update(
+                    layout_key
+                    for layout_key in set(layout) | set(other_layout)
+                    if layout.get(layout_key) != other_layout.get(layout_key)
+                )
+
+            figures_data[key] = {
+                "data": figure["data"],
+                # Resets zoom and legend state of the figure when changing year
+                "layout": {k: layout.get(k) for k in varying_layout_keys}
+                | {"uirevision": year},
+            }
+
+        callouts = get_year_callout_elements(
+            quantity_processed_total=layouts_data[year]["quantity_processed_total"],
+            bs_created_total=layouts_data[year]["bs_created_total"],
+            company_created_total_life=layouts_data[year]["company_created_total_life"],
+            user_created_total_life=layouts_data[year]["user_created_total_life"],
+            year=year,
+        )
+
+        year_switch_data[year] = {
+            "figures": figures_data,
+            "callouts": {key: callout.children for key, callout in callouts.items()},
+        }
+
+    return year_switch_data
@@ -1,10 +1,40 @@
 """This module loads the layouts for several years of data.
-Its allows to have a quick load as needed data is always in memory.
+Its allows to have a quick load as needed data is always in memory: the layouts are built once per data version,
+in the background once the data is loaded (see src/loading.py).
 
 """
-from src.pages.home.home_layout_factory import get_layout_for_a_year
+from src.boot import boot_profile
+from src.data.datasets import cache_for_data_version
+from src.pages.home.home_layout_factory import (
+    get_graph_elements_for_a_year,
+    get_layout_data_for_a_year,
+    get_year_switch_data,
+)
 
-layout_2022 = get_layout_for_a_year(2022)
-layout_2023 = get_layout_for_a_year(2023)
+YEARS = (2022, 2023)
 
-layouts = {2022: layout_2022, 2023: layout_2023}
+
+@cache_for_data_version
+def get_layouts_data() -> dict[int, dict]:
+    """Returns the data of the home page layout of each year, see `get_layout_data_for_a_year`."""
+    return {year: get_layout_data_for_a_year(year) for year in YEARS}
+
+
+@cache_for_data_version
+def get_layouts() -> dict:
+    """Returns the graph elements of the home page of each year."""
+    layouts_data = get_layouts_data()
+    return {year: get_graph_elements_for_a_year(**layouts_data[year]) for year in YEARS}
+
+
+@cache_for_data_version
+def get_years_switch_data() -> dict[int, dict]:
+    """Returns the data sent to the browser when the user switches year, see `get_year_switch_data`."""
+    return get_year_switch_data(get_layouts_data())
+
+
+def build_layouts():
+    """Builds the layouts and the data of all the years, to have them in memory before they are requested."""
+    with boot_profile.phase("layout build"):
+        get_layouts()
+        get_years_switch_data()
@@ -0,0 +1,134 @@
+"""This module contains the loading state of the pages, shown until the data they need is loaded (see src/loading.py).
+"""
+from dash import (
+    ClientsideFunction,
+    Input,
+    Output,
+    State,
+    callback,
+    clientside_callback,
+    dcc,
+    html,
+)
+
+from src.loading import DONE, FAILED, RUNNING, loading_state
+
+# Interval between two refreshes of the progress of the loading
+LOADING_REFRESH_INTERVAL_MS = 2000
+
+STATUS_LABELS = {
+    DONE: "terminé",
+    RUNNING: "en cours",
+    FAILED: "échec",
+}
+
+
+def get_progress_elements(steps: list[str]) -> list[html.Li]:
+    """
+    Creates the list of the loading steps a page needs, with their status.
+
+    Parameters
+    ----------
+    steps: list of str
+        Names of the loading steps (see `LOADING_STEPS` in src/loading.py).
+
+    Returns
+    -------
+    List of Dash Li, one per step.
+    """
+    elements = []
+    for step in loading_state.get_progress(steps):
+        text = f"{step['label']} : {STATUS_LABELS.get(step['status'], 'en attente')}"
+        if step["status"] in (RUNNING, DONE):
+            text += f" ({step['duration_s']:.0f} s)"
+        elements.append(html.Li(text))
+
+    if loading_state.failed:
+        elements.append(
+            html.Li(
+                html.Strong(
+                    "Le chargement des données a échoué, veuillez réessayer plus tard."
+                )
+            )
+        )
+    return elements
+
+
+def get_loading_layout(steps: list[str]) -> html.Div:
+    """
+    Creates the layout shown by a page while the data it needs is loaded.
+    The progress of the loading is refreshed periodically, and the page is reloaded once the data is ready.
+
+    Parameters
+    ----------
+    steps: list of str
+        Names of the loading steps the page needs.
+
+    Returns
+    -------
+    A Dash Div with the id 'main-container'.
+    """
+    elements = [
+        html.Div(
+            [
+                html.H1("Chargement des statistiques", className="fr-callout__title"),
+                html.P(
+                    "Les données sont en cours de chargement, la page s'affichera dès qu'elles seront prêtes.",
+                    className="fr-callout__text",
+                ),
+                html.Ul(get_progress_elements(steps), id="loading-progress"),
+            ],
+            className="fr-callout",
+        ),
+        dcc.Interval(id="loading-interval", interval=LOADING_REFRESH_INTERVAL_MS),
+        dcc.Store(id="loading-steps", data=steps),
+        dcc.Store(id="loading-status"),
+    ]
+
+    return html.Div(
+        html.Div(html.Div(elements, className="fr-col"), className="fr-grid-row"),
+        id="main-container",
+        className="fr-container",
+    )
+
+
+@callback(
+    output=[
+        Output("loading-progress", "children"),
+        Output("loading-status", "data"),
+    ],
+    inputs=[Input("loading-interval", "n_intervals")],
+    state=[State("loading-steps", "data")],
+    prevent_initial_call=True,
+)
+def update_loading_progress(n_intervals: int, steps: list[str]) -> tuple[list, dict]:
+    """This callback is triggered periodically while a page shows its loading state.
+    It refreshes the progress of the loading steps of the page.
+
+    Parameters
+    ----------
+    n_intervals: int
+        Number of refreshes.
+    steps: list of str
+        Names of the loading steps the page needs.
+
+    Returns
+    -------
+    tuple
+        The list of the steps with their status, and whether they are done or failed,
+        used by `reloadWhenReady` in assets/clientside_callbacks.js.
+    """
+    return get_progress_elements(steps), {
+        "ready": loading_state.is_ready(steps),
+        "failed": loading_state.failed,
+    }
+
+
+# This callback reloads the page once the data it needs is loaded, to show its content.
+# It stops the refreshes of the progress if the loading failed.
+clientside_callback(
+    ClientsideFunction(namespace="loading", function_name="reloadWhenReady"),
+    Output("loading-interval", "disabled"),
+    Input("loading-status", "data"),
+    prevent_initial_call=True,
+)
@@ -1,23 +1,32 @@
 """This module contains utility functions useful for all pages.
 """
 import re
+from collections.abc import Sequence
+from functools import lru_cache
 
-import plotly.graph_objects as go
+import polars as pl
 from dash import dcc, html
 
 
 def add_figure(
-    fig: go.Figure, fig_id: str, figure_title: str, figure_subtitle: str = None
+    fig: dict,
+    fig_id: str | dict,
+    figure_title: str,
+    figure_subtitle: str = None,
+    lazy: bool = False,
 ) -> html.Div:
     """
     Boilerplate for figure rows.
 
     Parameters
     -----------
-    fig: Figure
-        a plotly figure
-    fig_id: str
-        if of the figure in the resulting HTML
+    fig: dict
+        a plotly figure spec
+    fig_id: str or dict
+        id of the figure in the resulting HTML, can be a pattern-matching id
+    lazy: bool
+        If True, the figure is replaced by a placeholder (see `add_lazy_figure`)
+        and `fig_id` must be a pattern-matching id.
 
     Returns
     -------
@@ -30,23 +39,26 @@ def add_figure(
             dcc.Markdown(figure_subtitle, className="figure-subtitle fr-text")
         )
 
-    elements.append(
-        dcc.Graph(
-            id=fig_id,
-            figure=fig,
-            config={
-                "locale": "fr",
-                "toImageButtonOptions": {
-                    "format": "png",  # one of png, svg, jpeg, webp
-                    "filename": "trackdechets",
-                    "height": 1080,
-                    "width": 1920,
-                    "scale": 1,  # Multiply title/legend/axis/canvas sizes by this factor
+    if lazy:
+        elements.append(add_lazy_figure(fig_id["index"], fig["layout"].get("height")))
+    else:
+        elements.append(
+            dcc.Graph(
+                id=fig_id,
+                figure=fig,
+                config={
+                    "locale": "fr",
+                    "toImageButtonOptions": {
+                        "format": "png",  # one of png, svg, jpeg, webp
+                        "filename": "trackdechets",
+                        "height": 1080,
+                        "width": 1920,
+                        "scale": 1,  # Multiply title/legend/axis/canvas sizes by this factor
+                    },
+                    "displaylogo": False,
                 },
-                "displaylogo": False,
-            },
+            )
         )
-    )
 
     row = html.Div(
         elements,
@@ -56,13 +68,206 @@ def add_figure(
     return row
 
 
+def add_lazy_figure(figure_key: str, height: int | None = None) -> html.Div:
+    """
+    Placeholder of a figure that is loaded only once it becomes visible in the browser,
+    or once its tab is selected if it is inside a tab panel (see assets/lazy_figures.js).
+    The placeholder contains a hidden trigger button clicked by the browser when the figure needs to be loaded.
+
+    Parameters
+    -----------
+    figure_key: str
+        Key identifying the figure, used as index of the pattern-matching ids of the placeholder.
+    height: int
+        Optional. Height of the figure, in pixels, so that the placeholder takes the space of the figure.
+
+    Returns
+    -------
+    A Div with a pattern-matching id of type 'lazy-figure-container' whose children are replaced by the figure.
+    """
+
+    return html.Div(
+        html.Button(
+            id={"type": "lazy-figure-trigger", "index": figure_key},
+            className="lazy-figure-trigger",
+            hidden=True,
+        ),
+        id={"type": "lazy-figure-container", "index": figure_key},
+        className="lazy-figure",
+        style={"minHeight": f"{height or 450}px"},
+    )
+
+
 def format_number(input_number: float, precision: int = 0) -> str:
     """Format a float to a string with thousands separated by space and rounding it at the given precision."""
     input_number = round(input_number, precision)
     return re.sub(r"\.0+", "", "{:,}".format(input_number).replace(",", " "))
 
 
-def add_callout(text: str, number: int = None) -> html.Div:
+# Veltkamp splitting factor (2**27 + 1), used to compute exactly the rounding error of a product of floats
+SPLIT_FACTOR = 134217729.0
+
+
+def split_float(value: pl.Expr | float) -> tuple[pl.Expr | float, pl.Expr | float]:
+    """Splits floats into a high and a low part of 26 bits each, whose products are exact."""
+    c = value * SPLIT_FACTOR
+    high = c - (c - value)
+    return high, value - high
+
+
+def round_half_even_expr(expr: pl.Expr, precision: int = 0) -> pl.Expr:
+    """
+    Polars expression rounding numbers to the given precision with ties to even, like python `round`.
+    Ties are decided on the exact value of the floats: 2.675 is rounded to 2.67 because its float
+    is slightly below 2.675. To do so, the rounding error of the product by 10**precision is computed
+    exactly (Dekker's product) and tells on which side of the tie the exact product is.
+
+    Returns
+    -------
+    Expression of the rounded number multiplied by 10**precision, as a float with no decimal part.
+    """
+    expr = expr.cast(pl.Float64)
+    factor = 10.0**precision
+    scaled = expr * factor
+    floor = scaled.floor()
+
+    expr_high, expr_low = split_float(expr)
+    factor_high, factor_low = split_float(factor)
+    error = (
+        ((expr_high * factor_high - scaled) + expr_high * factor_low)
+        + expr_low * factor_high
+    ) + expr_low * factor_low
+
+    return (
+        pl.when(scaled - floor != 0.5)
+        .then(scaled.round(0))
+        .when(error > 0)
+        .then(floor + 1)
+        .when(error < 0)
+        .then(floor)
+        .when(floor % 2 != 0)
+        .then(floor + 1)
+        .otherwise(floor)
+    )
+
+
+@lru_cache
+def get_format_numbers_steps(precision: int) -> list[list[pl.Expr]]:
+    """
+    Builds the expressions of `format_numbers`, applied to a 'value' column. They are built once per precision.
+    The intermediate results are computed as columns, step by step, so that they are computed only once.
+    """
+    factor = 10**precision
+
+    rounding_step = [
+        round_half_even_expr(pl.col("value"), precision).abs().alias("rounded"),
+        # Negative numbers rounded to zero keep their sign, as python floats do
+        (
+            (pl.col("value") < 0)
+            | ((pl.col("value") == 0) & (1 / pl.col("value").cast(pl.Float64) < 0))
+        ).alias("is_negative"),
+    ]
+    digits_step = [
+        (pl.col("rounded") // factor)
+        .cast(pl.Int64)
+        .cast(pl.Utf8)
+        .str.zfill(18)
+        .alias("integer_part"),
+        (pl.col("rounded") % factor)
+        .cast(pl.Int64)
+        .cast(pl.Utf8)
+        .str.zfill(precision)
+        .str.rstrip("0")
+        .alias("decimal_part"),
+    ]
+    # Thousands separated by spaces, leading zeros removed
+    thousands_step = [
+        pl.concat_str(
+            [pl.col("integer_part").str.slice(i, 3) for i in range(0, 18, 3)], sep=" "
+        )
+        .str.lstrip("0 ")
+        .alias("integer_part")
+    ]
+    formatting_step = [
+        # Null numbers stay null
+        pl.when(pl.col("rounded").is_null())
+        .then(pl.lit(None, dtype=pl.Utf8))
+        .otherwise(
+            pl.concat_str(
+                [
+                    pl.when(pl.col("is_negative"))
+                    .then(pl.lit("-"))
+                    .otherwise(pl.lit("")),
+                    pl.when(pl.col("integer_part") == "")
+                    .then(pl.lit("0"))
+                    .otherwise(pl.col("integer_part")),
+                    # Like `format_number`, the dot and the zeros following it are removed
+                    pl.when((pl.col("decimal_part") == "") | (precision == 0))
+                    .then(pl.lit(""))
+                    .when(pl.col("decimal_part").str.starts_with("0"))
+                    .then(pl.col("decimal_part").str.lstrip("0"))
+                    .otherwise(pl.concat_str([pl.lit("."), pl.col("decimal_part")])),
+                ]
+            )
+        )
+        .alias("value")
+    ]
+
+    return [rounding_step, digits_step, thousands_step, formatting_step]
+
+
+# Above this magnitude, the digits of the numbers multiplied by 10**precision can't be computed exactly from floats
+FORMAT_NUMBERS_MAX_VECTORIZED_VALUE = 10**15
+
+
+def format_numbers(values: pl.Series | Sequence, precision: int = 0) -> pl.Series:
+    """
+    Batch counterpart of `format_number`: formats a whole Series or array of numbers at once.
+    Numbers are formatted with polars expressions, without python calls, null numbers staying null.
+    Series that can't be formatted exactly with polars (NaN or numbers whose digits at this precision exceed
+    FORMAT_NUMBERS_MAX_VECTORIZED_VALUE) are formatted with `format_number`.
+
+    Parameters
+    ----------
+    values: Series or sequence
+        Numbers to format, integers or floats. Can be a polars Series, a numpy array or a list.
+        Numbers of numpy arrays are formatted as python numbers (python rounding, not numpy's).
+    precision: int
+        Number of decimals to round to.
+
+    Returns
+    -------
+    Series
+        Formatted numbers, the same strings as `format_number` for each number.
+    """
+    if not isinstance(values, pl.Series):
+        values = pl.Series(values)
+
+    if (
+        not values.is_numeric()
+        or (values.is_float() and values.is_nan().any())
+        or (values.abs().max() or 0) * 10**precision
+        >= FORMAT_NUMBERS_MAX_VECTORIZED_VALUE
+    ):
+        return pl.Series(
+            values.name,
+            [format_number(value, precision) for value in values.to_list()],
+            dtype=pl.Utf8,
+        )
+
+    *steps, formatting_step = get_format_numbers_steps(precision)
+
+    # Renamed as a copy, building a DataFrame from a dict would rename the given Series in place
+    lazy_df = values.alias("value").to_frame().lazy()
+    for step in steps:
+        lazy_df = lazy_df.with_columns(step)
+
+    return lazy_df.select(formatting_step).collect().to_series().alias(values.name)
+
+
+def add_callout(
+    text: str, number: int = None, callout_id: str | dict = None
+) -> html.Div:
     """
     Create a callout element with text and optional number.
 
@@ -76,6 +281,7 @@ def add_callout(text: str, number: int = None) -> html.Div:
         Use to specified the width of the callout element on small screens.
         Default value 0 will set the small_width to two times the width.
     number: Optional. Number to display in the callout element.
+    callout_id: Optional. Id of the callout element, can be a pattern-matching id.
 
     Returns
     -------
@@ -98,10 +304,8 @@ def add_callout(text: str, number: int = None) -> html.Div:
     elements.append(
         dcc.Markdown(text, className=text_class),
     )
-    col = html.Div(
-        elements,
-        className="fr-callout",
-    )
+    id_kwargs = {"id": callout_id} if callout_id is not None else {}
+    col = html.Div(elements, className="fr-callout", **id_kwargs)
 
     return col
 
@@ -0,0 +1,254 @@
+"""
+Serving layer: caches the serialized responses of the app.
+
+The page layouts and most of the callbacks responses only depend on the data, which is loaded once.
+Their JSON serialization (done with orjson by plotly when it is installed) and their compression are
+thus done once per data version: the resulting bytes are stored with their gzip and brotli variants
+and served with a strong ETag, so that conditional requests are answered with `304 Not Modified`.
+The cache is bounded, the least recently used payloads are evicted first.
+"""
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import flask
+from dash import Dash
+
+from src.data import datasets
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, only the gzip variant is stored without it
+    brotli = None
+
+# Output of the callback that renders the pages (see `Dash.enable_pages`)
+PAGES_ROUTER_OUTPUT = ".._pages_content.children..._pages_store.data.."
+
+CACHED_GET_PATHS = ["_dash-layout", "_dash-dependencies"]
+
+# Payloads smaller than that are not worth compressing
+MIN_COMPRESSED_SIZE = 500
+
+# Compression levels of the variants: the payloads are compressed while the request that computed them waits,
+# the highest levels (gzip 9, brotli 11) would take hundreds of milliseconds on the largest payloads
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Bounds of the payload cache, in number of payloads and in bytes (all variants included)
+MAX_CACHED_PAYLOADS = 1000
+MAX_CACHED_PAYLOADS_BYTES = 64_000_000
+
+
+def cache_response(func: Callable) -> Callable:
+    """
+    Marks a callback whose response is cached by the serving layer.
+    The response of such callback must only depend on the data, the input that triggered it,
+    its outputs ids and its states, not on the value of its inputs (like the number of clicks on a button).
+    Must be placed under the `callback` decorator.
+    """
+    func.cached_response = True
+    return func
+
+
+class Payload:
+    """Serialized response with its compressed variants and its ETag."""
+
+    def __init__(self, body: bytes, mimetype: str):
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = {"identity": body}
+        if len(body) >= MIN_COMPRESSED_SIZE:
+            self.variants["gzip"] = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+        self.size = sum(len(variant) for variant in self.variants.values())
+
+    def get_response(self, accepted_encodings: set[str]) -> flask.Response:
+        """
+        Builds the response, using the smallest variant the client accepts.
+        Answers `304 Not Modified` if the client already has this payload.
+        """
+        if self.etag in flask.request.if_none_match:
+            response = flask.Response(status=304)
+        else:
+            encoding = min(
+                (
+                    e
+                    for e in self.variants
+                    if e == "identity" or e in accepted_encodings
+                ),
+                key=lambda e: len(self.variants[e]),
+            )
+            response = flask.Response(self.variants[encoding], mimetype=self.mimetype)
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(self.etag)
+        response.headers["Cache-Control"] = "no-cache"
+        response.vary.add("Accept-Encoding")
+        return response
+
+
+class PayloadCache:
+    """
+    Payloads of the current data version, by request key, the most recently used last.
+    Emptied when the data version changes.
+    """
+
+    def __init__(
+        self,
+        max_payloads: int = MAX_CACHED_PAYLOADS,
+        max_bytes: int = MAX_CACHED_PAYLOADS_BYTES,
+    ):
+        self.max_payloads = max_payloads
+        self.max_bytes = max_bytes
+        self.data_version = None
+        self.payloads = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def check_data_version(self):
+        data_version = datasets.get_data_version()
+        if data_version != self.data_version:
+            with self.lock:
+                self.payloads = OrderedDict()
+                self.size = 0
+                self.data_version = data_version
+
+    def get(self, key: str) -> Payload | None:
+        self.check_data_version()
+        with self.lock:
+            payload = self.payloads.get(key)
+            if payload is not None:
+                self.payloads.move_to_end(key)
+            return payload
+
+    def set(self, key: str, payload: Payload, data_version: str):
+        """
+        Stores a payload computed from the given data version, unless the data was reloaded meanwhile.
+        Evicts the least recently used payloads beyond the bounds of the cache.
+        """
+        if payload.size > self.max_bytes:
+            return
+        with self.lock:
+            if data_version != self.data_version:
+                return
+            previous = self.payloads.pop(key, None)
+            if previous is not None:
+                self.size -= previous.size
+            self.payloads[key] = payload
+            self.size += payload.size
+            while len(self.payloads) > self.max_payloads or self.size > self.max_bytes:
+                _, evicted = self.payloads.popitem(last=False)
+                self.size -= evicted.size
+
+
+payload_cache = PayloadCache()
+
+
+def get_accepted_encodings() -> set[str]:
+    """Parses the Accept-Encoding header of the current request, ignoring encodings with a null weight."""
+    accepted = set()
+    for value in flask.request.headers.get("Accept-Encoding", "").split(","):
+        encoding, *params = [e.strip() for e in value.split(";")]
+        if encoding and not any(
+            p.replace(" ", "") in ("q=0", "q=0.0", "q=0.00") for p in params
+        ):
+            accepted.add(encoding.lower())
+    return accepted
+
+
+def get_request_key(app: Dash) -> str | None:
+    """
+    Computes the key of the current request in the payload cache.
+
+    Returns
+    -------
+    The key, or None if the response of this request can't be cached.
+    """
+    path = flask.request.path.removeprefix(app.config.routes_pathname_prefix)
+
+    if flask.request.method == "GET" and path in CACHED_GET_PATHS:
+        return path
+
+    if flask.request.method != "POST" or path != "_dash-update-component":
+        return None
+
+    body = flask.request.get_json()
+    output = body["output"]
+    if output == PAGES_ROUTER_OUTPUT:
+        # Keyed by the page the path resolves to, so that the URLs of a page share one entry.
+        # The query string is ignored, the layouts of the pages don't take query parameters.
+        pathname = next(
+            (
+                e.get("value")
+                for e in body.get("inputs") or []
+                if e.get("property") == "pathname"
+            ),
+            None,
+        )
+        page, path_variables = app._path_to_page(
+            app.strip_relative_path(pathname or "/")
+        )
+        if path_variables:
+            return None
+        key_parts = [output, page.get("path")]
+    elif getattr(
+        app.callback_map.get(output, {}).get("callback"), "cached_response", False
+    ):
+        key_parts = [
+            output,
+            body.get("outputs"),
+            body.get("changedPropIds"),
+            body.get("state"),
+        ]
+    else:
+        return None
+
+    return json.dumps(key_parts, sort_keys=True)
+
+
+def register_payload_cache(app: Dash):
+    """
+    Registers the hooks serving the cached payloads on the Flask server of the app.
+    The response of a cacheable request is stored the first time it is computed by Dash,
+    then all the following identical requests are served from the cache.
+    Nothing is cached until the data is loaded and the pages are built, as the pages show their loading state.
+    """
+    # Imported here as it imports the pages modules, that use this module
+    from src.loading import loading_state
+
+    @app.server.before_request
+    def serve_cached_payload():
+        key = get_request_key(app) if loading_state.is_ready() else None
+        flask.g.payload_key = key
+        if key is None:
+            return None
+        payload = payload_cache.get(key)
+        if payload is not None:
+            flask.g.payload_key = None
+            flask.g.payload_cache_result = "hit"
+            return payload.get_response(get_accepted_encodings())
+
+        # Captured once `get` has checked the data version, so that the payload of the first request
+        # after a (re)load is stored
+        flask.g.payload_data_version = payload_cache.data_version
+        return None
+
+    @app.server.after_request
+    def cache_payload(response: flask.Response) -> flask.Response:
+        key = flask.g.get("payload_key")
+        if (
+            key is None
+            or response.status_code != 200
+            or response.mimetype != "application/json"
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+
+        payload = Payload(response.get_data(), response.mimetype)
+        payload_cache.set(key, payload, flask.g.payload_data_version)
+        flask.g.payload_cache_result = "miss"
+        return payload.get_response(get_accepted_encodings())
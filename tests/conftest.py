@@ -0,0 +1,4 @@
+"""Configuration of the tests, that don't need the database: they use synthetic data."""
+import os
+
+os.environ.setdefault("DATABASE_URL", "")
@@ -0,0 +1,228 @@
+"""Tests of the single-flight calls and of the caches by data version, see src/data/datasets.py."""
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.data import datasets
+from src.data.datasets import (
+    Flight,
+    SingleFlight,
+    cache_for_data_version,
+    single_flight,
+)
+
+TIMEOUT_S = 5
+
+
+class TrackedFlight(Flight):
+    """A flight telling when an identical call starts waiting for it."""
+
+    waiting = None
+
+    def __init__(self):
+        super().__init__()
+        done_wait = self.done.wait
+
+        def wait(timeout=None):
+            TrackedFlight.waiting.set()
+            return done_wait(timeout)
+
+        self.done.wait = wait
+
+
+class BlockedCall:
+    """A function call blocked until `release` is called, run in a thread."""
+
+    def __init__(self, target, *args):
+        self.started = threading.Event()
+        self.released = threading.Event()
+        self.result = None
+        self.error = None
+        self.thread = threading.Thread(target=self.run, args=(target, *args))
+
+    def run(self, target, *args):
+        try:
+            self.result = target(*args)
+        except BaseException as e:
+            self.error = e
+
+    def block(self, value):
+        """Function called by the blocked call: waits to be released and returns the value."""
+        self.started.set()
+        assert self.released.wait(TIMEOUT_S)
+        if isinstance(value, BaseException):
+            raise value
+        return value
+
+    def start(self):
+        self.thread.start()
+        assert self.started.wait(TIMEOUT_S)
+        return self
+
+    def release(self):
+        self.released.set()
+        self.thread.join(TIMEOUT_S)
+
+
+class Aborted(BaseException):
+    """Like the SystemExit raised by a worker timeout."""
+
+
+@pytest.fixture
+def tracked_flights(monkeypatch):
+    monkeypatch.setattr(datasets, "Flight", TrackedFlight)
+    monkeypatch.setattr(TrackedFlight, "waiting", threading.Event())
+    return TrackedFlight
+
+
+@pytest.fixture
+def data_version(monkeypatch):
+    """Sets the data version, returns a function reloading the data."""
+    reloads = []
+
+    def reload():
+        reloads.append(None)
+        update_date = datetime(2023, 1, 1) + timedelta(hours=len(reloads))
+        monkeypatch.setattr(datasets, "DATA_UPDATE_DATE", update_date)
+
+    reload()
+    return reload
+
+
+def run_waiting_call(target, *args) -> BlockedCall:
+    """Runs a call that must wait for the identical call in flight."""
+    call = BlockedCall(target, *args)
+    call.thread.start()
+    assert TrackedFlight.waiting.wait(TIMEOUT_S)
+    return call
+
+
+def test_identical_calls_wait_for_the_call_in_flight(tracked_flights):
+    flights = SingleFlight()
+    leader = BlockedCall(flights.do, "key", lambda: leader.block("result"))
+    leader.start()
+    waiter = run_waiting_call(flights.do, "key", pytest.fail)
+
+    leader.release()
+    waiter.thread.join(TIMEOUT_S)
+
+    assert leader.result == ("result", False)
+    assert waiter.result == ("result", True)
+    assert flights.flights == {}
+
+
+def test_different_calls_are_not_coalesced():
+    flights = SingleFlight()
+    leader = BlockedCall(flights.do, "key", lambda: leader.block("result"))
+    leader.start()
+
+    assert flights.do("other key", lambda: "other result") == ("other result", False)
+    leader.release()
+
+
+def test_identical_calls_get_the_exception_of_the_call_in_flight(tracked_flights):
+    flights = SingleFlight()
+    error = ValueError("failed")
+    leader = BlockedCall(flights.do, "key", lambda: leader.block(error))
+    leader.start()
+    waiter = run_waiting_call(flights.do, "key", pytest.fail)
+
+    leader.release()
+    waiter.thread.join(TIMEOUT_S)
+
+    assert leader.error is error
+    assert waiter.error is error
+    # The next call is computed again
+    assert flights.do("key", lambda: "result") == ("result", False)
+
+
+def test_identical_calls_dont_share_the_result_of_an_aborted_call(tracked_flights):
+    flights = SingleFlight()
+    leader = BlockedCall(flights.do, "key", lambda: leader.block(Aborted()))
+    leader.start()
+    waiter = run_waiting_call(flights.do, "key", pytest.fail)
+
+    leader.release()
+    waiter.thread.join(TIMEOUT_S)
+
+    assert isinstance(leader.error, Aborted)
+    assert isinstance(waiter.error, RuntimeError)
+    assert isinstance(waiter.error.__cause__, Aborted)
+    assert flights.flights == {}
+
+
+def test_single_flight_calls_are_keyed_by_key_and_data_version(
+    tracked_flights, data_version
+):
+    calls = []
+
+    @single_flight(lambda name, ignored: name)
+    def compute(name, ignored):
+        calls.append(name)
+        if name == "blocked":
+            return leader.block(f"{name} result")
+        return f"{name} result"
+
+    leader = BlockedCall(compute, "blocked", 1)
+    leader.start()
+    # The arguments ignored by the key are coalesced
+    waiter = run_waiting_call(compute, "blocked", 2)
+    assert compute("other", 1) == "other result"
+
+    # Once the data is reloaded, the same key is computed again
+    data_version()
+    reloaded = BlockedCall(compute, "blocked", 1)
+    reloaded.thread.start()
+
+    leader.release()
+    waiter.thread.join(TIMEOUT_S)
+    reloaded.thread.join(TIMEOUT_S)
+
+    assert leader.result == waiter.result == reloaded.result == "blocked result"
+    assert calls == ["blocked", "other", "blocked"]
+
+
+def test_results_are_cached_until_the_data_is_reloaded(data_version):
+    calls = []
+
+    @cache_for_data_version
+    def compute(value):
+        calls.append(value)
+        return [value]
+
+    assert compute(1) == [1]
+    assert compute(1) is compute(1)
+    assert compute(2) == [2]
+    assert calls == [1, 2]
+
+    data_version()
+    assert compute(1) == [1]
+    assert calls == [1, 2, 1]
+    assert datasets.get_data_version_caches()[
+        f"{compute.__module__}.{compute.__qualname__}"
+    ] == {(1,): [1]}
+
+
+def test_results_computed_with_the_previous_data_are_not_cached(data_version):
+    calls = []
+
+    @cache_for_data_version
+    def compute(value):
+        calls.append(datasets.get_data_version())
+        if len(calls) == 1:
+            return leader.block("previous data result")
+        return "reloaded data result"
+
+    leader = BlockedCall(compute, 1)
+    leader.start()
+    previous_version = calls[0]
+    data_version()
+    assert compute(1) == "reloaded data result"
+
+    leader.release()
+    assert leader.result == "previous data result"
+    # The result of the previous data is not served for the reloaded data
+    assert compute(1) == "reloaded data result"
+    assert calls[1] != previous_version
+    assert len(calls) == 2
@@ -0,0 +1,66 @@
+"""Tests of the figures specs built by src/pages/figures_factory.py, from synthetic data."""
+import json
+from datetime import datetime, timedelta
+
+import plotly.graph_objects as go
+import plotly.io as pio
+import polars as pl
+import pytest
+
+from benchmarks.synthetic_data import get_figures_calls, get_naf_nomenclature
+from src.data import datasets
+from src.pages import figures_factory
+
+FIGURES_CALLS = get_figures_calls(companies_count=2_000)
+
+
+@pytest.fixture
+def naf_nomenclature(monkeypatch):
+    """The treemap labels are built from the NAF nomenclature dataset."""
+    monkeypatch.setattr(datasets, "NAF_NOMENCLATURE_DATA", get_naf_nomenclature())
+    monkeypatch.setattr(datasets, "DATA_UPDATE_DATE", datetime.now())
+
+
+def test_every_figures_factory_is_tested():
+    factories = {name for name in dir(figures_factory) if name.startswith("create_")}
+
+    assert {name for name, _, _ in FIGURES_CALLS} == factories
+
+
+@pytest.mark.parametrize(
+    "name, args, kwargs",
+    FIGURES_CALLS,
+    ids=[
+        name + ("_quantity" if kwargs.get("use_quantity") else "")
+        for name, _, kwargs in FIGURES_CALLS
+    ],
+)
+def test_figure_spec_is_accepted_unchanged_by_go_figure(
+    name: str, args: tuple, kwargs: dict, naf_nomenclature
+):
+    spec = getattr(figures_factory, name)(*args, **kwargs)
+
+    # Validates every property of the spec, raises if one is unknown or invalid
+    figure = go.Figure(spec)
+
+    assert json.loads(pio.to_json(figure)) == json.loads(pio.to_json(spec))
+    assert go.Figure(figure.to_dict()).to_plotly_json() == figure.to_plotly_json()
+
+
+def test_dates_are_sent_as_epoch_milliseconds_of_their_wall_time():
+    dates = pl.Series(
+        "at", [datetime(2023, 3, 20), datetime(2023, 3, 27)]
+    ).dt.replace_time_zone("Europe/Paris")
+
+    spec = figures_factory.build_figure(
+        [{"type": "scatter", "x": dates, "y": pl.Series([1, 2])}],
+        {"xaxis": {"title": {"text": "Semaine"}}},
+    )
+
+    assert spec["data"][0]["x"] == [
+        (date - datetime(1970, 1, 1)) // timedelta(milliseconds=1)
+        for date in [datetime(2023, 3, 20), datetime(2023, 3, 27)]
+    ]
+    assert spec["data"][0]["y"] == [1, 2]
+    assert spec["layout"]["xaxis"] == {"title": {"text": "Semaine"}, "type": "date"}
+    assert "yaxis" not in spec["layout"]
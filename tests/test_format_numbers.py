@@ -0,0 +1,102 @@
+"""Tests of the batch formatting of numbers, that must give the same strings as `format_number`.
+See src/pages/utils.py."""
+import math
+import random
+
+import polars as pl
+import pytest
+
+from src.pages.utils import (
+    FORMAT_NUMBERS_MAX_VECTORIZED_VALUE,
+    format_number,
+    format_numbers,
+)
+
+PRECISIONS = [0, 1, 2, 3]
+
+# Ties of each precision, on both sides of the exact value of their float
+TIES = [0.5, 1.5, 2.5, 3.5, -0.5, -1.5, -2.5, 0.25, 0.35, 2.675, 1.005, 0.0005, 0.125]
+# Negative numbers rounded to zero keep their sign
+NEGATIVES_ROUNDED_TO_ZERO = [-0.0, -0.4, -0.04, -0.0004, -0.00049]
+OTHER_NUMBERS = [0.0, 1.0, 999.5, 1_234_567.891, 999_999.9996, -12_345.6789, 1e14 + 0.5]
+
+
+def get_random_numbers(count: int = 2000) -> list[float]:
+    rng = random.Random(0)
+    numbers = [
+        rng.uniform(-1, 1) * 10 ** rng.randint(-4, 14) for _ in range(count // 2)
+    ]
+    # Numbers with few decimals, that are often ties
+    numbers += [
+        rng.randint(-(10**6), 10**6) / 10 ** rng.randint(1, 4)
+        for _ in range(count // 2)
+    ]
+    return numbers
+
+
+def format_each_number(values: list, precision: int) -> list[str | None]:
+    return [
+        None if value is None else format_number(value, precision) for value in values
+    ]
+
+
+@pytest.mark.parametrize("precision", PRECISIONS)
+@pytest.mark.parametrize(
+    "values",
+    [
+        TIES,
+        NEGATIVES_ROUNDED_TO_ZERO,
+        OTHER_NUMBERS,
+        get_random_numbers(),
+    ],
+    ids=["ties", "negatives_rounded_to_zero", "other_numbers", "random_numbers"],
+)
+def test_floats_are_formatted_like_format_number(values: list[float], precision: int):
+    assert format_numbers(values, precision).to_list() == format_each_number(
+        values, precision
+    )
+
+
+@pytest.mark.parametrize("precision", PRECISIONS)
+def test_integers_are_formatted_like_format_number(precision: int):
+    values = [0, 7, -7, 999, 1_000, -1_234_567, 10**14, -(10**15) + 1]
+
+    assert format_numbers(values, precision).to_list() == format_each_number(
+        values, precision
+    )
+
+
+@pytest.mark.parametrize("precision", PRECISIONS)
+def test_null_numbers_stay_null(precision: int):
+    values = [1.5, None, -0.25, None]
+
+    assert format_numbers(pl.Series(values), precision).to_list() == (
+        format_each_number(values, precision)
+    )
+
+
+@pytest.mark.parametrize("precision", PRECISIONS)
+@pytest.mark.parametrize(
+    "values",
+    [
+        [1.5, math.nan, 2.5],
+        [1.5, math.inf],
+        [1.5, FORMAT_NUMBERS_MAX_VECTORIZED_VALUE + 0.5],
+        [-float(FORMAT_NUMBERS_MAX_VECTORIZED_VALUE * 1000), 2.5],
+        [True, False],
+    ],
+    ids=["nan", "inf", "huge", "huge_negative", "booleans"],
+)
+def test_numbers_not_formatted_with_polars_are_formatted_like_format_number(
+    values: list, precision: int
+):
+    assert format_numbers(values, precision).to_list() == format_each_number(
+        values, precision
+    )
+
+
+def test_series_name_is_kept():
+    values = pl.Series("quantity", [1.5, 2.5])
+
+    assert format_numbers(values).name == "quantity"
+    assert values.name == "quantity"
@@ -0,0 +1,186 @@
+"""Tests of the loading of the data in the background, of the health endpoints and of the payload cache
+while the data is loading, see src/loading.py."""
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import pytest
+from dash import Dash, _pages, html
+
+from src import loading, serving
+from src.data import datasets
+from src.loading import (
+    DONE,
+    FAILED,
+    PENDING,
+    RUNNING,
+    LoadingState,
+    register_health_endpoints,
+    start_background_loading,
+)
+from src.serving import PayloadCache
+from tests.test_serving import CallbacksApp
+
+TIMEOUT_S = 5
+
+
+class StubbedLoader:
+    """Loading steps blocked until they are released, the data being loaded by the first one."""
+
+    def __init__(self, monkeypatch, fail_step: str | None = None):
+        self.monkeypatch = monkeypatch
+        self.fail_step = fail_step
+        self.started = {name: threading.Event() for name in ["datasets", "home"]}
+        self.released = {name: threading.Event() for name in ["datasets", "home"]}
+        self.calls = []
+        self.loading_state = LoadingState(
+            {
+                "datasets": ("Chargement des données", lambda: self.run("datasets")),
+                "home": ("Construction de la page d'accueil", lambda: self.run("home")),
+            }
+        )
+
+    def run(self, name: str):
+        self.calls.append(name)
+        self.started[name].set()
+        assert self.released[name].wait(TIMEOUT_S)
+        if name == self.fail_step:
+            raise ValueError(f"{name} failed")
+        if name == "datasets":
+            self.monkeypatch.setattr(datasets, "DATA_UPDATE_DATE", datetime.now())
+
+    def release(self, name: str):
+        self.released[name].set()
+
+    def wait_until_started(self, name: str):
+        assert self.started[name].wait(TIMEOUT_S)
+
+    def wait_until_done(self):
+        self.loading_state.thread.join(TIMEOUT_S)
+        assert not self.loading_state.thread.is_alive()
+
+
+class StubbedBootProfile:
+    """The boot of the tests process is not profiled."""
+
+    def set_ready_to_serve(self):
+        pass
+
+    def move_to_current_thread(self):
+        pass
+
+
+@pytest.fixture
+def stubbed_loading(monkeypatch):
+    """Loads the data in the background with stubbed steps, returns a function starting the loading."""
+    monkeypatch.setattr(loading, "boot_profile", StubbedBootProfile())
+    monkeypatch.setattr(loading, "report_boot_profile", lambda: None)
+    monkeypatch.setattr(loading, "log_memory_report", lambda: None)
+    monkeypatch.setattr(datasets, "DATA_UPDATE_DATE", None)
+
+    loaders = []
+
+    def start_loading(fail_step: str | None = None) -> StubbedLoader:
+        loader = StubbedLoader(monkeypatch, fail_step)
+        monkeypatch.setattr(loading, "loading_state", loader.loading_state)
+        loaders.append(loader)
+        return loader
+
+    yield start_loading
+
+    for loader in loaders:
+        for released in loader.released.values():
+            released.set()
+
+
+@pytest.fixture
+def health_client():
+    app = Dash(__name__)
+    app.layout = html.Div()
+    register_health_endpoints(app)
+    return app.server.test_client()
+
+
+def get_health(client, path: str) -> tuple[int, dict]:
+    response = client.get(path)
+    return response.status_code, response.get_json()
+
+
+def get_statuses(health: dict) -> list[str]:
+    return [step["status"] for step in health["steps"]]
+
+
+def test_steps_run_in_order_in_the_background(stubbed_loading, health_client):
+    loader = stubbed_loading()
+
+    start_background_loading()
+    loader.wait_until_started("datasets")
+
+    assert loader.loading_state.thread.name == "background-loading"
+    assert loader.loading_state.thread is not threading.current_thread()
+    status, health = get_health(health_client, "/_health/ready")
+    assert status == 503
+    assert health["ready"] is False
+    assert get_statuses(health) == [RUNNING, PENDING]
+    assert health["steps"][0]["label"] == "Chargement des données"
+    assert get_health(health_client, "/_health/live")[0] == 200
+
+    loader.release("datasets")
+    loader.wait_until_started("home")
+    assert loader.loading_state.is_ready(["datasets"])
+    assert not loader.loading_state.is_ready()
+    assert get_health(health_client, "/_health/ready")[0] == 503
+
+    loader.release("home")
+    loader.wait_until_done()
+
+    status, health = get_health(health_client, "/_health/ready")
+    assert status == 200
+    assert health["ready"] is True
+    assert get_statuses(health) == [DONE, DONE]
+    assert all(step["duration_s"] >= 0 for step in health["steps"])
+    assert loader.calls == ["datasets", "home"]
+    assert get_health(health_client, "/_health/live")[0] == 200
+
+
+def test_loading_stops_at_the_first_failed_step(stubbed_loading, health_client):
+    loader = stubbed_loading(fail_step="datasets")
+
+    start_background_loading()
+    loader.release("datasets")
+    loader.wait_until_done()
+
+    status, health = get_health(health_client, "/_health/live")
+    assert status == 503
+    assert get_statuses(health) == [FAILED, PENDING]
+    assert health["steps"][0]["error"] == "ValueError: datasets failed"
+    assert get_health(health_client, "/_health/ready")[0] == 503
+    assert loader.calls == ["datasets"]
+
+
+def test_payloads_are_not_cached_until_the_loading_is_done(
+    stubbed_loading, monkeypatch
+):
+    loader = stubbed_loading()
+    monkeypatch.setattr(_pages, "PAGE_REGISTRY", OrderedDict())
+    monkeypatch.setattr(serving, "payload_cache", PayloadCache())
+    callbacks_app = CallbacksApp()
+
+    start_background_loading()
+    loader.wait_until_started("datasets")
+    callbacks_app.update("cached.children", 3)
+    loader.release("datasets")
+    loader.wait_until_started("home")
+    # The data is loaded, but the pages are not built yet
+    response = callbacks_app.update("cached.children", 3)
+
+    assert "ETag" not in response.headers
+    assert len(serving.payload_cache.payloads) == 0
+
+    loader.release("home")
+    loader.wait_until_done()
+    callbacks_app.update("cached.children", 3)
+    cached_response = callbacks_app.update("cached.children", 3)
+
+    assert "ETag" in cached_response.headers
+    assert callbacks_app.calls == [("cached", 3)] * 3
@@ -0,0 +1,157 @@
+"""Tests of the aggregation of the metrics of the workers, see src/monitoring/metrics.py."""
+import json
+
+import pytest
+
+from src.monitoring import metrics
+from src.monitoring.metrics import (
+    DURATION_BUCKETS,
+    METRICS,
+    MetricsRegistry,
+    render_metrics,
+)
+
+NOW = 1_700_000_000.0
+CALLBACK = "home.update_figures"
+
+
+def get_worker_snapshot(
+    pid: int, durations: list[float], statuses: list[str], loaded_at: float
+) -> dict:
+    registry = MetricsRegistry()
+    for status in statuses:
+        registry.inc(
+            "trackdechets_requests_total", {"callback": CALLBACK, "status": status}
+        )
+    for duration in durations:
+        registry.observe(
+            "trackdechets_request_duration_seconds", {"callback": CALLBACK}, duration
+        )
+    registry.add_gauges_collector(
+        lambda: [
+            ("trackdechets_data_loaded_timestamp_seconds", {}, loaded_at),
+            ("trackdechets_dataset_memory_bytes", {"dataset": "bsdd"}, 1024),
+        ]
+    )
+    # The snapshots are read from the JSON files written by the workers
+    return json.loads(json.dumps({**registry.get_snapshot(), "pid": pid}))
+
+
+@pytest.fixture
+def exposition(monkeypatch) -> str:
+    monkeypatch.setattr(metrics.time, "time", lambda: NOW)
+    running_worker = get_worker_snapshot(
+        101, durations=[0.004, 0.2, 3], statuses=["200", "200"], loaded_at=NOW - 60
+    )
+    stopped_worker = get_worker_snapshot(
+        102, durations=[0.004, 0.03, 60], statuses=["200", "500"], loaded_at=NOW - 600
+    )
+    return render_metrics([(running_worker, True), (stopped_worker, False)])
+
+
+def get_samples(exposition: str) -> dict[str, str]:
+    samples = {}
+    for line in exposition.splitlines():
+        if not line.startswith("#"):
+            sample, value = line.rsplit(" ", 1)
+            samples[sample] = value
+    return samples
+
+
+def test_counters_are_summed_over_all_the_workers(exposition: str):
+    samples = get_samples(exposition)
+
+    assert (
+        samples[f'trackdechets_requests_total{{callback="{CALLBACK}",status="200"}}']
+        == "3"
+    )
+    # The requests of the stopped workers are still counted
+    assert (
+        samples[f'trackdechets_requests_total{{callback="{CALLBACK}",status="500"}}']
+        == "1"
+    )
+
+
+def test_histograms_are_summed_and_their_buckets_cumulated(exposition: str):
+    samples = get_samples(exposition)
+    name = "trackdechets_request_duration_seconds"
+
+    buckets = {
+        le: int(samples[f'{name}_bucket{{callback="{CALLBACK}",le="{le}"}}'])
+        for le in DURATION_BUCKETS + ["+Inf"]
+    }
+    assert buckets == {
+        0.005: 2,
+        0.01: 2,
+        0.025: 2,
+        0.05: 3,
+        0.1: 3,
+        0.25: 4,
+        0.5: 4,
+        1: 4,
+        2.5: 4,
+        5: 5,
+        10: 5,
+        "+Inf": 6,
+    }
+    assert samples[f'{name}_count{{callback="{CALLBACK}"}}'] == "6"
+    assert float(samples[f'{name}_sum{{callback="{CALLBACK}"}}']) == pytest.approx(
+        63.238
+    )
+
+
+def test_gauges_are_only_reported_for_the_running_workers(exposition: str):
+    samples = get_samples(exposition)
+
+    gauges = {
+        sample: value
+        for sample, value in samples.items()
+        if sample.startswith(
+            (
+                "trackdechets_data_loaded_timestamp_seconds",
+                "trackdechets_data_age_seconds",
+                "trackdechets_dataset_memory_bytes",
+            )
+        )
+    }
+    assert gauges == {
+        'trackdechets_dataset_memory_bytes{dataset="bsdd",worker="101"}': "1024",
+        'trackdechets_data_loaded_timestamp_seconds{worker="101"}': repr(NOW - 60),
+        # The age of the data is computed when the metrics are rendered
+        'trackdechets_data_age_seconds{worker="101"}': "60.0",
+    }
+
+
+def test_metrics_are_in_the_prometheus_text_format(exposition: str):
+    lines = exposition.splitlines()
+
+    assert exposition.endswith("\n")
+    for name, (metric_type, help_text, _) in METRICS.items():
+        help_index = lines.index(f"# HELP {name} {help_text}")
+        assert lines[help_index + 1] == f"# TYPE {name} {metric_type}"
+    # The buckets of a histogram are followed by its sum and its count
+    name = "trackdechets_request_duration_seconds"
+    histogram_lines = [line for line in lines if line.startswith(name)]
+    assert histogram_lines[-3] == f'{name}_bucket{{callback="{CALLBACK}",le="+Inf"}} 6'
+    assert histogram_lines[-2].startswith(f'{name}_sum{{callback="{CALLBACK}"}} ')
+    assert histogram_lines[-1] == f'{name}_count{{callback="{CALLBACK}"}} 6'
+
+
+def test_labels_values_are_escaped():
+    snapshot = {
+        "pid": 101,
+        "counters": [
+            [
+                "trackdechets_requests_total",
+                {"callback": 'a"b\\c\nd', "status": "200"},
+                1,
+            ]
+        ],
+        "histograms": [],
+        "gauges": [],
+    }
+
+    assert (
+        'trackdechets_requests_total{callback="a\\"b\\\\c\\nd",status="200"} 1'
+        in render_metrics([(snapshot, True)]).splitlines()
+    )
@@ -0,0 +1,136 @@
+"""Tests of the aggregation of data by the levels of the NAF nomenclature, see src/data/data_processing.py.
+The levels regrouped from the single aggregation by sous-classe must have the totals of the previous
+aggregations of the data by each level."""
+import random
+
+import polars as pl
+import pytest
+
+from benchmarks.synthetic_data import get_companies_with_naf, get_naf_nomenclature
+from src.data.data_processing import (
+    NAF_CATEGORIES,
+    get_company_counts_by_naf_dfs,
+    get_naf_hierarchy_aggregates,
+)
+
+ROOT_ID = "Tous les établissements"
+
+
+@pytest.fixture(scope="module")
+def companies() -> pl.DataFrame:
+    # A tenth of the companies have no NAF
+    return get_companies_with_naf(random.Random(0), get_naf_nomenclature(), 500)
+
+
+def aggregate_by_each_level(data_with_naf: pl.DataFrame, value_expr: pl.Expr) -> dict:
+    """The aggregation by each level of the data, as it was done before the aggregation by sous-classe."""
+    data_with_naf = data_with_naf.with_columns(
+        [
+            pl.col("code_section").fill_null("NAF inconnu"),
+            pl.col("libelle_section").fill_null("NAF inconnu"),
+        ]
+    )
+
+    aggregates = {}
+    for i, cat in enumerate(NAF_CATEGORIES):
+        coarser_cats = list(reversed(NAF_CATEGORIES[i + 1 :]))
+        level_df = (
+            data_with_naf.drop_nulls(f"libelle_{cat}")
+            .groupby(f"code_{cat}", maintain_order=True)
+            .agg(
+                [value_expr.alias("value")]
+                + [pl.col(f"libelle_{c}").max() for c in [cat] + coarser_cats]
+            )
+        )
+        for row in level_df.to_dicts():
+            parents = "#".join([ROOT_ID] + [row[f"libelle_{c}"] for c in coarser_cats])
+            aggregates[(cat, row[f"code_{cat}"])] = {
+                "libelle": row[f"libelle_{cat}"],
+                "value": row["value"],
+                "ids": f"{parents}#{row[f'libelle_{cat}']}",
+                "parents": parents,
+            }
+    return aggregates
+
+
+def get_hierarchy_aggregates(data_with_naf: pl.DataFrame, value_expr: pl.Expr) -> dict:
+    df = get_naf_hierarchy_aggregates(data_with_naf, value_expr, ROOT_ID)
+    return {
+        (row["level"], row["code"]): {
+            key: row[key] for key in ["libelle", "value", "ids", "parents"]
+        }
+        for row in df.to_dicts()
+    }
+
+
+def test_counts_by_level_are_the_counts_of_each_level(companies: pl.DataFrame):
+    value_expr = pl.col("id").count()
+
+    aggregates = get_hierarchy_aggregates(companies, value_expr)
+
+    assert aggregates == aggregate_by_each_level(companies, value_expr)
+    assert aggregates[("section", "NAF inconnu")]["value"] == (
+        companies["code_section"].null_count()
+    )
+
+
+def test_quantities_by_level_are_the_quantities_of_each_level(
+    companies: pl.DataFrame,
+):
+    value_expr = pl.col("quantity").sum()
+
+    aggregates = get_hierarchy_aggregates(companies, value_expr)
+    expected = aggregate_by_each_level(companies, value_expr)
+
+    assert aggregates.keys() == expected.keys()
+    for key, aggregate in aggregates.items():
+        # The sums only differ by the order of the summation
+        assert aggregate == {
+            **expected[key],
+            "value": pytest.approx(expected[key]["value"], rel=1e-12),
+        }
+
+
+def test_levels_are_sorted_from_the_coarsest(companies: pl.DataFrame):
+    df = get_naf_hierarchy_aggregates(companies, pl.col("id").count(), ROOT_ID)
+
+    levels = df["level"].to_list()
+    assert sorted(set(levels), key=levels.index) == list(reversed(NAF_CATEGORIES))
+    # Each level sums to the total of the data with this level
+    for cat in NAF_CATEGORIES:
+        level_total = df.filter(pl.col("level") == cat)["value"].sum()
+        if cat == "section":
+            assert level_total == len(companies)
+        else:
+            assert level_total == companies[f"code_{cat}"].drop_nulls().len()
+
+
+def test_company_counts_by_section_and_division(companies: pl.DataFrame):
+    by_section, by_division = get_company_counts_by_naf_dfs(companies)
+
+    filled = companies.with_columns(
+        [
+            pl.col("libelle_section").fill_null("Section NAF non renseignée."),
+            pl.col("libelle_division").fill_null("Division NAF non renseignée."),
+            pl.col("code_section").fill_null(""),
+            pl.col("code_division").fill_null(""),
+        ]
+    )
+    expected_by_section = filled.groupby("libelle_section").agg(
+        [pl.col("code_section").max(), pl.col("id").count().alias("num_entreprises")]
+    )
+    expected_by_division = filled.groupby("libelle_division").agg(
+        [
+            pl.col("code_division").max(),
+            pl.col("libelle_section").max(),
+            pl.col("code_section").max(),
+            pl.col("id").count().alias("num_entreprises"),
+        ]
+    )
+
+    assert by_section.sort("libelle_section").to_dicts() == (
+        expected_by_section.sort("libelle_section").to_dicts()
+    )
+    assert by_division.sort("libelle_division").to_dicts() == (
+        expected_by_division.sort("libelle_division").to_dicts()
+    )
@@ -0,0 +1,121 @@
+"""Tests of the opt-in profiling of the callbacks requests, see src/monitoring/profiling.py."""
+import json
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from dash import Dash, Input, Output, html
+
+from src.monitoring import profiling
+from src.monitoring.profiling import (
+    PROFILE_HEADER,
+    SAMPLING_INTERVAL_S,
+    StackSampler,
+    register_request_profiler,
+)
+
+SECRET = "monitoring-secret"
+
+
+def get_callbacks_app() -> Dash:
+    app = Dash(__name__)
+    app.layout = html.Div()
+
+    @app.callback(Output("total", "children"), Input("year", "value"))
+    def update_total(year):
+        # Long enough to be sampled
+        started_at = time.perf_counter()
+        while time.perf_counter() - started_at < 0.05:
+            sum(range(1000))
+        return year
+
+    return app
+
+
+def update_total(app: Dash, year: int, **headers):
+    body = {
+        "output": "total.children",
+        "outputs": {"id": "total", "property": "children"},
+        "inputs": [{"id": "year", "property": "value", "value": year}],
+        "changedPropIds": ["year.value"],
+    }
+    return app.server.test_client().post(
+        "/_dash-update-component", json=body, headers=headers
+    )
+
+
+def get_hooks_count(app: Dash) -> int:
+    return len(app.server.before_request_funcs.get(None, [])) + len(
+        app.server.teardown_request_funcs.get(None, [])
+    )
+
+
+@pytest.fixture
+def profiles_dir(tmp_path: Path, monkeypatch) -> Path:
+    monkeypatch.setattr(profiling, "PROFILES_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "MONITORING_SECRET", SECRET)
+    return tmp_path
+
+
+def test_no_hooks_are_registered_without_profiles_dir(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILES_DIR", None)
+    app = get_callbacks_app()
+    hooks_count = get_hooks_count(app)
+
+    register_request_profiler(app)
+
+    assert get_hooks_count(app) == hooks_count
+
+
+def test_requests_with_the_header_are_profiled(profiles_dir: Path):
+    app = get_callbacks_app()
+    register_request_profiler(app)
+
+    response = update_total(app, 2022, **{PROFILE_HEADER: SECRET})
+
+    assert response.status_code == 200
+    (path,) = profiles_dir.iterdir()
+    assert path.name.endswith(".speedscope.json")
+    assert "-update_total-year.value=2022-" in path.name
+    profile = json.loads(path.read_text())
+    assert profile["$schema"] == "https://www.speedscope.app/file-format-schema.json"
+    frames = profile["shared"]["frames"]
+    (sampled,) = profile["profiles"]
+    assert sampled["type"] == "sampled"
+    assert sampled["name"] == "update_total"
+    assert len(sampled["samples"]) == len(sampled["weights"]) > 0
+    assert 0 < sum(sampled["weights"]) <= sampled["endValue"]
+    assert all(0 <= i < len(frames) for stack in sampled["samples"] for i in stack)
+    # The samples go from the root of the stack to the callback
+    assert any(
+        frames[stack[-1]]["name"] == "update_total" for stack in sampled["samples"]
+    )
+
+
+@pytest.mark.parametrize("header", [None, "wrong-secret"])
+def test_requests_without_the_header_are_not_profiled(profiles_dir: Path, header):
+    app = get_callbacks_app()
+    register_request_profiler(app)
+
+    headers = {} if header is None else {PROFILE_HEADER: header}
+    response = update_total(app, 2022, **headers)
+
+    assert response.status_code == 200
+    assert list(profiles_dir.iterdir()) == []
+
+
+def test_switch_interval_is_restored_after_overlapping_profiles():
+    switch_interval = sys.getswitchinterval()
+    first_sampler = StackSampler(0)
+    second_sampler = StackSampler(0)
+
+    first_sampler.start()
+    second_sampler.start()
+    assert sys.getswitchinterval() == pytest.approx(SAMPLING_INTERVAL_S / 2)
+    # The second request is still profiled
+    first_sampler.stop()
+    assert sys.getswitchinterval() == pytest.approx(SAMPLING_INTERVAL_S / 2)
+    second_sampler.stop()
+
+    assert sys.getswitchinterval() == switch_interval
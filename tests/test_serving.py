@@ -0,0 +1,283 @@
+"""Tests of the payload cache of the serving layer, see src/serving.py."""
+import gzip
+import json
+from collections import OrderedDict
+from datetime import datetime
+
+import flask
+import pytest
+from dash import Dash, Input, Output, State, _pages, html, register_page
+
+from src import serving
+from src.data import datasets
+from src.loading import loading_state
+from src.serving import (
+    MIN_COMPRESSED_SIZE,
+    PAGES_ROUTER_OUTPUT,
+    Payload,
+    PayloadCache,
+    cache_response,
+    get_accepted_encodings,
+    get_request_key,
+    register_payload_cache,
+)
+
+BODY = json.dumps({"values": list(range(1000))}).encode()
+
+
+class CallbacksApp:
+    """Dash app with pages, a cached callback and a callback that is not cached."""
+
+    def __init__(self):
+        self.app = Dash(__name__, use_pages=True, pages_folder="")
+        register_page("home", path="/", layout=html.Div())
+        register_page("stats", path="/stats", layout=html.Div())
+        register_page("company", path_template="/company/<siret>", layout=html.Div())
+        self.calls = []
+
+        @self.app.callback(
+            Output("cached", "children"),
+            Input("year", "value"),
+            State("filter", "value"),
+        )
+        @cache_response
+        def update_cached(year, filter_value):
+            self.calls.append(("cached", year))
+            return list(range(year))
+
+        @self.app.callback(Output("not-cached", "children"), Input("year", "value"))
+        def update_not_cached(year):
+            self.calls.append(("not-cached", year))
+            return list(range(year))
+
+        register_payload_cache(self.app)
+        self.client = self.app.server.test_client()
+
+    def update(self, output: str, year: int, filter_value: str = "", **headers):
+        body = get_callback_body(output, year, filter_value)
+        return self.client.post("/_dash-update-component", json=body, headers=headers)
+
+
+def get_callback_body(output: str, year: int, filter_value: str = "") -> dict:
+    component_id, prop = output.split(".")
+    return {
+        "output": output,
+        "outputs": {"id": component_id, "property": prop},
+        "inputs": [{"id": "year", "property": "value", "value": year}],
+        "changedPropIds": ["year.value"],
+        "state": (
+            [{"id": "filter", "property": "value", "value": filter_value}]
+            if output == "cached.children"
+            else []
+        ),
+    }
+
+
+def get_router_body(pathname: str) -> dict:
+    return {
+        "output": PAGES_ROUTER_OUTPUT,
+        "inputs": [
+            {"id": "_pages_location", "property": "pathname", "value": pathname},
+            {"id": "_pages_location", "property": "search", "value": "?a=1"},
+        ],
+    }
+
+
+@pytest.fixture
+def data_version(monkeypatch):
+    monkeypatch.setattr(datasets, "DATA_UPDATE_DATE", datetime(2023, 1, 1))
+
+
+@pytest.fixture
+def callbacks_app(monkeypatch, data_version):
+    monkeypatch.setattr(_pages, "PAGE_REGISTRY", OrderedDict())
+    monkeypatch.setattr(serving, "payload_cache", PayloadCache())
+    monkeypatch.setattr(loading_state, "is_ready", lambda names=None: True)
+    return CallbacksApp()
+
+
+def test_small_payloads_are_not_compressed():
+    payload = Payload(b"{}", "application/json")
+
+    assert payload.variants == {"identity": b"{}"}
+    assert payload.size == 2
+
+
+def test_compressed_variants_decompress_to_the_body():
+    payload = Payload(BODY, "application/json")
+
+    assert len(BODY) >= MIN_COMPRESSED_SIZE
+    assert gzip.decompress(payload.variants["gzip"]) == BODY
+    if serving.brotli is not None:
+        assert serving.brotli.decompress(payload.variants["br"]) == BODY
+    assert payload.size == sum(len(v) for v in payload.variants.values())
+
+
+@pytest.mark.parametrize(
+    "header, accepted",
+    [
+        ("", set()),
+        ("gzip, deflate, br", {"gzip", "deflate", "br"}),
+        ("GZIP;q=0.5, br;q=0", {"gzip"}),
+        ("br; q=0.0, gzip;q=0.00, identity", {"identity"}),
+    ],
+)
+def test_accepted_encodings(header: str, accepted: set[str]):
+    with flask.Flask(__name__).test_request_context(
+        headers={"Accept-Encoding": header}
+    ):
+        assert get_accepted_encodings() == accepted
+
+
+@pytest.mark.parametrize(
+    "accepted, encoding",
+    [
+        (set(), "identity"),
+        ({"gzip"}, "gzip"),
+        ({"gzip", "br"}, "br" if serving.brotli is not None else "gzip"),
+    ],
+)
+def test_the_smallest_accepted_variant_is_sent(accepted: set[str], encoding: str):
+    payload = Payload(BODY, "application/json")
+
+    with flask.Flask(__name__).test_request_context():
+        response = payload.get_response(accepted)
+
+    assert response.status_code == 200
+    assert response.get_data() == payload.variants[encoding]
+    assert response.headers.get("Content-Encoding") == (
+        None if encoding == "identity" else encoding
+    )
+    assert response.get_etag() == (payload.etag, False)
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert "Accept-Encoding" in response.vary
+
+
+def test_payload_already_sent_is_not_modified():
+    payload = Payload(BODY, "application/json")
+
+    with flask.Flask(__name__).test_request_context(
+        headers={"If-None-Match": f'"other", "{payload.etag}"'}
+    ):
+        response = payload.get_response({"gzip"})
+
+    assert response.status_code == 304
+    assert response.get_data() == b""
+    assert response.get_etag() == (payload.etag, False)
+
+
+def test_least_recently_used_payloads_are_evicted_beyond_max_payloads(data_version):
+    cache = PayloadCache(max_payloads=2)
+    version = datasets.get_data_version()
+    cache.check_data_version()
+    payloads = {key: Payload(key.encode(), "application/json") for key in "abc"}
+
+    cache.set("a", payloads["a"], version)
+    cache.set("b", payloads["b"], version)
+    assert cache.get("a") is payloads["a"]
+    cache.set("c", payloads["c"], version)
+
+    assert list(cache.payloads) == ["a", "c"]
+    assert cache.get("b") is None
+    assert cache.size == 2
+
+
+def test_least_recently_used_payloads_are_evicted_beyond_max_bytes(data_version):
+    cache = PayloadCache(max_bytes=25)
+    version = datasets.get_data_version()
+    cache.check_data_version()
+
+    for key in "abc":
+        cache.set(key, Payload(key.encode() * 10, "application/json"), version)
+    # Too large to be cached at all
+    cache.set("d", Payload(b"d" * 26, "application/json"), version)
+
+    assert list(cache.payloads) == ["b", "c"]
+    assert cache.size == 20
+
+
+def test_payloads_are_cached_for_their_data_version(monkeypatch, data_version):
+    cache = PayloadCache()
+    previous_version = datasets.get_data_version()
+    cache.check_data_version()
+    cache.set("a", Payload(b"a", "application/json"), previous_version)
+
+    monkeypatch.setattr(datasets, "DATA_UPDATE_DATE", datetime(2023, 1, 2))
+    assert cache.get("a") is None
+    # Computed from the previous data while it was reloaded
+    cache.set("a", Payload(b"a", "application/json"), previous_version)
+
+    assert cache.get("a") is None
+    assert cache.size == 0
+
+
+def test_request_keys(callbacks_app):
+    app = callbacks_app.app
+
+    def get_key(method: str, path: str, body: dict | None = None) -> str | None:
+        with app.server.test_request_context(path, method=method, json=body):
+            return get_request_key(app)
+
+    assert get_key("GET", "/_dash-layout") == "_dash-layout"
+    assert get_key("GET", "/_dash-dependencies") == "_dash-dependencies"
+    assert get_key("GET", "/_favicon.ico") is None
+    assert (
+        get_key(
+            "POST",
+            "/_dash-update-component",
+            get_callback_body("not-cached.children", 3),
+        )
+        is None
+    )
+
+    cached_key = get_key(
+        "POST", "/_dash-update-component", get_callback_body("cached.children", 3)
+    )
+    assert cached_key is not None
+    # The states are part of the key
+    assert cached_key != get_key(
+        "POST",
+        "/_dash-update-component",
+        get_callback_body("cached.children", 3, "filtered"),
+    )
+
+    # The URLs of a page share one key, whatever their query string or trailing slash
+    stats_key = get_key("POST", "/_dash-update-component", get_router_body("/stats"))
+    assert stats_key == get_key(
+        "POST", "/_dash-update-component", get_router_body("/stats/")
+    )
+    assert stats_key != get_key("POST", "/_dash-update-component", get_router_body("/"))
+    # The pages with path variables are not cached
+    assert (
+        get_key("POST", "/_dash-update-component", get_router_body("/company/123"))
+        is None
+    )
+
+
+def test_identical_requests_are_served_from_the_cache(callbacks_app):
+    # Large enough to be compressed
+    response = callbacks_app.update(
+        "cached.children", 300, **{"Accept-Encoding": "gzip"}
+    )
+    cached_response = callbacks_app.update(
+        "cached.children", 300, **{"Accept-Encoding": "gzip"}
+    )
+
+    assert callbacks_app.calls == [("cached", 300)]
+    assert response.get_data() == cached_response.get_data()
+    assert cached_response.headers["Content-Encoding"] == "gzip"
+    assert cached_response.headers["ETag"] == response.headers["ETag"]
+
+    not_modified = callbacks_app.update(
+        "cached.children", 300, **{"If-None-Match": response.headers["ETag"]}
+    )
+    assert not_modified.status_code == 304
+    assert callbacks_app.calls == [("cached", 300)]
+
+
+def test_callbacks_not_marked_are_always_computed(callbacks_app):
+    callbacks_app.update("not-cached.children", 3)
+    response = callbacks_app.update("not-cached.children", 3)
+
+    assert callbacks_app.calls == [("not-cached", 3), ("not-cached", 3)]
+    assert "ETag" not in response.headers
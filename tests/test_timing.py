@@ -0,0 +1,79 @@
+"""Tests of the timing records, see src/monitoring/timing.py."""
+import json
+import logging
+
+import flask
+import polars as pl
+import pytest
+
+from src.monitoring import timing
+from src.monitoring.timing import TimingsRegistry, timed
+
+
+@pytest.fixture
+def registry(monkeypatch) -> TimingsRegistry:
+    registry = TimingsRegistry()
+    monkeypatch.setattr(timing, "timings_registry", registry)
+    return registry
+
+
+@pytest.fixture
+def timings_logs(caplog) -> pytest.LogCaptureFixture:
+    """The timings logger doesn't propagate its records, they are captured by its own handler."""
+    timing.logger.addHandler(caplog.handler)
+    caplog.set_level(logging.DEBUG, logger=timing.logger.name)
+    yield caplog
+    timing.logger.removeHandler(caplog.handler)
+
+
+@timed("process", label_arg="bs_type")
+def filter_bs_data(data: pl.DataFrame, bs_type: str = "BSDD") -> pl.DataFrame:
+    if bs_type not in data["bs_type"]:
+        raise ValueError(f"Unknown type {bs_type}")
+    return data.filter(pl.col("bs_type") == bs_type)
+
+
+DATA = pl.DataFrame({"bs_type": ["BSDD", "BSDA", "BSDD"]})
+
+
+def test_calls_are_recorded(registry: TimingsRegistry):
+    filter_bs_data(DATA)
+
+    (record,) = registry.get_records()
+    assert record["name"] == f"{__name__}.filter_bs_data"
+    assert record["stage"] == "process"
+    assert record["label"] == "BSDD"
+    assert record["input_rows"] == 3
+    assert record["output_rows"] == 2
+    assert record["output_size"] > 0
+    assert record["error"] is None
+    assert registry.get_summary()[record["name"]]["errors"] == 0
+
+
+def test_failed_calls_are_recorded(registry: TimingsRegistry):
+    with pytest.raises(ValueError):
+        filter_bs_data(DATA, bs_type="BSFF")
+
+    (record,) = registry.get_records()
+    assert record["label"] == "BSFF"
+    assert record["error"] == "ValueError: Unknown type BSFF"
+    assert record["output_rows"] is None
+    assert record["duration_ms"] >= 0
+    summary = registry.get_summary()[record["name"]]
+    assert (summary["calls"], summary["errors"]) == (1, 1)
+
+
+def test_calls_outside_requests_are_logged(registry, timings_logs):
+    filter_bs_data(DATA)
+
+    (log,) = timings_logs.records
+    assert log.levelno == logging.INFO
+    assert json.loads(log.getMessage()) == registry.get_records()[0]
+
+
+def test_calls_of_requests_are_only_logged_at_debug_level(registry, timings_logs):
+    with flask.Flask(__name__).test_request_context():
+        filter_bs_data(DATA)
+
+    assert [log.levelno for log in timings_logs.records] == [logging.DEBUG]
+    assert len(registry.get_records()) == 1
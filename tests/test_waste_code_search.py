@@ -0,0 +1,291 @@
+"""Tests of the search over the waste code nomenclature and of the waste codes filter kept over the whole
+nomenclature while the tree shows a search, see src/data/waste_code_search.py."""
+from datetime import datetime
+
+import pytest
+
+from src.data import datasets
+from src.data.waste_code_search import (
+    WasteCodeIndex,
+    get_tree_frontier,
+    get_waste_code_search_tree,
+)
+from src.pages.advanced_statistics.advanced_statistics_layout_factory import (
+    MAX_WASTE_CODE_SEARCH_MATCHES,
+    get_waste_code_search_message,
+    get_waste_code_tree,
+    get_waste_code_tree_for_search,
+)
+
+MUNICIPAL_WASTE_CODES_COUNT = 150
+
+
+def waste_code(code: str, description: str, children: list[dict] = ()) -> dict:
+    return {"code": code, "description": description, "children": list(children)}
+
+
+NOMENCLATURE = [
+    waste_code(
+        "15",
+        "Emballages et déchets d'emballages, absorbants, chiffons d'essuyage",
+        [
+            waste_code(
+                "15 01",
+                "Emballages et déchets d'emballages",
+                [
+                    waste_code("15 01 01", "Emballages en papier/carton"),
+                    waste_code("15 01 02", "Emballages en matières plastiques"),
+                ],
+            ),
+            waste_code(
+                "15 02",
+                "Absorbants, matériaux filtrants, chiffons d'essuyage",
+                [waste_code("15 02 02*", "Absorbants contaminés par des substances")],
+            ),
+        ],
+    ),
+    waste_code(
+        "16",
+        "Déchets non décrits ailleurs sur la liste",
+        [
+            waste_code(
+                "16 01",
+                "Véhicules hors d'usage de différents moyens de transport",
+                [
+                    waste_code("16 01 03", "Pneus hors d'usage"),
+                    waste_code("16 01 04*", "Véhicules hors d'usage"),
+                ],
+            ),
+            waste_code(
+                "16 02",
+                "Déchets provenant d'équipements électriques ou électroniques",
+                [waste_code("16 02 13*", "Équipements mis au rebut dangereux")],
+            ),
+        ],
+    ),
+    waste_code(
+        "20",
+        "Déchets municipaux",
+        [
+            waste_code(
+                f"20 0{sub_chapter}",
+                f"Fraction {sub_chapter} des déchets municipaux",
+                [
+                    waste_code(
+                        f"20 0{sub_chapter} {i:02d}", f"Déchet municipal numéro {i}"
+                    )
+                    for i in range(1, MUNICIPAL_WASTE_CODES_COUNT // 3 + 1)
+                ],
+            )
+            for sub_chapter in range(1, 4)
+        ],
+    ),
+]
+NOTHING_SELECTED = {"checked": [], "half_checked": []}
+EVERYTHING_SELECTED = {"checked": ["all"], "half_checked": []}
+
+
+@pytest.fixture
+def nomenclature(monkeypatch):
+    monkeypatch.setattr(datasets, "WASTE_CODE_NOMENCLATURE", NOMENCLATURE)
+    monkeypatch.setattr(datasets, "DATA_UPDATE_DATE", datetime(2000, 1, 1))
+
+
+@pytest.fixture
+def index(nomenclature) -> WasteCodeIndex:
+    return WasteCodeIndex(NOMENCLATURE)
+
+
+def search_codes(index: WasteCodeIndex, query: str) -> list[str]:
+    return [match["code"] for match in index.search(query)]
+
+
+def get_search_tree(index: WasteCodeIndex, query: str) -> list[dict]:
+    return get_waste_code_search_tree(index.search(query))
+
+
+def get_tree_codes(tree: list[dict]) -> list[str]:
+    return [
+        code
+        for node in tree
+        for code in [node["key"]] + get_tree_codes(node["children"])
+    ]
+
+
+@pytest.mark.parametrize(
+    "query, codes",
+    [
+        ("16 01", ["16 01", "16 01 03", "16 01 04*"]),
+        ("1601", ["16 01", "16 01 03", "16 01 04*"]),
+        ("160104", ["16 01 04*"]),
+        ("16 01 04*", ["16 01 04*"]),
+        (" 16 01 04 ", ["16 01 04*"]),
+        ("17", []),
+    ],
+)
+def test_codes_are_searched_by_prefix(index: WasteCodeIndex, query: str, codes: list):
+    assert search_codes(index, query) == codes
+
+
+def test_matches_have_their_ancestors(index: WasteCodeIndex):
+    (match,) = index.search("160104")
+
+    assert match == {
+        "code": "16 01 04*",
+        "description": "Véhicules hors d'usage",
+        "ancestors": ["16", "16 01"],
+    }
+
+
+@pytest.mark.parametrize(
+    "query, codes",
+    [
+        # Words are searched as prefixes, accents and case ignored
+        ("vehicules", ["16 01", "16 01 04*"]),
+        ("VÉHIC", ["16 01", "16 01 04*"]),
+        # Every word must match
+        ("hors usage pneu", ["16 01 03"]),
+        ("emballages plastiques", ["15 01 02"]),
+        ("absorbants", ["15", "15 02", "15 02 02*"]),
+        ("emballages pneus", []),
+        ("' - ", []),
+    ],
+)
+def test_descriptions_are_searched_by_words(
+    index: WasteCodeIndex, query: str, codes: list
+):
+    assert search_codes(index, query) == codes
+
+
+def test_search_tree_has_the_matches_and_their_ancestors(index: WasteCodeIndex):
+    tree = get_search_tree(index, "pneus")
+
+    assert get_tree_codes(tree) == ["all", "16", "16 01", "16 01 03"]
+
+
+def test_search_tree_renders_the_matches_with_their_children(index: WasteCodeIndex):
+    tree = get_search_tree(index, "16 01")
+
+    assert get_tree_codes(tree) == ["all", "16", "16 01", "16 01 03", "16 01 04*"]
+    # The ancestor of the matches is not checked through its other children
+    assert get_tree_frontier(tree, {"16"}) == [
+        ("16 01 03", True),
+        ("16 01 04*", True),
+    ]
+
+
+def test_search_matches_are_truncated(nomenclature):
+    tree, rendered_matches, matches_count = get_waste_code_tree_for_search(
+        "municip", set()
+    )
+
+    # The chapter, its sub-chapters and all their codes
+    assert matches_count == MUNICIPAL_WASTE_CODES_COUNT + 4
+    assert len(rendered_matches) == MAX_WASTE_CODE_SEARCH_MATCHES
+    assert rendered_matches[0]["code"] == "20"
+    message = get_waste_code_search_message(matches_count)
+    assert message.children == (
+        f"Seuls les {MAX_WASTE_CODE_SEARCH_MATCHES} premiers des {matches_count} codes déchets "
+        "correspondant à la recherche sont affichés, précisez la recherche pour voir les autres."
+    )
+
+
+def test_search_message(nomenclature):
+    assert get_waste_code_search_message(None) is None
+    assert get_waste_code_search_message(MAX_WASTE_CODE_SEARCH_MATCHES) is None
+    assert (
+        get_waste_code_search_message(0).children
+        == "Aucun code déchet ne correspond à la recherche."
+    )
+    tree, rendered_matches, matches_count = get_waste_code_tree_for_search("  ", set())
+    assert (rendered_matches, matches_count) == ([], None)
+    assert get_tree_codes(tree) == ["all", "15", "16", "20"]
+
+
+def test_codes_checked_in_searches_are_kept_over_the_whole_nomenclature(
+    index: WasteCodeIndex,
+):
+    waste_codes_filter = NOTHING_SELECTED
+
+    tree = get_search_tree(index, "16 01")
+    assert index.get_checked_keys(waste_codes_filter, tree) == []
+    waste_codes_filter = index.update_waste_codes_filter(
+        waste_codes_filter, tree, ["16 01 04*"]
+    )
+    assert waste_codes_filter == {
+        "checked": ["16 01 04*"],
+        "half_checked": ["16", "16 01", "all"],
+    }
+
+    # Checking a code of another search keeps the codes checked in the previous one
+    tree = get_search_tree(index, "emballages")
+    assert index.get_checked_keys(waste_codes_filter, tree) == []
+    waste_codes_filter = index.update_waste_codes_filter(
+        waste_codes_filter, tree, ["15 01", "15 01 01", "15 01 02"]
+    )
+    assert waste_codes_filter == {
+        "checked": ["15 01", "16 01 04*"],
+        "half_checked": ["15", "16", "16 01", "all"],
+    }
+
+    # Unchecking a code in a search only unchecks it
+    tree = get_search_tree(index, "vehicules")
+    assert index.get_checked_keys(waste_codes_filter, tree) == ["16 01 04*"]
+    waste_codes_filter = index.update_waste_codes_filter(waste_codes_filter, tree, [])
+    assert waste_codes_filter == {
+        "checked": ["15 01"],
+        "half_checked": ["15", "all"],
+    }
+
+
+def test_checking_an_ancestor_in_a_search_only_checks_the_matches(
+    index: WasteCodeIndex,
+):
+    tree = get_search_tree(index, "16 01")
+
+    waste_codes_filter = index.update_waste_codes_filter(
+        NOTHING_SELECTED, tree, ["all"]
+    )
+
+    # The other codes of the chapter 16 and the other chapters are not rendered, they stay unchecked
+    assert waste_codes_filter == {
+        "checked": ["16 01"],
+        "half_checked": ["16", "all"],
+    }
+
+
+def test_unchecking_a_code_in_a_search_keeps_the_other_codes_selected(
+    index: WasteCodeIndex,
+):
+    tree = get_search_tree(index, "pneus")
+    assert index.get_checked_keys(EVERYTHING_SELECTED, tree) == ["16 01 03"]
+
+    waste_codes_filter = index.update_waste_codes_filter(EVERYTHING_SELECTED, tree, [])
+
+    assert waste_codes_filter == {
+        "checked": ["15", "16 01 04*", "16 02", "20"],
+        "half_checked": ["16", "16 01", "all"],
+    }
+    # Checked again, everything is selected
+    assert (
+        index.update_waste_codes_filter(waste_codes_filter, tree, ["16 01 03"])
+        == EVERYTHING_SELECTED
+    )
+
+
+def test_codes_not_expanded_select_all_their_leaves(index: WasteCodeIndex):
+    # The lazily loaded tree, with only the chapters rendered
+    tree = get_waste_code_tree(set())
+
+    waste_codes_filter = index.update_waste_codes_filter(NOTHING_SELECTED, tree, ["16"])
+
+    assert waste_codes_filter == {"checked": ["16"], "half_checked": ["all"]}
+    assert index.get_selected_leaves(waste_codes_filter) == {
+        "16 01 03",
+        "16 01 04*",
+        "16 02 13*",
+    }
+    # A partly selected code is not checked in the tree, and unchecking it changes nothing
+    partly_selected = {"checked": ["16 01"], "half_checked": ["16", "all"]}
+    assert index.get_checked_keys(partly_selected, tree) == []
+    assert index.update_waste_codes_filter(partly_selected, tree, []) == partly_selected
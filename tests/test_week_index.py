@@ -0,0 +1,90 @@
+"""Tests of the week indexes used by the weekly aggregations, see src/data/utils.py."""
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import polars as pl
+import pytest
+
+from src.data.utils import (
+    add_week_index_columns,
+    get_week_index_column,
+    get_week_start_expr,
+)
+
+PARIS = ZoneInfo("Europe/Paris")
+
+
+def get_week_starts(dates: pl.Series) -> list[datetime]:
+    """Returns the start of the week of each date, computed from its week index."""
+    df = add_week_index_columns(dates.to_frame("at"), ["at"])
+    return df.select(get_week_start_expr(pl.col(get_week_index_column("at"))))[
+        "at_week"
+    ].to_list()
+
+
+def utc_dates(*dates: datetime) -> pl.Series:
+    return pl.Series(
+        [date.replace(tzinfo=None) for date in dates], dtype=pl.Datetime("us")
+    ).dt.replace_time_zone("UTC")
+
+
+@pytest.mark.parametrize(
+    "last_date, first_date, week_start",
+    [
+        # Spring DST change: Monday 2023-03-27 00:00 in Paris (CEST) is 2023-03-26 22:00 UTC
+        (
+            datetime(2023, 3, 26, 21, 59, 59),
+            datetime(2023, 3, 26, 22),
+            datetime(2023, 3, 27, tzinfo=PARIS),
+        ),
+        # Autumn DST change: Monday 2023-10-30 00:00 in Paris (CET) is 2023-10-29 23:00 UTC
+        (
+            datetime(2023, 10, 29, 22, 59, 59),
+            datetime(2023, 10, 29, 23),
+            datetime(2023, 10, 30, tzinfo=PARIS),
+        ),
+    ],
+)
+def test_weeks_start_on_monday_in_paris_around_dst_changes(
+    last_date: datetime, first_date: datetime, week_start: datetime
+):
+    previous_week_start, next_week_start = get_week_starts(
+        utc_dates(last_date, first_date)
+    )
+
+    assert next_week_start == week_start
+    assert previous_week_start == week_start - timedelta(days=7)
+    # The start of the week is a Paris midnight, whatever the UTC offset
+    assert next_week_start.astimezone(PARIS).hour == 0
+
+
+def test_week_starts_are_paris_datetimes():
+    week_starts = get_week_starts(
+        utc_dates(datetime(2023, 3, 29), datetime(2023, 11, 2))
+    )
+
+    assert [date.utcoffset() for date in week_starts] == [
+        timedelta(hours=2),
+        timedelta(hours=1),
+    ]
+
+
+def test_week_indexes_match_truncate_of_paris_dates():
+    # Every hour of 2023, so that both DST changes are covered
+    dates = pl.date_range(
+        datetime(2023, 1, 1), datetime(2024, 1, 1), "1h", time_zone="UTC"
+    ).dt.convert_time_zone("Europe/Paris")
+
+    assert get_week_starts(dates) == dates.dt.truncate("1w").to_list()
+
+
+def test_dates_without_time_zone_are_utc_dates():
+    dates = [datetime(2023, 3, 26, 21, 59, 59), datetime(2023, 10, 29, 23)]
+    naive_dates = pl.Series(dates, dtype=pl.Datetime("us"))
+
+    assert get_week_starts(naive_dates) == get_week_starts(utc_dates(*dates))
+
+
+def test_week_indexes_need_datetimes():
+    with pytest.raises(TypeError):
+        add_week_index_columns(pl.DataFrame({"at": ["2023-03-27"]}), ["at"])